@@ -3,7 +3,10 @@ from services.ai_service import (
     estimate_meal_from_text,
     analyze_food_photo,
     estimate_workout_from_text,
+    estimate_meals_batch,
+    estimate_workouts_batch,
     generate_weekly_plan,
+    WeeklyPlanStream,
     explain_openai_error,
 )
 
@@ -11,6 +14,9 @@ __all__ = [
     "estimate_meal_from_text",
     "analyze_food_photo",
     "estimate_workout_from_text",
+    "estimate_meals_batch",
+    "estimate_workouts_batch",
     "generate_weekly_plan",
+    "WeeklyPlanStream",
     "explain_openai_error",
 ]
\ No newline at end of file
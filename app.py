@@ -2,6 +2,7 @@ import streamlit as st
 
 from styles import load_styles
 from database import init_db
+from services.metrics import start_from_env as start_metrics
 from auth_utils import create_user, verify_login
 from profile import profile_page, profile_complete
 from router import render as route_render
@@ -13,6 +14,7 @@ def main():
 
     # ✅ DB pronto subito
     init_db()
+    start_metrics()  # endpoint /metrics se INFORMA_METRICS_PORT è impostata (una volta per processo)
 
     if "user_id" not in st.session_state:
         st.session_state.user_id = None
@@ -1,9 +1,8 @@
 import os
 import hashlib
-import sqlite3
 from datetime import datetime
 
-from database import conn, init_db
+from database import get_conn, write
 
 
 def _hash_password(pw: str) -> str:
@@ -12,44 +11,39 @@ def _hash_password(pw: str) -> str:
 
 
 def create_user(email: str, password: str) -> int:
-    init_db()
-
     email = (email or "").strip().lower()
     if not email or not password:
         raise ValueError("Email e password obbligatorie")
 
-    existing = conn.execute("SELECT id FROM users WHERE email=?", (email,)).fetchone()
-    if existing:
-        raise ValueError("Email già registrata. Prova il login.")
+    pw_hash = _hash_password(password)
 
-    conn.execute(
-        "INSERT INTO users (email, password_hash, created_at) VALUES (?,?,?)",
-        (email, _hash_password(password), datetime.now().isoformat(timespec="seconds"))
-    )
-    conn.commit()
+    def _op(c):
+        existing = c.execute("SELECT id FROM users WHERE email=?", (email,)).fetchone()
+        if existing:
+            raise ValueError("Email già registrata. Prova il login.")
 
-    row = conn.execute("SELECT id FROM users WHERE email=?", (email,)).fetchone()
-    return int(row["id"])
+        c.execute(
+            "INSERT INTO users (email, password_hash, created_at) VALUES (?,?,?)",
+            (email, pw_hash, datetime.now().isoformat(timespec="seconds"))
+        )
+        row = c.execute("SELECT id FROM users WHERE email=?", (email,)).fetchone()
+        return int(row["id"])
 
+    return write(_op)
 
-def verify_login(email: str, password: str) -> int | None:
-    init_db()
 
+def verify_login(email: str, password: str) -> int | None:
     email = (email or "").strip().lower()
     if not email or not password:
         return None
 
-    try:
-        row = conn.execute(
-            "SELECT id FROM users WHERE email=? AND password_hash=?",
-            (email, _hash_password(password))
-        ).fetchone()
-    except sqlite3.OperationalError:
-        # se il DB era vuoto / tabelle non presenti (reset container)
-        init_db()
-        row = conn.execute(
-            "SELECT id FROM users WHERE email=? AND password_hash=?",
-            (email, _hash_password(password))
-        ).fetchone()
-
-    return int(row["id"]) if row else None
\ No newline at end of file
+    row = get_conn().execute(
+        "SELECT id FROM users WHERE email=? AND password_hash=?",
+        (email, _hash_password(password))
+    ).fetchone()
+
+    return int(row["id"]) if row else None
+
+def user_email(user_id: int) -> str | None:
+    row = get_conn().execute("SELECT email FROM users WHERE id=?", (user_id,)).fetchone()
+    return row["email"] if row else None
@@ -1,3 +1,4 @@
+# package
 import streamlit as st
 import json
 
@@ -5,51 +6,49 @@ from db.repo_meals import list_meals, delete_meal
 from db.repo_workouts import list_workouts, delete_workout
 from utils import kcal_round
 
+def _notes_caption(raw_json: str | None):
+    if not raw_json:
+        return
+    try:
+        jj = json.loads(raw_json)
+        if jj.get("notes"):
+            st.caption(f"📝 {jj.get('notes')}")
+    except Exception:
+        pass
+
 def render(user_id: int, ds: str, is_closed: bool):
     st.subheader("✅ Consuntivo (reale)")
 
-    meals_df = list_meals(user_id, ds)
-    workouts_df = list_workouts(user_id, ds)
+    meals = list_meals(user_id, ds)
+    workouts = list_workouts(user_id, ds)
 
     c1, c2, c3 = st.columns(3)
-    c1.metric("Calorie IN", f"{kcal_round(meals_df['calories'].sum())} kcal" if not meals_df.empty else "0 kcal")
-    c2.metric("Calorie OUT (workout)", f"{kcal_round(workouts_df['calories_burned'].sum())} kcal" if not workouts_df.empty else "0 kcal")
-    c3.metric("Pasti", f"{len(meals_df)}")
+    c1.metric("Calorie IN", f"{kcal_round(sum(m.calories or 0 for m in meals))} kcal")
+    c2.metric("Calorie OUT (workout)", f"{kcal_round(sum(w.calories_burned or 0 for w in workouts))} kcal")
+    c3.metric("Pasti", f"{len(meals)}")
 
-    if not meals_df.empty:
+    if meals:
         st.markdown("**Pasti inseriti**")
-        for _, r in meals_df.iterrows():
+        for m in meals:
             left, _, right = st.columns([6, 2, 1])
             with left:
-                st.write(f"🍽️ {r['time']} — {r['description']}")
-                st.caption(f"{kcal_round(r['calories'])} kcal")
-                if r.get("raw_json"):
-                    try:
-                        jj = json.loads(r["raw_json"])
-                        if jj.get("notes"):
-                            st.caption(f"📝 {jj.get('notes')}")
-                    except Exception:
-                        pass
+                st.write(f"🍽️ {m.time} — {m.description}")
+                st.caption(f"{kcal_round(m.calories)} kcal")
+                _notes_caption(m.raw_json)
             with right:
-                if st.button("🗑️", key=f"del_meal_{ds}_{int(r['id'])}", disabled=is_closed):
-                    delete_meal(user_id, int(r["id"]))
+                if st.button("🗑️", key=f"del_meal_{ds}_{m.id}", disabled=is_closed):
+                    delete_meal(user_id, m.id)
                     st.rerun()
 
-    if not workouts_df.empty:
+    if workouts:
         st.markdown("**Allenamenti inseriti**")
-        for _, r in workouts_df.iterrows():
+        for w in workouts:
             left, _, right = st.columns([6, 2, 1])
             with left:
-                st.write(f"🏃 {r['time']} — {r['description']}")
-                st.caption(f"{int(r['duration_min'] or 0)} min — {kcal_round(r['calories_burned'])} kcal")
-                if r.get("raw_json"):
-                    try:
-                        jj = json.loads(r["raw_json"])
-                        if jj.get("notes"):
-                            st.caption(f"📝 {jj.get('notes')}")
-                    except Exception:
-                        pass
+                st.write(f"🏃 {w.time} — {w.description}")
+                st.caption(f"{int(w.duration_min or 0)} min — {kcal_round(w.calories_burned)} kcal")
+                _notes_caption(w.raw_json)
             with right:
-                if st.button("🗑️", key=f"del_work_{ds}_{int(r['id'])}", disabled=is_closed):
-                    delete_workout(user_id, int(r["id"]))
+                if st.button("🗑️", key=f"del_work_{ds}_{w.id}", disabled=is_closed):
+                    delete_workout(user_id, w.id)
                     st.rerun()
@@ -0,0 +1,59 @@
+import streamlit as st
+from typing import Any, Callable
+
+from services.jobs import JobQueueFull, job, job_result, progress, submit
+
+POLL_SECONDS = 1.0
+
+
+def start(job_key: str, user_id: int, kind: str, params: dict, payload: dict | None = None,
+          on_done: Callable[[Any], None] | None = None):
+    """Invia il job e ne salva l'id in session_state[job_key]."""
+    try:
+        st.session_state[job_key] = submit(user_id, kind, params, payload, on_done)
+    except JobQueueFull as e:
+        st.error(str(e))
+
+
+def running(job_key: str) -> bool:
+    return bool(st.session_state.get(job_key))
+
+
+def poll(job_key: str, result_key: str | None = None, label: str = "Stima in corso…",
+         show_progress: bool = False):
+    """
+    Segue il job in session_state[job_key] con un fragment che si riesegue ogni POLL_SECONDS:
+    il resto della pagina resta usabile. A job finito mette il risultato in
+    session_state[result_key] (oppure conserva l'errore) e riesegue l'intera pagina.
+    """
+    err = st.session_state.pop(f"{job_key}_error", None)
+    if err:
+        st.error(err)
+
+    job_id = st.session_state.get(job_key)
+    if not job_id:
+        return
+
+    @st.fragment(run_every=POLL_SECONDS)
+    def _poll():
+        j = job(job_id)
+        if j is None:
+            st.session_state.pop(job_key, None)
+            return
+        if j.status in ("queued", "running"):
+            text = progress(job_id) if show_progress else ""
+            if text:
+                st.markdown(text)
+            else:
+                st.caption(f"⏳ {label}")
+            return
+
+        st.session_state.pop(job_key, None)
+        if j.status == "done":
+            if result_key:
+                st.session_state[result_key] = job_result(j)
+        else:
+            st.session_state[f"{job_key}_error"] = j.error or "Job non riuscito."
+        st.rerun(scope="app")
+
+    _poll()
@@ -1,22 +1,41 @@
 import streamlit as st
 import json
 
-from ai import estimate_meal_from_text, analyze_food_photo
-from db.repo_meals import insert_meal
+from components import job_status
+from db.repo_meals import insert_meal, insert_meals
+from services.quicklog import suggest
 from utils import kcal_round
 
 def render(user_id: int, ds: str, is_closed: bool):
     st.subheader("➕ Pasti (AI o manuale)")
-    tab1, tab2, tab3 = st.tabs(["🧠 Da testo (AI)", "📷 Da foto (AI)", "✍️ Manuale"])
+    tab0, tab1, tab2, tab3, tab4 = st.tabs(
+        ["⚡ Rapido", "🧠 Da testo (AI)", "📷 Da foto (AI)", "✍️ Manuale", "📋 Giornata intera (AI)"]
+    )
+
+    # Rapido: un pasto già registrato, con le sue kcal, in un clic
+    with tab0:
+        q_time = st.text_input("Ora", value="13:00", key=f"quick_time_{ds}", disabled=is_closed)
+        q_text = st.text_input("Cerca tra i tuoi pasti", value="", key=f"quick_q_{ds}", disabled=is_closed,
+                               placeholder="es. pasta, yogurt, cappuccino")
+        hits = suggest(user_id, q_text)
+        if not hits:
+            st.caption("Nessun pasto passato trovato." if q_text.strip() else "I pasti che registri compariranno qui.")
+        for i, m in enumerate(hits):
+            label = f"{m.description} · {kcal_round(m.calories)} kcal" + (f" (×{m.count})" if m.count > 1 else "")
+            if st.button(label, key=f"quick_add_{ds}_{i}", disabled=is_closed, use_container_width=True):
+                insert_meal(user_id, ds, q_time.strip(), m.description, float(m.calories),
+                            json.dumps({"source": "quicklog"}, ensure_ascii=False))
+                st.rerun()
 
     # AI text
     with tab1:
         m_time = st.text_input("Ora", value="13:00", key=f"meal_ai_time_{ds}", disabled=is_closed)
         m_text = st.text_area("Descrizione libera", value="", key=f"meal_ai_text_{ds}", disabled=is_closed)
 
-        if st.button("Stima con AI", key=f"meal_ai_btn_{ds}", disabled=is_closed):
-            est = estimate_meal_from_text(m_text)
-            st.session_state[f"meal_ai_est_{ds}"] = est
+        job_key = f"meal_ai_job_{ds}"
+        if st.button("Stima con AI", key=f"meal_ai_btn_{ds}", disabled=is_closed or job_status.running(job_key)):
+            job_status.start(job_key, user_id, "meal_text", {"text": m_text})
+        job_status.poll(job_key, f"meal_ai_est_{ds}")
 
         est = st.session_state.get(f"meal_ai_est_{ds}")
         if est:
@@ -45,12 +64,17 @@ def render(user_id: int, ds: str, is_closed: bool):
         p_note = st.text_input("Nota (opzionale)", value="", key=f"photo_note_{ds}", disabled=is_closed)
         up = st.file_uploader("Carica foto", type=["jpg", "jpeg", "png"], key=f"photo_upl_{ds}", disabled=is_closed)
 
-        if st.button("Analizza foto con AI", key=f"photo_ai_btn_{ds}", disabled=is_closed):
+        job_key = f"photo_ai_job_{ds}"
+        if st.button("Analizza foto con AI", key=f"photo_ai_btn_{ds}", disabled=is_closed or job_status.running(job_key)):
             if up is None:
                 st.error("Carica una foto.")
             else:
-                est = analyze_food_photo(up.getvalue(), up.type, p_time, p_note)
-                st.session_state[f"photo_ai_est_{ds}"] = est
+                job_status.start(
+                    job_key, user_id, "meal_photo",
+                    {"mime": up.type, "time": p_time, "note": p_note},
+                    payload={"image": up.getvalue()},
+                )
+        job_status.poll(job_key, f"photo_ai_est_{ds}", label="Analisi della foto in corso…")
 
         est = st.session_state.get(f"photo_ai_est_{ds}")
         if est:
@@ -81,3 +105,45 @@ def render(user_id: int, ds: str, is_closed: bool):
             else:
                 insert_meal(user_id, ds, man_time.strip(), man_desc.strip(), float(man_kcal), None)
                 st.rerun()
+
+    # Giornata intera: una chiamata AI, revisione in tabella, un solo salvataggio
+    with tab4:
+        day_text = st.text_area(
+            "Incolla la giornata (un pasto per riga, ora facoltativa)",
+            value="", height=160, key=f"meal_batch_text_{ds}", disabled=is_closed,
+            placeholder="08:00 cappuccino e cornetto\n13:00 pasta al pomodoro\ncena: pizza margherita",
+        )
+        job_key = f"meal_batch_job_{ds}"
+        if st.button("Stima tutto con AI", key=f"meal_batch_btn_{ds}", disabled=is_closed or job_status.running(job_key)):
+            job_status.start(job_key, user_id, "meals_batch", {"text": day_text})
+        job_status.poll(job_key, f"meal_batch_est_{ds}")
+
+        items = st.session_state.get(f"meal_batch_est_{ds}")
+        if items is not None:
+            if not items:
+                st.warning("Nessun pasto riconosciuto nel testo.")
+            else:
+                edited = st.data_editor(
+                    items,
+                    num_rows="dynamic",
+                    use_container_width=True,
+                    key=f"meal_batch_editor_{ds}",
+                    disabled=is_closed,
+                    column_config={
+                        "time": st.column_config.TextColumn("Ora"),
+                        "description": st.column_config.TextColumn("Descrizione"),
+                        "total_calories": st.column_config.NumberColumn("Kcal", min_value=0, step=10),
+                        "notes": st.column_config.TextColumn("Note", disabled=True),
+                    },
+                )
+                rows = [
+                    (user_id, ds, str(r.get("time") or "13:00").strip(), str(r.get("description") or "").strip(),
+                     float(r.get("total_calories") or 0), json.dumps(r, ensure_ascii=False))
+                    for r in edited
+                    if str(r.get("description") or "").strip()
+                ]
+                st.caption(f"Totale: {kcal_round(sum(r[4] for r in rows))} kcal in {len(rows)} pasti")
+                if st.button("Salva tutti", key=f"meal_batch_save_{ds}", disabled=is_closed or not rows):
+                    insert_meals(rows)
+                    st.session_state.pop(f"meal_batch_est_{ds}", None)
+                    st.rerun()
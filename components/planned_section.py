@@ -1,9 +1,9 @@
 import streamlit as st
-import pandas as pd
 
 from db.repo_planned import list_planned, add_planned, delete_planned, mark_done
 from db.repo_meals import insert_meal
 from db.repo_workouts import insert_workout
+from db.unit_of_work import unit_of_work
 from utils import kcal_round
 
 
@@ -59,53 +59,57 @@ def render(user_id: int, ds: str, is_closed: bool):
 
     planned = list_planned(user_id, ds)
 
-    if planned.empty:
+    if not planned:
         st.caption("Nessun evento pianificato per questo giorno.")
         return
 
-    for _, r in planned.iterrows():
+    for r in planned:
         left, mid, right = st.columns([6, 2, 2])
-        tag = "🍽️" if r["type"] == "meal" else "🏃"
-        kcal = f"~{kcal_round(r['expected_calories'])} kcal" if pd.notna(r["expected_calories"]) else ""
-        dur = f"{int(r['duration_min'])} min" if pd.notna(r["duration_min"]) else ""
-        status = r["status"] or "planned"
+        tag = "🍽️" if r.type == "meal" else "🏃"
+        kcal = f"~{kcal_round(r.expected_calories)} kcal" if r.expected_calories is not None else ""
+        dur = f"{int(r.duration_min)} min" if r.duration_min is not None else ""
+        status = r.status or "planned"
 
         with left:
-            st.markdown(f"**{tag} {r['time']} — {r['title']}**  \n{kcal} {dur}  \n`{status}`")
-            if r.get("notes"):
-                st.caption(r["notes"])
+            st.markdown(f"**{tag} {r.time} — {r.title}**  \n{kcal} {dur}  \n`{status}`")
+            if r.notes:
+                st.caption(r.notes)
 
         with mid:
             done = st.checkbox(
                 "Fatto",
                 value=(status == "done"),
-                key=f"done_{ds}_{int(r['id'])}",
+                key=f"done_{ds}_{r.id}",
                 disabled=is_closed,
             )
             if done and status != "done" and not is_closed:
-                if r["type"] == "meal":
-                    insert_meal(
-                        user_id,
-                        ds,
-                        str(r["time"]),
-                        f"[Previsto] {r['title']}",
-                        float(r["expected_calories"] or 0),
-                        None,
-                    )
-                else:
-                    insert_workout(
-                        user_id,
-                        ds,
-                        str(r["time"]),
-                        f"[Previsto] {r['title']}",
-                        int(r["duration_min"] or 0),
-                        float(r["expected_calories"] or 0),
-                        None,
-                    )
-                mark_done(user_id, int(r["id"]))
+                # inserimento + mark_done in un'unica transazione
+                with unit_of_work() as uow:
+                    if r.type == "meal":
+                        insert_meal(
+                            user_id,
+                            ds,
+                            str(r.time),
+                            f"[Previsto] {r.title}",
+                            float(r.expected_calories or 0),
+                            None,
+                            uow=uow,
+                        )
+                    else:
+                        insert_workout(
+                            user_id,
+                            ds,
+                            str(r.time),
+                            f"[Previsto] {r.title}",
+                            int(r.duration_min or 0),
+                            float(r.expected_calories or 0),
+                            None,
+                            uow=uow,
+                        )
+                    mark_done(user_id, r.id, uow=uow)
                 st.rerun()
 
         with right:
-            if st.button("🗑️", key=f"delplanned_{ds}_{int(r['id'])}", disabled=is_closed):
-                delete_planned(user_id, int(r["id"]))
-                st.rerun()
\ No newline at end of file
+            if st.button("🗑️", key=f"delplanned_{ds}_{r.id}", disabled=is_closed):
+                delete_planned(user_id, r.id)
+                st.rerun()
@@ -1,10 +1,11 @@
 import streamlit as st
 import json
 
-from ai import estimate_workout_from_text
-from db.repo_workouts import insert_workout
+from components import job_status
+from db.repo_workouts import insert_workout, insert_workouts
 from profile import get_profile
-from utils import kcal_round, heuristic_workout_kcal
+from services.workout_engine import guess_minutes, user_weight, workout_kcal
+from utils import kcal_round
 
 def render(user_id: int, ds: str, is_closed: bool):
     st.subheader("🏃 Allenamenti (AI o manuale)")
@@ -13,25 +14,28 @@ def render(user_id: int, ds: str, is_closed: bool):
     w_text = st.text_area("Descrizione allenamento (libera)", value="", key=f"w_text_{ds}", disabled=is_closed)
     w_dur = st.number_input("Durata (min) (se la sai)", min_value=0, value=0, step=5, key=f"w_dur_{ds}", disabled=is_closed)
 
+    job_key = f"w_ai_job_{ds}"
     colA, colB = st.columns(2)
     with colA:
-        if st.button("Stima workout con AI", key=f"w_ai_btn_{ds}", disabled=is_closed):
+        if st.button("Stima workout con AI", key=f"w_ai_btn_{ds}", disabled=is_closed or job_status.running(job_key)):
             prof = get_profile(user_id) or {}
-            est = estimate_workout_from_text(
-                w_text,
-                float(prof.get("start_weight") or 0) or None,
-                float(prof.get("height_cm") or 0) or None,
-            )
-            st.session_state[f"w_ai_est_{ds}"] = est
+            job_status.start(job_key, user_id, "workout_text", {
+                "text": w_text,
+                "weight_kg": user_weight(user_id, ds),
+                "height_cm": float(prof.get("height_cm") or 0) or None,
+            })
     with colB:
         if st.button("Salva workout manuale", key=f"w_man_save_{ds}", disabled=is_closed):
             if not w_text.strip():
                 st.error("Inserisci una descrizione.")
             else:
-                kcal_burn = float(heuristic_workout_kcal(w_text, int(w_dur or 45)))
-                insert_workout(user_id, ds, w_time.strip(), w_text.strip(), int(w_dur or 0), kcal_burn, None)
+                dur = int(w_dur or 0) or guess_minutes(w_text)
+                kcal_burn = workout_kcal(w_text, dur, user_weight(user_id, ds))
+                insert_workout(user_id, ds, w_time.strip(), w_text.strip(), dur, kcal_burn, None)
                 st.rerun()
 
+    job_status.poll(job_key, f"w_ai_est_{ds}")
+
     est = st.session_state.get(f"w_ai_est_{ds}")
     if est:
         st.info(f"Stima: {kcal_round(est.get('calories_burned', 0))} kcal bruciate")
@@ -43,6 +47,56 @@ def render(user_id: int, ds: str, is_closed: bool):
             key=f"w_ai_adj_{ds}", disabled=is_closed
         )
         if st.button("Salva workout (AI)", key=f"w_ai_save_{ds}", disabled=is_closed):
-            insert_workout(user_id, ds, w_time.strip(), w_text.strip(), int(w_dur or 0), float(adj_kcal), json.dumps(est, ensure_ascii=False))
+            dur = int(w_dur or 0) or int(est.get("duration_min") or 0)
+            insert_workout(user_id, ds, w_time.strip(), w_text.strip(), dur, float(adj_kcal), json.dumps(est, ensure_ascii=False))
             st.session_state.pop(f"w_ai_est_{ds}", None)
             st.rerun()
+
+    # Più allenamenti insieme: una chiamata AI, revisione in tabella, un solo salvataggio
+    with st.expander("📋 Più allenamenti insieme (AI)"):
+        batch_text = st.text_area(
+            "Un allenamento per riga (ora facoltativa)",
+            value="", key=f"w_batch_text_{ds}", disabled=is_closed,
+            placeholder="07:00 corsa 30 min\n18:30 pesi 45 minuti",
+        )
+        batch_job_key = f"w_batch_job_{ds}"
+        if st.button("Stima tutti con AI", key=f"w_batch_btn_{ds}", disabled=is_closed or job_status.running(batch_job_key)):
+            prof = get_profile(user_id) or {}
+            job_status.start(batch_job_key, user_id, "workouts_batch", {
+                "text": batch_text,
+                "weight_kg": user_weight(user_id, ds),
+                "height_cm": float(prof.get("height_cm") or 0) or None,
+            })
+        job_status.poll(batch_job_key, f"w_batch_est_{ds}")
+
+        items = st.session_state.get(f"w_batch_est_{ds}")
+        if items is not None:
+            if not items:
+                st.warning("Nessun allenamento riconosciuto nel testo.")
+            else:
+                edited = st.data_editor(
+                    items,
+                    num_rows="dynamic",
+                    use_container_width=True,
+                    key=f"w_batch_editor_{ds}",
+                    disabled=is_closed,
+                    column_config={
+                        "time": st.column_config.TextColumn("Ora"),
+                        "description": st.column_config.TextColumn("Descrizione"),
+                        "duration_min": st.column_config.NumberColumn("Durata (min)", min_value=0, step=5),
+                        "calories_burned": st.column_config.NumberColumn("Kcal bruciate", min_value=0, step=10),
+                        "notes": st.column_config.TextColumn("Note", disabled=True),
+                    },
+                )
+                rows = [
+                    (user_id, ds, str(r.get("time") or "19:00").strip(), str(r.get("description") or "").strip(),
+                     int(r.get("duration_min") or 0), float(r.get("calories_burned") or 0),
+                     json.dumps(r, ensure_ascii=False))
+                    for r in edited
+                    if str(r.get("description") or "").strip()
+                ]
+                st.caption(f"Totale: {kcal_round(sum(r[5] for r in rows))} kcal bruciate in {len(rows)} allenamenti")
+                if st.button("Salva tutti", key=f"w_batch_save_{ds}", disabled=is_closed or not rows):
+                    insert_workouts(rows)
+                    st.session_state.pop(f"w_batch_est_{ds}", None)
+                    st.rerun()
@@ -1,130 +1,107 @@
-import sqlite3
+import os
+import threading
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Callable
 
-DB_PATH = Path("informa.db")  # su Streamlit Cloud persistenza limitata
-conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-conn.execute("PRAGMA foreign_keys = ON")
-conn.row_factory = sqlite3.Row
+from db.engines import Engine, create_engine
 
+DB_PATH = Path(os.getenv("INFORMA_DB_PATH", "informa.db"))  # su Streamlit Cloud persistenza limitata
+DB_URL = os.getenv("INFORMA_DB_URL")  # postgresql://... per più nodi; vuoto = SQLite locale
 
-def init_db():
-    # users
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        email TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        created_at TEXT
-    )
-    """)
+_engine: Engine | None = None
+_engine_lock = threading.Lock()
 
-    # profile
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS user_profile (
-        user_id INTEGER PRIMARY KEY,
-        start_weight REAL,
-        height_cm REAL,
-        sex TEXT,
-        age INTEGER,
-        activity_level TEXT,
-        goal_type TEXT,
-        goal_weight REAL,
-        goal_date TEXT,
-        body_fat REAL,
-        lean_mass REAL,
-        updated_at TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-    )
-    """)
 
-    # day logs
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS day_logs (
-        user_id INTEGER,
-        date TEXT,
-        morning_weight REAL,
-        is_closed INTEGER DEFAULT 0,
-        PRIMARY KEY(user_id, date),
-        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-    )
-    """)
+def engine() -> Engine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(DB_URL, DB_PATH)
+    return _engine
 
-    # meals actual
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS meals (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        date TEXT,
-        time TEXT,
-        description TEXT,
-        calories REAL,
-        raw_json TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-    )
-    """)
 
-    # workouts actual
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS workouts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        date TEXT,
-        time TEXT,
+def get_conn():
+    """
+    Connessione di lettura: su SQLite una per thread (WAL), su Postgres dal pool.
+    """
+    return engine().get_conn()
+
+
+def write(fn: Callable[[Any], Any]):
+    """
+    Esegue fn(conn) dentro una transazione di scrittura e attende il commit
+    (su SQLite nel thread scrittore, con commit raggruppati).
+    Ritorna il valore di fn; rilancia la sua eccezione.
+    """
+    return engine().write(fn)
+
+
+def upsert_sql(table: str, columns: list[str], key: list[str]) -> str:
+    """UPSERT nel dialetto del motore attivo."""
+    return engine().upsert_sql(table, columns, key)
+
+
+def execute_write(sql: str, params=()) -> int:
+    """Scorciatoia per una singola istruzione; ritorna rowcount."""
+    return write(lambda c: c.execute(sql, params).rowcount)
+
+
+# ----------------------------
+# Schema: migrazioni versionate, una volta per processo
+# ----------------------------
+_migrated = False
+_migrate_lock = threading.Lock()
+
+
+def _applied_version(c) -> int:
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
         description TEXT,
-        duration_min INTEGER,
-        calories_burned REAL,
-        raw_json TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        applied_at TEXT
     )
     """)
+    row = c.execute("SELECT COALESCE(MAX(version), 0) AS v FROM schema_version").fetchone()
+    return int(row["v"])
 
-    # daily summaries
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS daily_summaries (
-        user_id INTEGER,
-        date TEXT,
-        calories_in REAL,
-        rest_calories REAL,
-        workout_calories REAL,
-        calories_out REAL,
-        net_calories REAL,
-        PRIMARY KEY(user_id, date),
-        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-    )
-    """)
 
-    # planned events (calendar plan)
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS planned_events (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        date TEXT,
-        time TEXT,
-        type TEXT,
-        title TEXT,
-        expected_calories REAL,
-        duration_min INTEGER,
-        status TEXT DEFAULT 'planned',
-        notes TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-    )
-    """)
+def migrate() -> int:
+    """Applica gli step mancanti; ritorna la versione finale dello schema."""
+    from db.migrations import MIGRATIONS
 
-    # weekly plan cache
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS weekly_plan (
-        user_id INTEGER,
-        iso_year INTEGER,
-        iso_week INTEGER,
-        content TEXT,
-        created_at TEXT,
-        PRIMARY KEY(user_id, iso_year, iso_week),
-        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-    )
-    """)
+    current = write(_applied_version)
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+
+        def _op(c, version=version, description=description, step=step):
+            # ricontrollo dentro la transazione: un altro processo può averla già applicata
+            engine().lock_schema(c)
+            if _applied_version(c) >= version:
+                return
+            step(c)
+            c.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?,?,?)",
+                (version, description, datetime.now().isoformat(timespec="seconds"))
+            )
 
-    conn.commit()
+        write(_op)
+        current = version
+    return current
+
+
+def init_db():
+    """Porta lo schema all'ultima versione. Solo la prima chiamata del processo lavora."""
+    global _migrated
+    if _migrated:
+        return
+    with _migrate_lock:
+        if not _migrated:
+            migrate()
+            _migrated = True
 
 
 # ✅ IMPORTANTISSIMO: crea tabelle appena il modulo viene importato
-init_db()
\ No newline at end of file
+init_db()
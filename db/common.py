@@ -1,8 +1,20 @@
+# package
 import pandas as pd
-from database import conn
+from database import get_conn
 
 def safe_read_sql(query: str, params=()):
+    """DataFrame: solo dove servono operazioni vettoriali (dashboard)."""
     try:
-        return pd.read_sql(query, conn, params=params)
+        cur = get_conn().execute(query, params)
+        rows = [tuple(r) for r in cur.fetchall()]
+        return pd.DataFrame.from_records(rows, columns=[d[0] for d in cur.description])
     except Exception:
         return pd.DataFrame()
+
+def fetch_rows(cls, query: str, params=()) -> list:
+    """Righe tipizzate direttamente dal cursore, senza passare da pandas."""
+    return [cls(*r) for r in get_conn().execute(query, params)]
+
+def fetch_one(cls, query: str, params=()):
+    r = get_conn().execute(query, params).fetchone()
+    return cls(*r) if r else None
@@ -0,0 +1,350 @@
+# db/engines.py
+"""
+Motori di storage dietro database.get_conn() / database.write().
+
+- SQLiteEngine: file locale, una connessione di lettura per thread (WAL) e
+  un solo thread scrittore con commit raggruppati.
+- PostgresEngine: pool di connessioni (psycopg 3), per girare su più nodi.
+
+I repository scrivono SQL con segnaposto `?` e accedono alle righe per nome
+o per posizione: il motore Postgres traduce i segnaposto e restituisce righe
+compatibili con sqlite3.Row.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable
+
+
+class Engine:
+    dialect = ""
+
+    def get_conn(self):
+        raise NotImplementedError
+
+    def write(self, fn: Callable[[Any], Any]):
+        raise NotImplementedError
+
+    def lock_schema(self, c):
+        """Serializza le migrazioni tra processi (dentro la transazione di scrittura)."""
+
+    def upsert_sql(self, table: str, columns: list[str], key: list[str]) -> str:
+        """INSERT ... ON CONFLICT(key) DO UPDATE per le colonne non chiave."""
+        cols = ", ".join(columns)
+        marks = ",".join("?" for _ in columns)
+        updates = ",\n    ".join(f"{col}=excluded.{col}" for col in columns if col not in key)
+        return (
+            f"INSERT INTO {table} ({cols}) VALUES ({marks})\n"
+            f"ON CONFLICT({', '.join(key)}) DO UPDATE SET\n    {updates}"
+        )
+
+
+# ----------------------------
+# SQLite
+# ----------------------------
+PRAGMA_PROFILES = {
+    "default": {
+        "synchronous": "NORMAL",
+        "cache_size": -16000,      # ~16 MB per connessione
+        "mmap_size": 134217728,    # 128 MB
+        "busy_timeout": 5000,      # ms
+    },
+    "durable": {
+        "synchronous": "FULL",
+        "cache_size": -16000,
+        "mmap_size": 134217728,
+        "busy_timeout": 10000,
+    },
+    "low_memory": {
+        "synchronous": "NORMAL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "busy_timeout": 5000,
+    },
+}
+
+WRITER_MAX_BATCH = 64  # scritture raggruppate in un solo commit
+
+# INSERT ... RETURNING nei repository (3.35); ON CONFLICT DO UPDATE (3.24) è compreso
+MIN_SQLITE = (3, 35, 0)
+
+
+def _pragmas() -> dict:
+    name = os.getenv("INFORMA_DB_PROFILE", "default").strip().lower()
+    return PRAGMA_PROFILES.get(name, PRAGMA_PROFILES["default"])
+
+
+def _resolve(fut: Future, value, err: BaseException | None):
+    """Completa un future una sola volta: uno già risolto o annullato resta com'è."""
+    if fut.done():
+        return
+    try:
+        if err is not None:
+            fut.set_exception(err)
+        else:
+            fut.set_result(value)
+    except InvalidStateError:
+        pass
+
+
+class _Writer:
+    def __init__(self, open_connection: Callable[[], sqlite3.Connection]):
+        self._open_connection = open_connection
+        self._queue: "queue.Queue[tuple[Callable[[sqlite3.Connection], Any], Future]]" = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                t = threading.Thread(target=self._run, name="informa-db-writer", daemon=True)
+                t.start()
+                self._thread = t
+
+    def in_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        self._ensure_started()
+        fut: Future = Future()
+        self._queue.put((fn, fut))
+        return fut
+
+    def _run(self):
+        self._conn: sqlite3.Connection | None = None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITER_MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # il thread scrittore non deve mai morire: ogni write() resterebbe appesa
+            try:
+                if self._conn is None:
+                    self._conn = self._open_connection()
+                self._apply(batch)
+            except Exception as e:
+                for _, fut in batch:
+                    _resolve(fut, None, e)
+                self._recover()
+
+    def _recover(self):
+        """Dopo un errore fuori dai job: transazione chiusa, connessione riaperta se inutilizzabile."""
+        c = self._conn
+        if c is None:
+            return
+        try:
+            if c.in_transaction:
+                c.execute("ROLLBACK")
+            c.execute("SELECT 1")
+        except Exception:
+            try:
+                c.close()
+            except Exception:
+                pass
+            self._conn = None  # riaperta al prossimo batch
+
+    def _apply(self, batch):
+        c = self._conn
+        results = []
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            for fn, fut in batch:
+                if not fut.set_running_or_notify_cancel():
+                    continue  # annullata prima di partire
+                # un SAVEPOINT per job: un errore annulla solo quel job
+                c.execute("SAVEPOINT job")
+                try:
+                    results.append((fut, fn(c), None))
+                    c.execute("RELEASE job")
+                except Exception as e:
+                    c.execute("ROLLBACK TO job")
+                    c.execute("RELEASE job")
+                    results.append((fut, None, e))
+            c.execute("COMMIT")
+        except Exception as e:
+            if c.in_transaction:
+                c.execute("ROLLBACK")
+            for _, fut in batch:
+                _resolve(fut, None, e)
+            return
+
+        for fut, value, err in results:
+            _resolve(fut, value, err)
+
+    def run_inline(self, fn: Callable[[sqlite3.Connection], Any]):
+        return fn(self._conn)
+
+
+class SQLiteEngine(Engine):
+    dialect = "sqlite"
+
+    def __init__(self, path):
+        if sqlite3.sqlite_version_info < MIN_SQLITE:
+            raise RuntimeError(
+                f"SQLite {sqlite3.sqlite_version} troppo vecchio: serve almeno {'.'.join(map(str, MIN_SQLITE))}."
+            )
+        self.path = path
+        self._local = threading.local()
+        self._writer = _Writer(self._open_connection)
+
+    def _open_connection(self) -> sqlite3.Connection:
+        c = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        c.row_factory = sqlite3.Row
+        for key, value in _pragmas().items():
+            c.execute(f"PRAGMA {key} = {value}")
+        c.execute("PRAGMA journal_mode = WAL")
+        c.execute("PRAGMA foreign_keys = ON")
+        return c
+
+    def get_conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = self._open_connection()
+            self._local.conn = c
+        return c
+
+    def write(self, fn):
+        if self._writer.in_writer_thread():
+            return self._writer.run_inline(fn)
+        return self._writer.submit(fn).result()
+
+
+# ----------------------------
+# PostgreSQL (dipendenze opzionali: psycopg, psycopg_pool)
+# ----------------------------
+def _to_pg(sql: str) -> str:
+    sql = sql.replace("%", "%%").replace("?", "%s")
+    if sql.lstrip().upper().startswith("CREATE TABLE"):
+        sql = sql.replace("INTEGER PRIMARY KEY AUTOINCREMENT", "SERIAL PRIMARY KEY")
+        sql = sql.replace(" REAL", " DOUBLE PRECISION")
+    return sql
+
+
+class _Row(tuple):
+    """Riga accessibile per posizione e per nome, come sqlite3.Row."""
+
+    def __new__(cls, values, index: dict):
+        row = super().__new__(cls, values)
+        row._index = index
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._index[key]
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._index)
+
+
+def _row_factory(cursor):
+    index = {d.name: i for i, d in enumerate(cursor.description or [])}
+    return lambda values: _Row(values, index)
+
+
+class _Result:
+    """Cursore già materializzato: la connessione torna subito nel pool."""
+
+    def __init__(self, rows, description, rowcount):
+        self._rows = rows
+        self.description = description
+        self.rowcount = rowcount
+        self._pos = 0
+
+    def fetchone(self):
+        if self._pos >= len(self._rows):
+            return None
+        self._pos += 1
+        return self._rows[self._pos - 1]
+
+    def fetchall(self):
+        rows, self._pos = self._rows[self._pos:], len(self._rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+def _run(raw, sql, params) -> _Result:
+    cur = raw.cursor(row_factory=_row_factory)
+    cur.execute(_to_pg(sql), params)
+    rows = cur.fetchall() if cur.description else []
+    return _Result(rows, cur.description, cur.rowcount)
+
+
+class _PgConnection:
+    """Connessione di scrittura (dentro una transazione) con l'interfaccia usata dai repository."""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def execute(self, sql, params=()):
+        return _run(self._raw, sql, params)
+
+    def executemany(self, sql, seq):
+        cur = self._raw.cursor()
+        cur.executemany(_to_pg(sql), list(seq))
+        return _Result([], None, cur.rowcount)
+
+
+class _PooledReader:
+    """Ogni execute prende una connessione dal pool e la restituisce subito."""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def execute(self, sql, params=()):
+        with self._pool.connection() as raw:
+            return _run(raw, sql, params)
+
+
+class PostgresEngine(Engine):
+    dialect = "postgres"
+
+    def __init__(self, url: str):
+        try:
+            from psycopg_pool import ConnectionPool
+        except ImportError as e:
+            raise RuntimeError(
+                "INFORMA_DB_URL punta a PostgreSQL ma mancano i pacchetti 'psycopg[binary]' e 'psycopg-pool'."
+            ) from e
+
+        self._pool = ConnectionPool(
+            url,
+            min_size=int(os.getenv("INFORMA_DB_POOL_MIN", "2")),
+            max_size=int(os.getenv("INFORMA_DB_POOL_MAX", "20")),
+            kwargs={"autocommit": True},
+            open=True,
+        )
+        self._reader = _PooledReader(self._pool)
+        self._local = threading.local()
+
+    def get_conn(self):
+        return self._reader
+
+    def write(self, fn):
+        current = getattr(self._local, "tx", None)
+        if current is not None:
+            return fn(current)  # write annidata: stessa transazione
+        with self._pool.connection() as raw:
+            with raw.transaction():
+                self._local.tx = _PgConnection(raw)
+                try:
+                    return fn(self._local.tx)
+                finally:
+                    self._local.tx = None
+
+    def lock_schema(self, c):
+        c.execute("SELECT pg_advisory_xact_lock(4242)")
+
+
+def create_engine(url: str | None, sqlite_path) -> Engine:
+    if url and url.startswith(("postgres://", "postgresql://")):
+        return PostgresEngine(url)
+    return SQLiteEngine(sqlite_path)
@@ -0,0 +1,290 @@
+# db/migrations.py
+"""
+Migrazioni dello schema, in ordine. Ogni step riceve la connessione dello
+scrittore e gira nella sua transazione; la versione applicata viene
+registrata in schema_version. Per cambiare lo schema aggiungi uno step in
+fondo a MIGRATIONS: non modificare quelli già rilasciati.
+
+Gli import vanno tenuti qui in cima: gli step girano nel thread scrittore
+mentre `database` può essere ancora in fase di import nel thread principale.
+"""
+import sqlite3
+
+from db.repo_rollups import rebuild_rollups
+from db.repo_summaries import rebuild_day
+
+
+def _m001_base_schema(conn: sqlite3.Connection):
+    # users
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TEXT
+    )
+    """)
+
+    # profile
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_profile (
+        user_id INTEGER PRIMARY KEY,
+        start_weight REAL,
+        height_cm REAL,
+        sex TEXT,
+        age INTEGER,
+        activity_level TEXT,
+        goal_type TEXT,
+        goal_weight REAL,
+        goal_date TEXT,
+        body_fat REAL,
+        lean_mass REAL,
+        updated_at TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """)
+
+    # day logs
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS day_logs (
+        user_id INTEGER,
+        date TEXT,
+        morning_weight REAL,
+        is_closed INTEGER DEFAULT 0,
+        PRIMARY KEY(user_id, date),
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """)
+
+    # meals actual
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS meals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        date TEXT,
+        time TEXT,
+        description TEXT,
+        calories REAL,
+        raw_json TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """)
+
+    # workouts actual
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS workouts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        date TEXT,
+        time TEXT,
+        description TEXT,
+        duration_min INTEGER,
+        calories_burned REAL,
+        raw_json TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """)
+
+    # daily summaries
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_summaries (
+        user_id INTEGER,
+        date TEXT,
+        calories_in REAL,
+        rest_calories REAL,
+        workout_calories REAL,
+        calories_out REAL,
+        net_calories REAL,
+        PRIMARY KEY(user_id, date),
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """)
+
+    # planned events (calendar plan)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS planned_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        date TEXT,
+        time TEXT,
+        type TEXT,
+        title TEXT,
+        expected_calories REAL,
+        duration_min INTEGER,
+        status TEXT DEFAULT 'planned',
+        notes TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """)
+
+    # weekly plan cache
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS weekly_plan (
+        user_id INTEGER,
+        iso_year INTEGER,
+        iso_week INTEGER,
+        content TEXT,
+        created_at TEXT,
+        PRIMARY KEY(user_id, iso_year, iso_week),
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """)
+
+
+
+def _m002_user_date_indexes(conn: sqlite3.Connection):
+    # indici coprenti per le query per (utente, giorno)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_meals_user_date ON meals(user_id, date, time, calories)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_user_date ON workouts(user_id, date, time, calories_burned)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_planned_user_date ON planned_events(user_id, date, time)")
+
+
+def _m003_backfill_daily_summaries(conn: sqlite3.Connection):
+    # da qui i riepiloghi sono incrementali: ricostruisco una volta tutti i giorni con dati
+    days = conn.execute("""
+        SELECT user_id, date FROM meals
+        UNION SELECT user_id, date FROM workouts
+        UNION SELECT user_id, date FROM day_logs
+        UNION SELECT user_id, date FROM daily_summaries
+    """).fetchall()
+    for r in days:
+        rebuild_day(conn, r["user_id"], r["date"], rollups=False)  # rollup: migrazione 4
+
+
+def _m004_summary_rollups(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS summary_rollups (
+        user_id INTEGER,
+        period TEXT,
+        period_key TEXT,
+        start_date TEXT,
+        end_date TEXT,
+        closed_days INTEGER,
+        in_sum REAL,
+        out_sum REAL,
+        net_sum REAL,
+        w_min REAL,
+        w_max REAL,
+        w_sum REAL,
+        w_count INTEGER,
+        PRIMARY KEY(user_id, period, period_key),
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rollups_user_period_start ON summary_rollups(user_id, period, start_date)")
+
+    for r in conn.execute("SELECT DISTINCT user_id FROM day_logs").fetchall():
+        rebuild_rollups(conn, r["user_id"])
+
+
+def _m005_analytics_dirty(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS analytics_dirty (
+        tbl TEXT,
+        user_id INTEGER,
+        month TEXT,
+        gen INTEGER,
+        PRIMARY KEY(tbl, user_id, month)
+    )
+    """)
+
+    # primo export completo: marco tutte le partizioni esistenti
+    for tbl in ("meals", "workouts", "daily_summaries"):
+        conn.execute(f"""
+            INSERT INTO analytics_dirty (tbl, user_id, month, gen)
+            SELECT DISTINCT '{tbl}', user_id, substr(date, 1, 7), 1 FROM {tbl}
+            WHERE user_id IS NOT NULL AND date IS NOT NULL
+            ON CONFLICT(tbl, user_id, month) DO NOTHING
+        """)
+
+
+def _m006_ai_cache(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ai_cache (
+        cache_key TEXT PRIMARY KEY,
+        kind TEXT,
+        model TEXT,
+        value TEXT,
+        created_at REAL,
+        last_hit_at REAL,
+        hits INTEGER DEFAULT 0
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_last_hit ON ai_cache(last_hit_at)")
+
+
+def _m007_ai_photo_cache(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ai_photo_cache (
+        cache_key TEXT PRIMARY KEY,
+        note_key TEXT,
+        phash BIGINT,
+        model TEXT,
+        prompt_version INTEGER,
+        value TEXT,
+        created_at REAL,
+        last_hit_at REAL,
+        hits INTEGER DEFAULT 0
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_photo_cache_note ON ai_photo_cache(model, prompt_version, note_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_photo_cache_last_hit ON ai_photo_cache(last_hit_at)")
+
+
+def _m008_jobs(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        user_id INTEGER,
+        kind TEXT,
+        status TEXT,
+        params TEXT,
+        result TEXT,
+        error TEXT,
+        owner TEXT,
+        created_at TEXT,
+        started_at TEXT,
+        finished_at TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_owner ON jobs(status, owner)")
+
+
+def _m009_weekly_plan_inputs(conn: sqlite3.Connection):
+    # piani per hash degli input (riusabili tra settimane); weekly_plan ricorda da quali input viene
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS weekly_plan_history (
+        user_id INTEGER,
+        input_hash TEXT,
+        prompt_version INTEGER,
+        content TEXT,
+        created_at TEXT,
+        last_used_at TEXT,
+        PRIMARY KEY(user_id, input_hash),
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_weekly_plan_history_used ON weekly_plan_history(user_id, last_used_at)")
+    conn.execute("ALTER TABLE weekly_plan ADD COLUMN input_hash TEXT")
+
+
+def _m010_rollup_rest_workout(conn: sqlite3.Connection):
+    conn.execute("ALTER TABLE summary_rollups ADD COLUMN rest_sum REAL")
+    conn.execute("ALTER TABLE summary_rollups ADD COLUMN workout_sum REAL")
+    for r in conn.execute("SELECT DISTINCT user_id FROM day_logs").fetchall():
+        rebuild_rollups(conn, r["user_id"])
+
+
+MIGRATIONS = [
+    (1, "tabelle base", _m001_base_schema),
+    (2, "indici (user_id, date)", _m002_user_date_indexes),
+    (3, "backfill daily_summaries incrementali", _m003_backfill_daily_summaries),
+    (4, "rollup settimana/mese", _m004_summary_rollups),
+    (5, "partizioni da esportare nel mirror Parquet", _m005_analytics_dirty),
+    (6, "cache stime AI da testo", _m006_ai_cache),
+    (7, "cache analisi foto (hash esatto + percettivo)", _m007_ai_photo_cache),
+    (8, "job in background", _m008_jobs),
+    (9, "piani settimanali per hash degli input", _m009_weekly_plan_inputs),
+    (10, "rollup con riposo e allenamenti", _m010_rollup_rest_workout),
+]
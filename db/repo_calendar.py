@@ -0,0 +1,33 @@
+from datetime import date
+from database import get_conn
+
+def load_day_previews(user_id: int, start: date, end: date) -> dict:
+    """
+    Anteprime di tutti i giorni in [start, end] con tre query di range (indici su user_id, date).
+    Ritorna {"YYYY-MM-DD": {"weight", "closed", "net", "planned"}}; i giorni senza dati mancano.
+    """
+    c = get_conn()
+    params = (user_id, str(start), str(end))
+    out: dict = {}
+
+    def _day(ds):
+        return out.setdefault(ds, {"weight": None, "closed": False, "net": None, "planned": 0})
+
+    for r in c.execute(
+        "SELECT date, morning_weight, is_closed FROM day_logs WHERE user_id=? AND date BETWEEN ? AND ?", params
+    ):
+        p = _day(r["date"])
+        p["weight"] = float(r["morning_weight"]) if r["morning_weight"] is not None else None
+        p["closed"] = bool(r["is_closed"])
+
+    for r in c.execute(
+        "SELECT date, net_calories FROM daily_summaries WHERE user_id=? AND date BETWEEN ? AND ?", params
+    ):
+        _day(r["date"])["net"] = float(r["net_calories"]) if r["net_calories"] is not None else None
+
+    for r in c.execute(
+        "SELECT date, COUNT(*) AS n FROM planned_events WHERE user_id=? AND date BETWEEN ? AND ? GROUP BY date", params
+    ):
+        _day(r["date"])["planned"] = int(r["n"])
+
+    return out
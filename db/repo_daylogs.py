@@ -1,27 +1,53 @@
 from datetime import date
-from database import conn
+from database import get_conn
+from db.common import fetch_one
+from db.rows import DayLog, columns
+from db.repo_summaries import refresh_rest, touch_days
+from db.unit_of_work import UnitOfWork, run_write
 
-def get_day_log(user_id: int, d: date):
+def get_day_log(user_id: int, d: date) -> DayLog | None:
     ds = str(d)
-    return conn.execute(
-        "SELECT morning_weight, is_closed FROM day_logs WHERE user_id=? AND date=?",
+    return fetch_one(
+        DayLog,
+        f"SELECT {columns(DayLog)} FROM day_logs WHERE user_id=? AND date=?",
         (user_id, ds)
-    ).fetchone()
+    )
 
-def upsert_day_log(user_id: int, d: date, morning_weight=None, is_closed=None):
+def upsert_day_log(user_id: int, d: date, morning_weight=None, is_closed=None, uow: UnitOfWork | None = None):
     ds = str(d)
-    row = get_day_log(user_id, d)
 
-    if row:
-        mw = morning_weight if morning_weight is not None else row["morning_weight"]
-        ic = int(is_closed) if is_closed is not None else row["is_closed"]
-        conn.execute(
-            "UPDATE day_logs SET morning_weight=?, is_closed=? WHERE user_id=? AND date=?",
-            (mw, ic, user_id, ds)
-        )
-    else:
-        conn.execute(
-            "INSERT INTO day_logs (user_id, date, morning_weight, is_closed) VALUES (?,?,?,?)",
-            (user_id, ds, morning_weight, int(is_closed or 0))
-        )
-    conn.commit()
+    def _op(c):
+        row = c.execute(
+            "SELECT morning_weight, is_closed FROM day_logs WHERE user_id=? AND date=?",
+            (user_id, ds)
+        ).fetchone()
+
+        if row:
+            mw = morning_weight if morning_weight is not None else row["morning_weight"]
+            ic = int(is_closed) if is_closed is not None else row["is_closed"]
+            c.execute(
+                "UPDATE day_logs SET morning_weight=?, is_closed=? WHERE user_id=? AND date=?",
+                (mw, ic, user_id, ds)
+            )
+        else:
+            c.execute(
+                "INSERT INTO day_logs (user_id, date, morning_weight, is_closed) VALUES (?,?,?,?)",
+                (user_id, ds, morning_weight, int(is_closed or 0))
+            )
+
+        # il riposo dipende dal peso del mattino: ricalcolo solo se è cambiato
+        if morning_weight is not None and (not row or row["morning_weight"] != morning_weight):
+            refresh_rest(c, user_id, ds)
+        else:
+            touch_days(c, user_id, [ds])
+
+    run_write(_op, uow)
+
+def latest_morning_weight(user_id: int, d: date) -> float | None:
+    """Ultimo peso del mattino registrato fino al giorno d (compreso)."""
+    row = get_conn().execute(
+        "SELECT morning_weight FROM day_logs WHERE user_id=? AND date<=? AND morning_weight IS NOT NULL "
+        "ORDER BY date DESC LIMIT 1",
+        (user_id, str(d))
+    ).fetchone()
+    return float(row[0]) if row and row[0] else None
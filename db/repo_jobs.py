@@ -0,0 +1,82 @@
+# db/repo_jobs.py
+"""
+Tabella jobs: stato persistito dei lavori in background (services/jobs.py).
+Stati: queued -> running -> done | failed.
+"""
+from datetime import datetime, timedelta
+from typing import Callable
+
+from database import get_conn, write
+from db.common import fetch_one
+from db.rows import Job, columns
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def get_job(job_id: str) -> Job | None:
+    return fetch_one(Job, f"SELECT {columns(Job)} FROM jobs WHERE id=?", (job_id,))
+
+
+def insert_job(job_id: str, user_id: int, kind: str, params: str, owner: str):
+    write(lambda c: c.execute(
+        """
+        INSERT INTO jobs (id, user_id, kind, status, params, owner, created_at)
+        VALUES (?,?,?,'queued',?,?,?)
+        """,
+        (job_id, user_id, kind, params, owner, _now())
+    ))
+
+
+def start_job(job_id: str):
+    write(lambda c: c.execute(
+        "UPDATE jobs SET status='running', started_at=? WHERE id=? AND status='queued'", (_now(), job_id)
+    ))
+
+
+def finish_job(job_id: str, result: str):
+    write(lambda c: c.execute(
+        "UPDATE jobs SET status='done', result=?, finished_at=? WHERE id=? AND status IN ('queued', 'running')",
+        (result, _now(), job_id)
+    ))
+
+
+def fail_job(job_id: str, error: str):
+    write(lambda c: c.execute(
+        "UPDATE jobs SET status='failed', error=?, finished_at=? WHERE id=? AND status IN ('queued', 'running')",
+        (error, _now(), job_id)
+    ))
+
+
+def fail_orphaned_jobs(host: str, owner: str, is_alive: Callable[[str], bool], keep_days: int = 7) -> int:
+    """
+    Avvio del processo: i job rimasti queued/running da un processo dello stesso
+    host che non esiste più non finiranno mai -> failed. I job degli altri
+    processi ancora vivi (più worker sullo stesso host) non si toccano.
+    Elimina anche lo storico più vecchio di keep_days.
+    """
+    now = _now()
+    cutoff = (datetime.now() - timedelta(days=keep_days)).isoformat(timespec="seconds")
+    owners = [
+        r["owner"] for r in get_conn().execute(
+            "SELECT DISTINCT owner FROM jobs WHERE status IN ('queued', 'running') AND owner LIKE ? AND owner <> ?",
+            (f"{host}:%", owner)
+        )
+    ]
+    dead = [o for o in owners if not is_alive(o)]
+
+    def _op(c):
+        n = 0
+        for o in dead:
+            n += c.execute(
+                """
+                UPDATE jobs SET status='failed', error='Interrotto dal riavvio del server.', finished_at=?
+                WHERE status IN ('queued', 'running') AND owner=?
+                """,
+                (now, o)
+            ).rowcount
+        c.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,))
+        return n
+
+    return write(_op)
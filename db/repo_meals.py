@@ -1,19 +1,108 @@
-from database import conn
-from db.common import safe_read_sql
+from typing import Callable
 
-def list_meals(user_id: int, ds: str):
-    return safe_read_sql(
-        "SELECT id, time, description, calories, raw_json FROM meals WHERE user_id=? AND date=? ORDER BY time",
+from database import get_conn
+from db.common import fetch_rows
+from db.rows import Meal, columns
+from db.repo_mirror import mark_dirty
+from db.repo_summaries import apply_delta, apply_deltas
+from db.unit_of_work import UnitOfWork, run_write
+
+_INSERT_SQL = "INSERT INTO meals (user_id, date, time, description, calories, raw_json) VALUES (?,?,?,?,?,?)"
+
+# fn(user_id, rows) dopo il commit: rows = pasti inseriti (tuple come in insert_meals), None = pasto eliminato
+_listeners: list[Callable[[int, list | None], None]] = []
+
+
+def on_meals_changed(fn: Callable[[int, list | None], None]):
+    _listeners.append(fn)
+
+
+def _notify(by_user: dict, uow: UnitOfWork | None):
+    if not _listeners:
+        return
+
+    def _fire():
+        for user_id, rows in by_user.items():
+            for fn in _listeners:
+                try:
+                    fn(user_id, rows)
+                except Exception:
+                    pass  # un indice in memoria non deve far fallire il salvataggio
+
+    if uow is not None:
+        uow.after_commit(_fire)
+    else:
+        _fire()
+
+
+def list_meals(user_id: int, ds: str) -> list[Meal]:
+    return fetch_rows(
+        Meal,
+        f"SELECT {columns(Meal)} FROM meals WHERE user_id=? AND date=? ORDER BY time",
         (user_id, ds)
     )
 
-def insert_meal(user_id: int, ds: str, time_str: str, description: str, calories: float, raw_json: str | None):
-    conn.execute(
-        "INSERT INTO meals (user_id, date, time, description, calories, raw_json) VALUES (?,?,?,?,?,?)",
-        (user_id, ds, time_str, description, float(calories), raw_json),
-    )
-    conn.commit()
+def list_recent_meals(user_id: int, limit: int) -> list[tuple[str, float, str]]:
+    """(description, calories, date) dei pasti più recenti, dal più nuovo."""
+    return [
+        (r[0], float(r[1] or 0), r[2])
+        for r in get_conn().execute(
+            "SELECT description, calories, date FROM meals WHERE user_id=? ORDER BY date DESC, time DESC, id DESC LIMIT ?",
+            (user_id, int(limit)),
+        )
+    ]
+
+def insert_meal(user_id: int, ds: str, time_str: str, description: str, calories: float, raw_json: str | None,
+                uow: UnitOfWork | None = None):
+    row = (user_id, ds, time_str, description, float(calories), raw_json)
+
+    def _op(c):
+        meal_id = c.execute(_INSERT_SQL + " RETURNING id", row).fetchone()[0]
+        mark_dirty(c, "meals", user_id, [ds])
+        apply_delta(c, user_id, ds, d_in=row[4])
+        return meal_id
+
+    meal_id = run_write(_op, uow)
+    _notify({user_id: [row]}, uow)
+    return meal_id
+
+def insert_meals(rows, uow: UnitOfWork | None = None, summaries: bool = True):
+    """
+    Inserimento bulk: rows = iterabile di (user_id, date, time, description, calories, raw_json).
+    summaries=False: daily_summaries non viene toccato (l'import ricostruisce i giorni alla fine).
+    """
+    rows = [(u, ds, t, desc, float(kcal), raw) for u, ds, t, desc, kcal, raw in rows]
+
+    def _op(c):
+        n = c.executemany(_INSERT_SQL, rows).rowcount
+        deltas = {}
+        for u, ds, _, _, kcal, _ in rows:
+            d_in, _w = deltas.get((u, ds), (0.0, 0.0))
+            deltas[(u, ds)] = (d_in + kcal, 0.0)
+        touched = {}
+        for u, ds in deltas:
+            touched.setdefault(u, []).append(ds)
+        for u, dates in touched.items():
+            mark_dirty(c, "meals", u, dates)
+        if summaries:
+            apply_deltas(c, deltas)
+        return n
+
+    n = run_write(_op, uow)
+    by_user = {}
+    for r in rows:
+        by_user.setdefault(r[0], []).append(r)
+    _notify(by_user, uow)
+    return n
+
+def delete_meal(user_id: int, meal_id: int, uow: UnitOfWork | None = None):
+    def _op(c):
+        row = c.execute("SELECT date, calories FROM meals WHERE user_id=? AND id=?", (user_id, meal_id)).fetchone()
+        if not row:
+            return
+        c.execute("DELETE FROM meals WHERE user_id=? AND id=?", (user_id, meal_id))
+        mark_dirty(c, "meals", user_id, [row["date"]])
+        apply_delta(c, user_id, row["date"], d_in=-float(row["calories"] or 0))
 
-def delete_meal(user_id: int, meal_id: int):
-    conn.execute("DELETE FROM meals WHERE user_id=? AND id=?", (user_id, meal_id))
-    conn.commit()
+    run_write(_op, uow)
+    _notify({user_id: None}, uow)
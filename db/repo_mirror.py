@@ -0,0 +1,53 @@
+# db/repo_mirror.py
+"""
+Partizioni (tabella, utente, mese) da riesportare nel mirror Parquet.
+Le scritture le marcano nella loro stessa transazione; services/analytics_mirror
+le consuma. `gen` cresce a ogni marcatura: si cancella la marca solo se nessuno
+l'ha rinnovata durante l'export.
+"""
+from database import get_conn
+
+
+def mark_dirty(c, table: str, user_id: int, dates):
+    for month in {str(ds)[:7] for ds in dates}:
+        c.execute(
+            """
+            INSERT INTO analytics_dirty (tbl, user_id, month, gen) VALUES (?,?,?,1)
+            ON CONFLICT(tbl, user_id, month) DO UPDATE SET gen = analytics_dirty.gen + 1
+            """,
+            (table, user_id, month)
+        )
+
+
+def mark_user_dirty(c, table: str, user_id: int):
+    months = c.execute(
+        f"SELECT DISTINCT substr(date, 1, 7) AS m FROM {table} WHERE user_id=?", (user_id,)
+    ).fetchall()
+    mark_dirty(c, table, user_id, [r["m"] for r in months])
+
+
+def mark_all_dirty(c, tables):
+    """Export completo: marca ogni partizione esistente delle tabelle indicate."""
+    for table in tables:
+        c.execute(
+            f"""
+            INSERT INTO analytics_dirty (tbl, user_id, month, gen)
+            SELECT DISTINCT ?, user_id, substr(date, 1, 7), 1 FROM {table}
+            WHERE user_id IS NOT NULL AND date IS NOT NULL
+            ON CONFLICT(tbl, user_id, month) DO UPDATE SET gen = analytics_dirty.gen + 1
+            """,
+            (table,)
+        )
+
+
+def dirty_partitions() -> list:
+    return get_conn().execute(
+        "SELECT tbl, user_id, month, gen FROM analytics_dirty ORDER BY tbl, user_id, month"
+    ).fetchall()
+
+
+def clear_dirty(c, table: str, user_id: int, month: str, gen: int):
+    c.execute(
+        "DELETE FROM analytics_dirty WHERE tbl=? AND user_id=? AND month=? AND gen=?",
+        (table, user_id, month, gen)
+    )
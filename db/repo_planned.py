@@ -1,11 +1,19 @@
 from datetime import date
-from database import conn
-from db.common import safe_read_sql
+from db.common import fetch_rows
+from db.rows import PlannedEvent, columns
+from db.unit_of_work import UnitOfWork, run_write
 
-def list_planned(user_id: int, ds: str):
-    return safe_read_sql(
-        """
-        SELECT id, time, type, title, expected_calories, duration_min, status, notes
+_INSERT_SQL = """
+    INSERT INTO planned_events
+      (user_id, date, time, type, title, expected_calories, duration_min, status, notes)
+    VALUES (?,?,?,?,?,?,?,?,?)
+"""
+
+def list_planned(user_id: int, ds: str) -> list[PlannedEvent]:
+    return fetch_rows(
+        PlannedEvent,
+        f"""
+        SELECT {columns(PlannedEvent)}
         FROM planned_events
         WHERE user_id=? AND date=?
         ORDER BY time
@@ -15,22 +23,52 @@ def list_planned(user_id: int, ds: str):
 
 def add_planned(
     user_id: int, ds: str, time_str: str, typ: str, title: str,
-    expected_calories: float | None, duration_min: int | None, notes: str | None
+    expected_calories: float | None, duration_min: int | None, notes: str | None,
+    uow: UnitOfWork | None = None,
 ):
-    conn.execute(
-        """
-        INSERT INTO planned_events
-          (user_id, date, time, type, title, expected_calories, duration_min, status, notes)
-        VALUES (?,?,?,?,?,?,?,?,?)
-        """,
-        (user_id, ds, time_str, typ, title, expected_calories, duration_min, "planned", notes)
+    row = (user_id, ds, time_str, typ, title, expected_calories, duration_min, "planned", notes)
+    return run_write(lambda c: c.execute(_INSERT_SQL + " RETURNING id", row).fetchone()[0], uow)
+
+def add_planned_many(rows, uow: UnitOfWork | None = None):
+    """
+    Inserimento bulk: rows = iterabile di
+    (user_id, date, time, type, title, expected_calories, duration_min, notes).
+    """
+    rows = [(u, ds, t, typ, title, kcal, dur, "planned", notes) for u, ds, t, typ, title, kcal, dur, notes in rows]
+    return run_write(lambda c: c.executemany(_INSERT_SQL, rows).rowcount, uow)
+
+def delete_planned(user_id: int, planned_id: int, uow: UnitOfWork | None = None):
+    run_write(lambda c: c.execute("DELETE FROM planned_events WHERE user_id=? AND id=?", (user_id, planned_id)), uow)
+
+def delete_planned_range(user_id: int, start: date, end: date, uow: UnitOfWork | None = None):
+    run_write(
+        lambda c: c.execute(
+            "DELETE FROM planned_events WHERE user_id=? AND date>=? AND date<=?",
+            (user_id, str(start), str(end))
+        ),
+        uow,
     )
-    conn.commit()
 
-def delete_planned(user_id: int, planned_id: int):
-    conn.execute("DELETE FROM planned_events WHERE user_id=? AND id=?", (user_id, planned_id))
-    conn.commit()
+def delete_plan_events(user_id: int, start: date, end: date, meal_suffix: str, workout_note: str,
+                       uow: UnitOfWork | None = None):
+    """
+    Solo gli eventi inseriti dal piano settimanale e non ancora fatti: quelli
+    aggiunti a mano e quelli già segnati come fatti restano.
+    """
+    run_write(
+        lambda c: c.execute(
+            """
+            DELETE FROM planned_events
+            WHERE user_id=? AND date>=? AND date<=? AND COALESCE(status, 'planned')='planned'
+              AND ((type='meal' AND title LIKE ?) OR (type='workout' AND notes=?))
+            """,
+            (user_id, str(start), str(end), f"%{meal_suffix}", workout_note)
+        ),
+        uow,
+    )
 
-def mark_done(user_id: int, planned_id: int):
-    conn.execute("UPDATE planned_events SET status='done' WHERE user_id=? AND id=?", (user_id, planned_id))
-    conn.commit()
+def mark_done(user_id: int, planned_id: int, uow: UnitOfWork | None = None):
+    run_write(
+        lambda c: c.execute("UPDATE planned_events SET status='done' WHERE user_id=? AND id=?", (user_id, planned_id)),
+        uow,
+    )
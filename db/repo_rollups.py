@@ -0,0 +1,187 @@
+# db/repo_rollups.py
+"""
+Rollup per settimana ISO e per mese di daily_summaries + day_logs, per
+servire range lunghi (1 anno, tutto) con poche righe.
+
+Un bucket contiene: giornate chiuse, somme IN/riposo/allenamenti/OUT/NET
+delle giornate chiuse, peso min/max e somma/conteggio (per la media) su tutti i giorni con peso.
+Quando un giorno cambia si ricalcolano i suoi due bucket (≤ 31 righe).
+"""
+import calendar as cal
+from datetime import date, timedelta
+
+from database import get_conn, upsert_sql
+from utils import iso_year_week
+
+_AGG_SQL = """
+    SELECT
+      COALESCE(SUM(CASE WHEN dl.is_closed = 1 THEN 1 ELSE 0 END), 0) AS closed_days,
+      COALESCE(SUM(CASE WHEN dl.is_closed = 1 THEN ds.calories_in END), 0) AS in_sum,
+      COALESCE(SUM(CASE WHEN dl.is_closed = 1 THEN ds.rest_calories END), 0) AS rest_sum,
+      COALESCE(SUM(CASE WHEN dl.is_closed = 1 THEN ds.workout_calories END), 0) AS workout_sum,
+      COALESCE(SUM(CASE WHEN dl.is_closed = 1 THEN ds.calories_out END), 0) AS out_sum,
+      COALESCE(SUM(CASE WHEN dl.is_closed = 1 THEN ds.net_calories END), 0) AS net_sum,
+      MIN(dl.morning_weight) AS w_min,
+      MAX(dl.morning_weight) AS w_max,
+      COALESCE(SUM(dl.morning_weight), 0) AS w_sum,
+      COUNT(dl.morning_weight) AS w_count
+    FROM day_logs dl
+    LEFT JOIN daily_summaries ds
+      ON ds.user_id = dl.user_id AND ds.date = dl.date
+    WHERE dl.user_id = ?
+      AND dl.date BETWEEN ? AND ?
+"""
+
+_STAT_KEYS = [
+    "closed_days", "in_sum", "rest_sum", "workout_sum", "out_sum", "net_sum", "w_min", "w_max", "w_sum", "w_count",
+]
+
+_COLUMNS = ["user_id", "period", "period_key", "start_date", "end_date"] + _STAT_KEYS
+
+
+# ----------------------------
+# Bucket
+# ----------------------------
+def week_bounds(d: date) -> tuple[str, date, date]:
+    y, w = iso_year_week(d)
+    start = d - timedelta(days=d.weekday())
+    return f"{y}-W{w:02d}", start, start + timedelta(days=6)
+
+
+def month_bounds(d: date) -> tuple[str, date, date]:
+    start = d.replace(day=1)
+    end = d.replace(day=cal.monthrange(d.year, d.month)[1])
+    return f"{d.year}-{d.month:02d}", start, end
+
+
+def _aggregate(c, user_id: int, start: date, end: date) -> dict:
+    return dict(c.execute(_AGG_SQL, (user_id, str(start), str(end))).fetchone())
+
+
+def _refresh_bucket(c, user_id: int, period: str, key: str, start: date, end: date):
+    stats = _aggregate(c, user_id, start, end)
+    c.execute(
+        upsert_sql("summary_rollups", _COLUMNS, ["user_id", "period", "period_key"]),
+        (user_id, period, key, str(start), str(end)) + tuple(stats[k] for k in _STAT_KEYS)
+    )
+
+
+def refresh_rollups(c, user_id: int, dates):
+    """Ricalcola i bucket settimana/mese che contengono le date indicate (una volta per bucket)."""
+    buckets = set()
+    for ds in dates:
+        d = date.fromisoformat(str(ds))
+        buckets.add(("week",) + week_bounds(d))
+        buckets.add(("month",) + month_bounds(d))
+    for period, key, start, end in buckets:
+        _refresh_bucket(c, user_id, period, key, start, end)
+
+
+def rebuild_rollups(c, user_id: int):
+    rows = c.execute("SELECT date FROM day_logs WHERE user_id=?", (user_id,)).fetchall()
+    refresh_rollups(c, user_id, [r["date"] for r in rows])
+
+
+# ----------------------------
+# Letture
+# ----------------------------
+def _plan_range(d0: date, d1: date):
+    """
+    Scompone [d0, d1] in mesi interi, settimane intere e tratti di giorni sciolti.
+    Una settimana che sconfina in un mese interamente nel range lascia il posto ai giorni,
+    così il mese successivo può essere preso intero.
+    """
+    months, weeks, day_runs = [], [], []
+    cursor = d0
+    while cursor <= d1:
+        m_key, m_start, m_end = month_bounds(cursor)
+        if cursor == m_start and m_end <= d1:
+            months.append(m_key)
+            cursor = m_end + timedelta(days=1)
+            continue
+
+        w_key, w_start, w_end = week_bounds(cursor)
+        if cursor == w_start and w_end <= d1:
+            next_m_key, next_m_start, next_m_end = month_bounds(w_end)
+            crosses_full_month = next_m_start > cursor and next_m_end <= d1
+            if not crosses_full_month:
+                weeks.append(w_key)
+                cursor = w_end + timedelta(days=1)
+                continue
+
+        if day_runs and day_runs[-1][1] + timedelta(days=1) == cursor:
+            day_runs[-1][1] = cursor
+        else:
+            day_runs.append([cursor, cursor])
+        cursor += timedelta(days=1)
+    return months, weeks, day_runs
+
+
+def range_totals(user_id: int, d0: date, d1: date) -> dict:
+    """
+    Totali del range combinando rollup e giorni ai bordi.
+    Ritorna closed_days, in_sum, out_sum, net_sum, w_min, w_max, w_avg.
+    """
+    c = get_conn()
+    months, weeks, day_runs = _plan_range(d0, d1)
+
+    parts = []
+    for period, keys in (("month", months), ("week", weeks)):
+        if not keys:
+            continue
+        marks = ",".join("?" for _ in keys)
+        parts += [
+            dict(r) for r in c.execute(
+                f"SELECT {', '.join(_STAT_KEYS)} FROM summary_rollups "
+                f"WHERE user_id=? AND period=? AND period_key IN ({marks})",
+                (user_id, period, *keys)
+            )
+        ]
+    parts += [_aggregate(c, user_id, a, b) for a, b in day_runs]
+
+    out = {"closed_days": 0, "in_sum": 0.0, "out_sum": 0.0, "net_sum": 0.0, "w_min": None, "w_max": None}
+    w_sum, w_count = 0.0, 0
+    for p in parts:
+        out["closed_days"] += int(p["closed_days"] or 0)
+        for k in ("in_sum", "out_sum", "net_sum"):
+            out[k] += float(p[k] or 0)
+        if p["w_min"] is not None:
+            out["w_min"] = p["w_min"] if out["w_min"] is None else min(out["w_min"], p["w_min"])
+        if p["w_max"] is not None:
+            out["w_max"] = p["w_max"] if out["w_max"] is None else max(out["w_max"], p["w_max"])
+        w_sum += float(p["w_sum"] or 0)
+        w_count += int(p["w_count"] or 0)
+    out["w_avg"] = (w_sum / w_count) if w_count else None
+    return out
+
+
+def week_series(user_id: int, d0: date, d1: date) -> list[dict]:
+    """
+    Una riga per settimana ISO di [d0, d1] con i dati di _STAT_KEYS: le settimane
+    intere dai rollup, quelle ai bordi ricalcolate sui soli giorni del range
+    (start_date/end_date tagliati, partial=True). Settimane senza dati omesse.
+    """
+    c = get_conn()
+    full = {
+        r["start_date"]: dict(r) for r in c.execute(
+            f"SELECT start_date, {', '.join(_STAT_KEYS)} FROM summary_rollups "
+            "WHERE user_id=? AND period='week' AND start_date >= ? AND end_date <= ?",
+            (user_id, str(d0), str(d1))
+        )
+    }
+    rows = []
+    cursor = d0
+    while cursor <= d1:
+        _, w_start, w_end = week_bounds(cursor)
+        a, b = max(w_start, d0), min(w_end, d1)
+        partial = (a, b) != (w_start, w_end)
+        stats = _aggregate(c, user_id, a, b) if partial else full.get(str(w_start))
+        if stats and (stats["closed_days"] or stats["w_count"]):
+            rows.append({**stats, "start_date": str(a), "end_date": str(b), "partial": partial})
+        cursor = w_end + timedelta(days=1)
+    return rows
+
+
+def first_date(user_id: int) -> date | None:
+    row = get_conn().execute("SELECT MIN(date) AS d FROM day_logs WHERE user_id=?", (user_id,)).fetchone()
+    return date.fromisoformat(row["d"]) if row and row["d"] else None
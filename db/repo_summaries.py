@@ -0,0 +1,209 @@
+# db/repo_summaries.py
+"""
+daily_summaries mantenuto in modo incrementale dai repository:
+- pasti/allenamenti applicano un delta (IN / workout) alla riga del giorno;
+- le calorie a riposo si ricalcolano solo quando cambia il peso del mattino
+  o il profilo.
+Tutte le funzioni con parametro `c` girano sulla connessione dello scrittore,
+nella stessa transazione della scrittura che le ha causate.
+"""
+from datetime import date
+
+from database import upsert_sql
+from db.common import fetch_one, fetch_rows
+from db.repo_mirror import mark_dirty, mark_user_dirty
+from db.repo_rollups import rebuild_rollups, refresh_rollups
+from db.rows import DailySummary, columns
+from utils import kcal_round
+
+DEFAULT_AGE = 30
+
+
+def get_summary(user_id: int, d: date) -> DailySummary | None:
+    return fetch_one(
+        DailySummary,
+        f"SELECT {columns(DailySummary)} FROM daily_summaries WHERE user_id=? AND date=?",
+        (user_id, str(d))
+    )
+
+
+def list_summaries(user_id: int, start: date, end: date) -> list[DailySummary]:
+    return fetch_rows(
+        DailySummary,
+        f"SELECT {columns(DailySummary)} FROM daily_summaries WHERE user_id=? AND date>=? AND date<=? ORDER BY date",
+        (user_id, str(start), str(end))
+    )
+
+
+# ----------------------------
+# Calorie a riposo (REST = peso+altezza)
+# ----------------------------
+def _profile_row(c, user_id: int):
+    return c.execute(
+        "SELECT start_weight, height_cm, age FROM user_profile WHERE user_id=?",
+        (user_id,)
+    ).fetchone()
+
+
+def rest_from_profile(profile, morning_weight) -> float:
+    """
+    Mifflin-St Jeor "neutra": BMR = 10*w + 6.25*h - 5*eta.
+    Peso del mattino del giorno, altrimenti start_weight del profilo; età di default se manca.
+    0 se mancano peso o altezza.
+    """
+    if not profile:
+        return 0.0
+    w = morning_weight if morning_weight not in (None, 0, "") else profile["start_weight"]
+    h = profile["height_cm"]
+    if w in (None, 0, "") or h in (None, 0, ""):
+        return 0.0
+    try:
+        age = int(profile["age"]) if profile["age"] not in (None, "", 0) else DEFAULT_AGE
+    except Exception:
+        age = DEFAULT_AGE
+    return float(kcal_round((10.0 * float(w)) + (6.25 * float(h)) - (5.0 * age)))
+
+
+def _rest_calories(c, user_id: int, ds: str) -> float:
+    row = c.execute(
+        "SELECT morning_weight FROM day_logs WHERE user_id=? AND date=?",
+        (user_id, ds)
+    ).fetchone()
+    return rest_from_profile(_profile_row(c, user_id), row["morning_weight"] if row else None)
+
+
+def _ensure_row(c, user_id: int, ds: str):
+    exists = c.execute(
+        "SELECT 1 FROM daily_summaries WHERE user_id=? AND date=?", (user_id, ds)
+    ).fetchone()
+    if exists:
+        return
+    rest = _rest_calories(c, user_id, ds)
+    c.execute(
+        """
+        INSERT INTO daily_summaries
+            (user_id, date, calories_in, rest_calories, workout_calories, calories_out, net_calories)
+        VALUES (?, ?, 0, ?, 0, ?, ?)
+        """,
+        (user_id, ds, rest, rest, -rest)
+    )
+
+
+# ----------------------------
+# Aggiornamenti incrementali
+# ----------------------------
+def touch_days(c, user_id: int, dates):
+    """Propaga il cambiamento di uno o più giorni: rollup settimana/mese + mirror analytics."""
+    refresh_rollups(c, user_id, dates)
+    mark_dirty(c, "daily_summaries", user_id, dates)
+
+
+def _apply_delta(c, user_id: int, ds: str, d_in: float, d_workout: float):
+    _ensure_row(c, user_id, ds)
+    c.execute(
+        """
+        UPDATE daily_summaries SET
+            calories_in = calories_in + ?,
+            workout_calories = workout_calories + ?,
+            calories_out = rest_calories + workout_calories + ?,
+            net_calories = (calories_in + ?) - (rest_calories + workout_calories + ?)
+        WHERE user_id=? AND date=?
+        """,
+        (d_in, d_workout, d_workout, d_in, d_workout, user_id, ds)
+    )
+
+
+def apply_delta(c, user_id: int, ds: str, d_in: float = 0.0, d_workout: float = 0.0):
+    _apply_delta(c, user_id, ds, d_in, d_workout)
+    touch_days(c, user_id, [ds])
+
+
+def apply_deltas(c, deltas: dict):
+    """deltas = {(user_id, date): (d_in, d_workout)} — usato dagli inserimenti bulk."""
+    touched: dict = {}
+    for (user_id, ds), (d_in, d_workout) in deltas.items():
+        _apply_delta(c, user_id, ds, d_in, d_workout)
+        touched.setdefault(user_id, []).append(ds)
+    for user_id, dates in touched.items():
+        touch_days(c, user_id, dates)
+
+
+def refresh_rest(c, user_id: int, ds: str):
+    """Ricalcola le calorie a riposo di un giorno (peso del mattino cambiato)."""
+    _ensure_row(c, user_id, ds)
+    rest = _rest_calories(c, user_id, ds)
+    c.execute(
+        """
+        UPDATE daily_summaries SET
+            rest_calories = ?,
+            calories_out = ? + workout_calories,
+            net_calories = calories_in - (? + workout_calories)
+        WHERE user_id=? AND date=?
+        """,
+        (rest, rest, rest, user_id, ds)
+    )
+    touch_days(c, user_id, [ds])
+
+
+def refresh_rest_all(c, user_id: int):
+    """Ricalcola le calorie a riposo di tutti i giorni dell'utente (profilo cambiato)."""
+    profile = _profile_row(c, user_id)
+    rows = c.execute(
+        """
+        SELECT ds.date AS date, dl.morning_weight AS morning_weight
+        FROM daily_summaries ds
+        LEFT JOIN day_logs dl ON dl.user_id = ds.user_id AND dl.date = ds.date
+        WHERE ds.user_id=?
+        """,
+        (user_id,)
+    ).fetchall()
+    params = []
+    for r in rows:
+        rest = rest_from_profile(profile, r["morning_weight"])
+        params.append((rest, rest, rest, user_id, r["date"]))
+    c.executemany(
+        """
+        UPDATE daily_summaries SET
+            rest_calories = ?,
+            calories_out = ? + workout_calories,
+            net_calories = calories_in - (? + workout_calories)
+        WHERE user_id=? AND date=?
+        """,
+        params
+    )
+    rebuild_rollups(c, user_id)
+    mark_user_dirty(c, "daily_summaries", user_id)
+
+
+def rebuild_day(c, user_id: int, ds: str, rollups: bool = True):
+    """Ricalcolo completo di un giorno (backfill / import)."""
+    calories_in = float(c.execute(
+        "SELECT COALESCE(SUM(calories), 0) AS s FROM meals WHERE user_id=? AND date=?", (user_id, ds)
+    ).fetchone()["s"])
+    workout_calories = float(c.execute(
+        "SELECT COALESCE(SUM(calories_burned), 0) AS s FROM workouts WHERE user_id=? AND date=?", (user_id, ds)
+    ).fetchone()["s"])
+    rest_calories = _rest_calories(c, user_id, ds)
+
+    calories_out = rest_calories + workout_calories
+    net_calories = calories_in - calories_out
+
+    c.execute(
+        upsert_sql(
+            "daily_summaries",
+            ["user_id", "date", "calories_in", "rest_calories", "workout_calories", "calories_out", "net_calories"],
+            ["user_id", "date"],
+        ),
+        (user_id, ds, calories_in, rest_calories, workout_calories, calories_out, net_calories)
+    )
+    if rollups:
+        touch_days(c, user_id, [ds])
+
+
+def rebuild_days(c, user_id: int, dates):
+    """Ricalcolo completo di più giorni, con rollup e mirror aggiornati una volta sola (import)."""
+    dates = sorted(set(dates))
+    for ds in dates:
+        rebuild_day(c, user_id, ds, rollups=False)
+    if dates:
+        touch_days(c, user_id, dates)
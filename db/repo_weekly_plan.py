@@ -0,0 +1,84 @@
+# db/repo_weekly_plan.py
+"""
+Piani settimanali.
+- weekly_plan_history: un piano per (utente, hash degli input), riusabile in
+  qualunque settimana con gli stessi input; si tengono gli ultimi `keep`
+  usati per utente.
+- weekly_plan: il piano assegnato a una settimana ISO, con l'hash degli input
+  da cui viene (per capire se è ancora attuale).
+"""
+from datetime import datetime
+
+from database import upsert_sql
+from db.common import fetch_one
+from db.rows import WeeklyPlan, columns
+from db.unit_of_work import UnitOfWork, run_write
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def get_week_plan(user_id: int, iso_year: int, iso_week: int) -> WeeklyPlan | None:
+    return fetch_one(
+        WeeklyPlan,
+        f"SELECT {columns(WeeklyPlan)} FROM weekly_plan WHERE user_id=? AND iso_year=? AND iso_week=?",
+        (user_id, iso_year, iso_week)
+    )
+
+
+def find_plan(user_id: int, input_hash: str) -> WeeklyPlan | None:
+    """Piano già generato con gli stessi input, di qualunque settimana."""
+    return fetch_one(
+        WeeklyPlan,
+        f"SELECT {columns(WeeklyPlan)} FROM weekly_plan_history WHERE user_id=? AND input_hash=?",
+        (user_id, input_hash)
+    )
+
+
+def _assign(c, user_id: int, iso_year: int, iso_week: int, input_hash: str, content: str, now: str):
+    c.execute(
+        upsert_sql("weekly_plan", ["user_id", "iso_year", "iso_week", "content", "created_at", "input_hash"],
+                   ["user_id", "iso_year", "iso_week"]),
+        (user_id, iso_year, iso_week, content, now, input_hash)
+    )
+
+
+def save_plan(user_id: int, iso_year: int, iso_week: int, input_hash: str, prompt_version: int,
+              content: str, keep: int, uow: UnitOfWork | None = None) -> int | None:
+    """
+    Salva un piano appena generato e lo assegna alla settimana. Ritorna i piani
+    vecchi eliminati (None se accodato a una unit of work).
+    """
+    now = _now()
+
+    def _op(c):
+        c.execute(
+            upsert_sql("weekly_plan_history",
+                       ["user_id", "input_hash", "prompt_version", "content", "created_at", "last_used_at"],
+                       ["user_id", "input_hash"]),
+            (user_id, input_hash, prompt_version, content, now, now)
+        )
+        _assign(c, user_id, iso_year, iso_week, input_hash, content, now)
+        return c.execute(
+            """
+            DELETE FROM weekly_plan_history WHERE user_id=? AND input_hash NOT IN (
+                SELECT input_hash FROM weekly_plan_history WHERE user_id=? ORDER BY last_used_at DESC LIMIT ?
+            )
+            """,
+            (user_id, user_id, max(1, keep))
+        ).rowcount
+
+    return run_write(_op, uow)
+
+
+def reuse_plan(user_id: int, iso_year: int, iso_week: int, plan: WeeklyPlan, uow: UnitOfWork | None = None):
+    """Assegna alla settimana un piano dello storico (stessi input) e ne aggiorna l'ultimo uso."""
+    now = _now()
+
+    def _op(c):
+        c.execute("UPDATE weekly_plan_history SET last_used_at=? WHERE user_id=? AND input_hash=?",
+                  (now, user_id, plan.input_hash))
+        _assign(c, user_id, iso_year, iso_week, plan.input_hash, plan.content, now)
+
+    run_write(_op, uow)
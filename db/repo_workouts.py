@@ -1,19 +1,66 @@
-from database import conn
-from db.common import safe_read_sql
+from db.common import fetch_rows
+from db.rows import Workout, columns
+from db.repo_mirror import mark_dirty
+from db.repo_summaries import apply_delta, apply_deltas
+from db.unit_of_work import UnitOfWork, run_write
 
-def list_workouts(user_id: int, ds: str):
-    return safe_read_sql(
-        "SELECT id, time, description, duration_min, calories_burned, raw_json FROM workouts WHERE user_id=? AND date=? ORDER BY time",
+_INSERT_SQL = (
+    "INSERT INTO workouts (user_id, date, time, description, duration_min, calories_burned, raw_json) "
+    "VALUES (?,?,?,?,?,?,?)"
+)
+
+def list_workouts(user_id: int, ds: str) -> list[Workout]:
+    return fetch_rows(
+        Workout,
+        f"SELECT {columns(Workout)} FROM workouts WHERE user_id=? AND date=? ORDER BY time",
         (user_id, ds)
     )
 
-def insert_workout(user_id: int, ds: str, time_str: str, description: str, duration_min: int, calories_burned: float, raw_json: str | None):
-    conn.execute(
-        "INSERT INTO workouts (user_id, date, time, description, duration_min, calories_burned, raw_json) VALUES (?,?,?,?,?,?,?)",
-        (user_id, ds, time_str, description, int(duration_min), float(calories_burned), raw_json),
-    )
-    conn.commit()
+def insert_workout(user_id: int, ds: str, time_str: str, description: str, duration_min: int, calories_burned: float, raw_json: str | None,
+                   uow: UnitOfWork | None = None):
+    row = (user_id, ds, time_str, description, int(duration_min), float(calories_burned), raw_json)
+
+    def _op(c):
+        workout_id = c.execute(_INSERT_SQL + " RETURNING id", row).fetchone()[0]
+        mark_dirty(c, "workouts", user_id, [ds])
+        apply_delta(c, user_id, ds, d_workout=row[5])
+        return workout_id
+
+    return run_write(_op, uow)
+
+def insert_workouts(rows, uow: UnitOfWork | None = None, summaries: bool = True):
+    """
+    Inserimento bulk: rows = iterabile di (user_id, date, time, description, duration_min, calories_burned, raw_json).
+    summaries=False: daily_summaries non viene toccato (l'import ricostruisce i giorni alla fine).
+    """
+    rows = [(u, ds, t, desc, int(dur), float(kcal), raw) for u, ds, t, desc, dur, kcal, raw in rows]
+
+    def _op(c):
+        n = c.executemany(_INSERT_SQL, rows).rowcount
+        deltas = {}
+        for u, ds, _, _, _, kcal, _ in rows:
+            _in, d_w = deltas.get((u, ds), (0.0, 0.0))
+            deltas[(u, ds)] = (0.0, d_w + kcal)
+        touched = {}
+        for u, ds in deltas:
+            touched.setdefault(u, []).append(ds)
+        for u, dates in touched.items():
+            mark_dirty(c, "workouts", u, dates)
+        if summaries:
+            apply_deltas(c, deltas)
+        return n
+
+    return run_write(_op, uow)
+
+def delete_workout(user_id: int, workout_id: int, uow: UnitOfWork | None = None):
+    def _op(c):
+        row = c.execute(
+            "SELECT date, calories_burned FROM workouts WHERE user_id=? AND id=?", (user_id, workout_id)
+        ).fetchone()
+        if not row:
+            return
+        c.execute("DELETE FROM workouts WHERE user_id=? AND id=?", (user_id, workout_id))
+        mark_dirty(c, "workouts", user_id, [row["date"]])
+        apply_delta(c, user_id, row["date"], d_workout=-float(row["calories_burned"] or 0))
 
-def delete_workout(user_id: int, workout_id: int):
-    conn.execute("DELETE FROM workouts WHERE user_id=? AND id=?", (user_id, workout_id))
-    conn.commit()
+    run_write(_op, uow)
@@ -0,0 +1,74 @@
+# db/rows.py
+"""
+Righe tipizzate leggere per i loop della UI (al posto dei DataFrame).
+L'ordine dei campi è l'ordine delle colonne nella SELECT: usa columns(cls).
+"""
+from dataclasses import dataclass, fields
+
+
+def columns(cls) -> str:
+    return ", ".join(f.name for f in fields(cls))
+
+
+@dataclass(slots=True)
+class Meal:
+    id: int
+    time: str
+    description: str
+    calories: float
+    raw_json: str | None
+
+
+@dataclass(slots=True)
+class Workout:
+    id: int
+    time: str
+    description: str
+    duration_min: int | None
+    calories_burned: float
+    raw_json: str | None
+
+
+@dataclass(slots=True)
+class PlannedEvent:
+    id: int
+    time: str
+    type: str
+    title: str
+    expected_calories: float | None
+    duration_min: int | None
+    status: str | None
+    notes: str | None
+
+
+@dataclass(slots=True)
+class DayLog:
+    morning_weight: float | None
+    is_closed: int
+
+
+@dataclass(slots=True)
+class DailySummary:
+    calories_in: float
+    rest_calories: float
+    workout_calories: float
+    calories_out: float
+    net_calories: float
+
+
+@dataclass(slots=True)
+class Job:
+    id: str
+    kind: str
+    status: str
+    result: str | None
+    error: str | None
+    created_at: str
+    finished_at: str | None
+
+
+@dataclass(slots=True)
+class WeeklyPlan:
+    content: str
+    created_at: str
+    input_hash: str | None
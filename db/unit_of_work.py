@@ -0,0 +1,51 @@
+# db/unit_of_work.py
+"""
+Raggruppa più scritture dei repository in una sola transazione:
+
+    with unit_of_work() as uow:
+        insert_meal(..., uow=uow)
+        mark_done(..., uow=uow)
+
+Le operazioni vengono accodate e applicate in ordine, con un solo commit,
+all'uscita dal blocco (nessuna se il blocco solleva un'eccezione).
+Le letture dentro il blocco non vedono ancora le scritture accodate.
+"""
+from contextlib import contextmanager
+from typing import Any, Callable
+
+from database import write
+
+
+class UnitOfWork:
+    def __init__(self):
+        self._ops: list[Callable] = []
+        self._after_commit: list[Callable[[], Any]] = []
+
+    def add(self, op: Callable):
+        self._ops.append(op)
+
+    def after_commit(self, fn: Callable[[], Any]):
+        self._after_commit.append(fn)
+
+    def commit(self):
+        ops, self._ops = self._ops, []
+        callbacks, self._after_commit = self._after_commit, []
+        if ops:
+            write(lambda c: [op(c) for op in ops])
+        for fn in callbacks:
+            fn()
+
+
+@contextmanager
+def unit_of_work():
+    uow = UnitOfWork()
+    yield uow
+    uow.commit()
+
+
+def run_write(op: Callable, uow: UnitOfWork | None = None):
+    """Esegue op(conn) subito, oppure lo accoda alla unit of work se presente."""
+    if uow is not None:
+        uow.add(op)
+        return None
+    return write(op)
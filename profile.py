@@ -1,10 +1,16 @@
 import streamlit as st
 from datetime import datetime, date as ddate
-from database import conn
+from database import get_conn, write, upsert_sql
+from db.repo_summaries import refresh_rest_all
+
+_PROFILE_COLUMNS = [
+    "user_id", "start_weight", "height_cm", "sex", "age", "activity_level", "goal_type",
+    "goal_weight", "goal_date", "body_fat", "lean_mass", "updated_at",
+]
 
 
 def get_profile(user_id: int) -> dict | None:
-    row = conn.execute("""
+    row = get_conn().execute("""
         SELECT start_weight, height_cm, sex, age, activity_level, goal_type, goal_weight, goal_date, body_fat, lean_mass
         FROM user_profile WHERE user_id=?
     """, (user_id,)).fetchone()
@@ -64,23 +70,7 @@ def profile_page(user_id: int):
         lean_mass = st.number_input("Massa magra kg (opz.)", min_value=0.0, value=float(p.get("lean_mass") or 0.0), step=0.5)
 
     if st.button("💾 Salva profilo", type="primary"):
-        conn.execute("""
-            INSERT INTO user_profile
-              (user_id, start_weight, height_cm, sex, age, activity_level, goal_type, goal_weight, goal_date, body_fat, lean_mass, updated_at)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                start_weight=excluded.start_weight,
-                height_cm=excluded.height_cm,
-                sex=excluded.sex,
-                age=excluded.age,
-                activity_level=excluded.activity_level,
-                goal_type=excluded.goal_type,
-                goal_weight=excluded.goal_weight,
-                goal_date=excluded.goal_date,
-                body_fat=excluded.body_fat,
-                lean_mass=excluded.lean_mass,
-                updated_at=excluded.updated_at
-        """, (
+        params = (
             user_id,
             float(weight) if weight > 0 else None,
             float(height) if height > 0 else None,
@@ -93,7 +83,13 @@ def profile_page(user_id: int):
             float(body_fat) if body_fat > 0 else None,
             float(lean_mass) if lean_mass > 0 else None,
             datetime.now().isoformat(timespec="seconds"),
-        ))
-        conn.commit()
+        )
+
+        def _op(c):
+            c.execute(upsert_sql("user_profile", _PROFILE_COLUMNS, ["user_id"]), params)
+            # peso iniziale/altezza/età cambiano il riposo di tutti i giorni
+            refresh_rest_all(c, user_id)
+
+        write(_op)
         st.success("Profilo salvato ✅")
         st.rerun()
\ No newline at end of file
@@ -6,6 +6,8 @@ from views.dashboard import render as dashboard_render
 from views.calendar_month import render as calendar_render
 from views.day import render as day_render
 from views.weekly_plan import render as weekly_render
+from views.import_data import render as import_render
+from views.admin import is_admin, render as admin_render
 from profile import profile_page
 
 PAGES = {
@@ -13,6 +15,7 @@ PAGES = {
     "Calendario": calendar_render,
     "Giornata": day_render,
     "Piano settimanale": weekly_render,
+    "Importa": import_render,
     "Profilo": profile_page,
 }
 
@@ -65,9 +68,13 @@ def render(user_id: int):
     if "page" not in st.session_state:
         st.session_state.page = "Dashboard"
 
+    pages = dict(PAGES)
+    if is_admin(user_id):
+        pages["Admin"] = admin_render
+
     # Sidebar menu
     st.sidebar.title("InForma")
-    keys = list(PAGES.keys())
+    keys = list(pages.keys())
 
     selected = st.sidebar.radio(
         "Menu",
@@ -85,4 +92,4 @@ def render(user_id: int):
         st.rerun()
 
     # Render pagina scelta
-    _call_page(PAGES[selected], user_id, selected)
\ No newline at end of file
+    _call_page(pages[selected], user_id, selected)
\ No newline at end of file
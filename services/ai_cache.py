@@ -0,0 +1,269 @@
+# services/ai_cache.py
+"""
+Cache delle stime AI.
+
+Testo (pasti/allenamenti): chiave = hash di (tipo, modello, versione del
+prompt, testo normalizzato, contesto extra). Due livelli:
+- LRU in memoria per processo (microsecondi);
+- tabella ai_cache nel DB, condivisa tra processi, con TTL e numero massimo
+  di righe (si eliminano le meno usate di recente).
+
+Foto: tabella ai_photo_cache con hash esatto del contenuto e dHash percettivo
+a 64 bit; una foto quasi identica (distanza di Hamming ≤ PHASH_MAX_DISTANCE,
+stessa nota) riusa la stima. Stessi TTL/LRU, limite righe proprio.
+
+Si mettono in cache solo le risposte del modello, mai i fallback.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from io import BytesIO
+from collections import OrderedDict
+from typing import Any
+
+from PIL import Image, ImageOps
+
+from database import get_conn, upsert_sql, write
+
+LRU_SIZE = int(os.getenv("INFORMA_AI_CACHE_LRU", "512"))
+TTL_SECONDS = float(os.getenv("INFORMA_AI_CACHE_TTL_DAYS", "30")) * 86400
+MAX_ROWS = int(os.getenv("INFORMA_AI_CACHE_MAX_ROWS", "5000"))
+MAX_PHOTO_ROWS = int(os.getenv("INFORMA_AI_PHOTO_CACHE_MAX_ROWS", "2000"))
+PHASH_MAX_DISTANCE = int(os.getenv("INFORMA_AI_PHASH_DISTANCE", "6"))  # su 64 bit
+TOUCH_EVERY_SECONDS = 3600  # last_hit_at aggiornato al massimo una volta l'ora per chiave
+
+_lock = threading.Lock()
+_lru: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()  # key -> (scadenza, valore)
+_stats = {"lru_hits": 0, "db_hits": 0, "phash_hits": 0, "misses": 0, "puts": 0, "evicted": 0}
+
+
+# ----------------------------
+# Chiave
+# ----------------------------
+def normalize_text(text: str) -> str:
+    """Minuscolo, senza accenti, punteggiatura e spazi ripetuti: "Caffè, cornetto!" -> "caffe cornetto"."""
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s.,/%+-]", " ", text)
+    text = re.sub(r"(?<!\d)[.,]|[.,](?!\d)", " ", text)  # tengo solo 1,5 / 0.5
+    return " ".join(text.split())
+
+
+def text_key(kind: str, text: str, model: str, prompt_version: int, context: str = "") -> str:
+    raw = "\x1f".join([kind, model, str(prompt_version), normalize_text(text), context])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ----------------------------
+# Lettura / scrittura
+# ----------------------------
+def _count(stat: str, n: int = 1):
+    with _lock:
+        _stats[stat] += n
+
+
+def _lru_get(key: str, now: float):
+    with _lock:
+        item = _lru.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < now:
+            del _lru[key]
+            return None
+        _lru.move_to_end(key)
+        return value
+
+
+def _lru_put(key: str, value, expires: float):
+    with _lock:
+        _lru[key] = (expires, value)
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def cache_get(key: str) -> dict | None:
+    now = time.time()
+    value = _lru_get(key, now)
+    if value is not None:
+        _count("lru_hits")
+        return dict(value)
+
+    row = get_conn().execute(
+        "SELECT value, created_at, last_hit_at FROM ai_cache WHERE cache_key=? AND created_at >= ?",
+        (key, now - TTL_SECONDS)
+    ).fetchone()
+    if row is None:
+        _count("misses")
+        return None
+
+    value = json.loads(row["value"])
+    _lru_put(key, value, row["created_at"] + TTL_SECONDS)
+    _touch("ai_cache", key, row["last_hit_at"], now)
+    _count("db_hits")
+    return dict(value)
+
+
+def _evict(c, table: str, max_rows: int, now: float) -> int:
+    n = c.execute(f"DELETE FROM {table} WHERE created_at < ?", (now - TTL_SECONDS,)).rowcount
+    excess = c.execute(f"SELECT COUNT(*) AS n FROM {table}").fetchone()["n"] - max_rows
+    if excess > 0:
+        n += c.execute(
+            f"""
+            DELETE FROM {table} WHERE cache_key IN (
+                SELECT cache_key FROM {table} ORDER BY last_hit_at LIMIT ?
+            )
+            """,
+            (excess,)
+        ).rowcount
+    return n
+
+
+def _touch(table: str, key: str, last_hit_at, now: float):
+    if now - (last_hit_at or 0) > TOUCH_EVERY_SECONDS:
+        write(lambda c: c.execute(
+            f"UPDATE {table} SET last_hit_at=?, hits=hits+1 WHERE cache_key=?", (now, key)
+        ))
+
+
+def cache_put(key: str, kind: str, model: str, value: dict):
+    now = time.time()
+    _lru_put(key, dict(value), now + TTL_SECONDS)
+
+    def _op(c):
+        c.execute(
+            upsert_sql("ai_cache", ["cache_key", "kind", "model", "value", "created_at", "last_hit_at", "hits"],
+                       ["cache_key"]),
+            (key, kind, model, json.dumps(value, ensure_ascii=False), now, now, 0)
+        )
+        return _evict(c, "ai_cache", MAX_ROWS, now)
+
+    try:
+        evicted = write(_op)
+    except Exception:
+        return  # la cache non deve far perdere una stima già ottenuta
+    _count("puts")
+    if evicted:
+        _count("evicted", evicted)
+
+
+# ----------------------------
+# Foto
+# ----------------------------
+def dhash(image_bytes: bytes) -> int | None:
+    """
+    Difference hash 64 bit: scala di grigi 9x8, un bit per coppia di pixel adiacenti.
+    Stabile a ricompressione, ridimensionamento e piccole variazioni di luce.
+    None se l'immagine non si decodifica.
+    """
+    try:
+        img = Image.open(BytesIO(image_bytes))
+        img = ImageOps.exif_transpose(img).convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    except Exception:
+        return None
+    px = list(img.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return bits - (1 << 64) if bits >= (1 << 63) else bits  # INTEGER SQL con segno
+
+
+def photo_key(image_bytes: bytes, model: str, prompt_version: int, note: str) -> tuple[str, str]:
+    """(chiave esatta, chiave della nota): la nota entra nel prompt, quindi vincola anche il match percettivo."""
+    note_key = hashlib.sha256(normalize_text(note).encode("utf-8")).hexdigest()[:16]
+    h = hashlib.sha256(image_bytes)
+    h.update(f"\x1f{model}\x1f{prompt_version}\x1f{note_key}".encode("utf-8"))
+    return h.hexdigest(), note_key
+
+
+def _hamming(a: int, b: int) -> int:
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+def photo_cache_get(key: str, note_key: str, phash: int | None, model: str, prompt_version: int) -> dict | None:
+    now = time.time()
+    value = _lru_get(key, now)
+    if value is not None:
+        _count("lru_hits")
+        return dict(value)
+
+    c = get_conn()
+    row = c.execute(
+        "SELECT cache_key, value, created_at, last_hit_at FROM ai_photo_cache WHERE cache_key=? AND created_at >= ?",
+        (key, now - TTL_SECONDS)
+    ).fetchone()
+    stat = "db_hits"
+
+    if row is None and phash is not None:
+        # tabella limitata (MAX_PHOTO_ROWS): scansione dei candidati con la stessa nota
+        best, best_d = None, PHASH_MAX_DISTANCE + 1
+        for r in c.execute(
+            """
+            SELECT cache_key, phash FROM ai_photo_cache
+            WHERE model=? AND prompt_version=? AND note_key=? AND phash IS NOT NULL AND created_at >= ?
+            """,
+            (model, prompt_version, note_key, now - TTL_SECONDS)
+        ):
+            d = _hamming(r["phash"], phash)
+            if d < best_d:
+                best, best_d = r["cache_key"], d
+        if best is not None:
+            row = c.execute(
+                "SELECT cache_key, value, created_at, last_hit_at FROM ai_photo_cache WHERE cache_key=?", (best,)
+            ).fetchone()
+            stat = "phash_hits"
+
+    if row is None:
+        _count("misses")
+        return None
+
+    value = json.loads(row["value"])
+    _lru_put(key, value, row["created_at"] + TTL_SECONDS)
+    _touch("ai_photo_cache", row["cache_key"], row["last_hit_at"], now)
+    _count(stat)
+    return dict(value)
+
+
+def photo_cache_put(key: str, note_key: str, phash: int | None, model: str, prompt_version: int, value: dict):
+    now = time.time()
+    _lru_put(key, dict(value), now + TTL_SECONDS)
+
+    def _op(c):
+        c.execute(
+            upsert_sql(
+                "ai_photo_cache",
+                ["cache_key", "note_key", "phash", "model", "prompt_version", "value", "created_at", "last_hit_at", "hits"],
+                ["cache_key"],
+            ),
+            (key, note_key, phash, model, prompt_version, json.dumps(value, ensure_ascii=False), now, now, 0)
+        )
+        return _evict(c, "ai_photo_cache", MAX_PHOTO_ROWS, now)
+
+    try:
+        evicted = write(_op)
+    except Exception:
+        return
+    _count("puts")
+    if evicted:
+        _count("evicted", evicted)
+
+
+def cache_stats() -> dict:
+    with _lock:
+        out = dict(_stats)
+        out["lru_size"] = len(_lru)
+    hits = out["lru_hits"] + out["db_hits"] + out["phash_hits"]
+    lookups = hits + out["misses"]
+    out["hit_rate"] = hits / lookups if lookups else 0.0
+    return out
+
+
+def clear_memory():
+    with _lock:
+        _lru.clear()
@@ -1,37 +1,42 @@
 # services/ai_service.py
-import os
+import re
 import json
 import time
 import base64
 from typing import Any, Callable, Optional
 
-import streamlit as st
-from openai import OpenAI
+from services.ai_cache import (
+    cache_get, cache_put, dhash, photo_cache_get, photo_cache_put, photo_key, text_key,
+)
+from services.food_db import estimate_meal_local
+from services.image_prep import prepare_image
+from services.metrics import AICall, Gauge, current_call, instrument, registry
+from services.openai_client import call_deadline, get_client, remaining
+from services.resilience import CircuitOpenError, backoff, classify, error_kind, openai_breaker
+from services.workout_engine import estimate_workout_local, guess_minutes, workout_kcal
+from utils import heuristic_meal_kcal
 
-from utils import heuristic_meal_kcal, heuristic_workout_kcal
+MODEL = "gpt-4.1-mini"
+
+# da incrementare quando cambia il testo del prompt: invalida la cache
+MEAL_PROMPT_VERSION = 1
+WORKOUT_PROMPT_VERSION = 2
+PHOTO_PROMPT_VERSION = 1
+WEEKLY_PLAN_PROMPT_VERSION = 2  # prompt in services/plan_inputs.py
+
+registry.register(Gauge(
+    "informa_ai_breaker_open", "1 se il circuito verso il provider AI non è chiuso.",
+    lambda: float(openai_breaker.state != "chiuso"),
+))
 
 
 # ----------------------------
 # Client + retry
 # ----------------------------
-def _get_api_key() -> Optional[str]:
-    try:
-        if "OPENAI_API_KEY" in st.secrets:
-            return st.secrets["OPENAI_API_KEY"]
-    except Exception:
-        pass
-    return os.getenv("OPENAI_API_KEY")
-
-
-def _client() -> OpenAI:
-    api_key = _get_api_key()
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY mancante (st.secrets o env var).")
-    return OpenAI(api_key=api_key)
-
-
 def explain_openai_error(e: Exception) -> str:
     msg = str(e)
+    if isinstance(e, CircuitOpenError):
+        return msg
     if "401" in msg or "Authentication" in msg:
         return "API key non valida/mancante (401)."
     if "429" in msg or "RateLimit" in msg or "rate limit" in msg.lower():
@@ -41,19 +46,53 @@ def explain_openai_error(e: Exception) -> str:
     return msg
 
 
-def _retry(fn: Callable[[], Any], tries: int = 3, base_sleep: float = 0.8):
-    last: Optional[Exception] = None
-    for i in range(tries):
-        try:
-            return fn()
-        except Exception as e:
-            last = e
-            time.sleep(base_sleep * (2 ** i))
-    raise last  # type: ignore
+def _retry(fn: Callable[[], Any], tries: int = 3, call: AICall | None = None):
+    """
+    Ritenta solo gli errori transitori, rispettando Retry-After e la scadenza della chiamata.
+    Con il circuito aperto non chiama il provider (CircuitOpenError).
+    Ogni tentativo e ogni retry finiscono nelle metriche della chiamata in corso.
+    """
+    call = call or current_call()
+    with call_deadline():
+        for attempt in range(tries):
+            if not openai_breaker.allow():
+                raise CircuitOpenError(openai_breaker.retry_in())
+            try:
+                out = fn()
+            except Exception as e:
+                call.attempt(error_kind(e))
+                retryable, provider_failure, wait = classify(e)
+                if provider_failure:
+                    openai_breaker.record_failure()
+                else:
+                    openai_breaker.release()  # né guasto né successo del provider
+                if wait is None:
+                    wait = backoff(attempt)
+                left = remaining()
+                if not retryable or attempt == tries - 1 or (left is not None and wait >= left):
+                    raise
+                call.retry()
+                time.sleep(wait)
+                continue
+            call.attempt("ok")
+            openai_breaker.record_success()
+            return out
+
+
+def _complete(**kwargs):
+    """chat.completions.create sul client condiviso; token e costo vanno nelle metriche."""
+    resp = get_client().chat.completions.create(**kwargs)
+    current_call().usage(kwargs["model"], resp.usage)
+    return resp
 
 
 def _err_to_notes(e: Exception) -> str:
-    return f"Fallback: OpenAI non disponibile. Dettagli: {explain_openai_error(e)}"
+    """Note della risposta di fallback (e conteggio del fallback nelle metriche)."""
+    current_call().fallback(error_kind(e))
+    return (
+        f"Fallback: OpenAI non disponibile (circuito {openai_breaker.state}). "
+        f"Dettagli: {explain_openai_error(e)}"
+    )
 
 
 def _safe_float(x: Any, default: float = 0.0) -> float:
@@ -102,18 +141,87 @@ def _workout_schema() -> dict:
     }
 
 
+def _meal_batch_schema() -> dict:
+    return {
+        "name": "meal_batch",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "items": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "additionalProperties": False,
+                        "properties": {
+                            "time": {"type": "string"},
+                            "description": {"type": "string"},
+                            "total_calories": {"type": "number"},
+                            "notes": {"type": "string"},
+                        },
+                        "required": ["time", "description", "total_calories", "notes"],
+                    },
+                },
+            },
+            "required": ["items"],
+        },
+    }
+
+
+def _workout_batch_schema() -> dict:
+    return {
+        "name": "workout_batch",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "items": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "additionalProperties": False,
+                        "properties": {
+                            "time": {"type": "string"},
+                            "description": {"type": "string"},
+                            "duration_min": {"type": "number"},
+                            "calories_burned": {"type": "number"},
+                            "notes": {"type": "string"},
+                        },
+                        "required": ["time", "description", "duration_min", "calories_burned", "notes"],
+                    },
+                },
+            },
+            "required": ["items"],
+        },
+    }
+
+
 # ----------------------------
 # API: Meal text
 # ----------------------------
+@instrument("meal_text")
 def estimate_meal_from_text(text: str) -> dict:
     text = (text or "").strip()
     if not text:
         return {"total_calories": 0.0, "description": "", "notes": "Nessun testo."}
 
+    # testo coperto dalla tabella alimenti: nessuna chiamata
+    local = estimate_meal_local(text)
+    if local is not None:
+        current_call().local()
+        return local
+
+    key = text_key("meal", text, MODEL, MEAL_PROMPT_VERSION)
+    cached = cache_get(key)
+    current_call().cache(cached is not None)
+    if cached is not None:
+        return cached
+
     def _call():
-        client = _client()
-        resp = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        resp = _complete(
+            model=MODEL,
             messages=[
                 {
                     "role": "user",
@@ -140,32 +248,49 @@ def estimate_meal_from_text(text: str) -> dict:
         return {"total_calories": tc, "description": desc, "notes": notes}
 
     try:
-        return _retry(_call)
+        out = _retry(_call)
     except Exception as e:
         return {
             "total_calories": float(heuristic_meal_kcal(text)),
             "description": text,
             "notes": _err_to_notes(e),
         }
+    cache_put(key, "meal", MODEL, out)
+    return out
 
 
 # ----------------------------
 # API: Workout text
 # ----------------------------
+@instrument("workout_text")
 def estimate_workout_from_text(text: str, weight_kg: Optional[float], height_cm: Optional[float]) -> dict:
     text = (text or "").strip()
     if not text:
         return {"calories_burned": 0.0, "notes": "Nessun testo."}
 
+    # attività e durata chiare: tabella MET, nessuna chiamata
+    local = estimate_workout_local(text, weight_kg)
+    if local is not None:
+        current_call().local()
+        return local
+
+    # peso/altezza entrano nel prompt: in chiave arrotondati al kg / cm
+    context = f"w={round(weight_kg) if weight_kg else None};h={round(height_cm) if height_cm else None}"
+    key = text_key("workout", text, MODEL, WORKOUT_PROMPT_VERSION, context)
+    cached = cache_get(key)
+    current_call().cache(cached is not None)
+    if cached is not None:
+        return cached
+
     def _call():
-        client = _client()
-        resp = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        resp = _complete(
+            model=MODEL,
             messages=[
                 {
                     "role": "user",
                     "content": (
-                        "Stima le calorie bruciate dall'allenamento descritto.\n"
+                        "Stima le calorie bruciate dall'allenamento descritto "
+                        "(totali durante l'attività, riposo incluso: come MET × peso × ore).\n"
                         "Se mancano durata/intensità, fai assunzioni ragionevoli e scrivile in notes.\n"
                         f"Contesto: peso_kg={weight_kg}, altezza_cm={height_cm}\n"
                         f"Allenamento: {text}"
@@ -183,34 +308,246 @@ def estimate_workout_from_text(text: str, weight_kg: Optional[float], height_cm:
         return {"calories_burned": cb, "notes": notes}
 
     try:
-        return _retry(_call)
+        out = _retry(_call)
     except Exception as e:
-        dur = 45
-        for tok in text.replace(",", " ").split():
-            if tok.isdigit():
-                dur = int(tok)
-                break
+        dur = guess_minutes(text)
         return {
-            "calories_burned": float(heuristic_workout_kcal(text, dur)),
+            "calories_burned": workout_kcal(text, dur, weight_kg),
             "notes": _err_to_notes(e),
         }
+    cache_put(key, "workout", MODEL, out)
+    return out
+
+
+# ----------------------------
+# API: giornata intera (più voci in una chiamata)
+# ----------------------------
+_TIME_PREFIX = re.compile(r"^\s*(\d{1,2})[:.](\d{2})\s*[-–:]?\s*")
+
+
+def _split_lines(text: str, default_time: str) -> list[tuple[str, str]]:
+    """Righe non vuote -> (ora, testo); "08:30 caffè" usa l'ora in testa alla riga."""
+    out = []
+    for line in text.splitlines():
+        line = line.strip(" \t-•*")
+        if not line:
+            continue
+        m = _TIME_PREFIX.match(line)
+        t = default_time
+        if m and int(m.group(1)) < 24 and int(m.group(2)) < 60:
+            t, line = f"{int(m.group(1)):02d}:{m.group(2)}", line[m.end():].strip()
+        if line:
+            out.append((t, line))
+    return out
+
+
+_MEAL_TIMES = {"colazione": "08:00", "pranzo": "13:00", "merenda": "17:00", "spuntino": "17:00", "cena": "20:00"}
+
+
+def _meal_time(line: str, t: str, default_time: str) -> str:
+    """Ora di una riga senza orario esplicito dedotta dal pasto citato ("colazione: ...")."""
+    if t != default_time:
+        return t
+    first = re.split(r"[\s:,-]+", line.lower(), maxsplit=1)[0]
+    return _MEAL_TIMES.get(first, default_time)
+
+
+def _clean_time(value: Any, default: str) -> str:
+    m = _TIME_PREFIX.match(str(value or ""))
+    if m and int(m.group(1)) < 24 and int(m.group(2)) < 60:
+        return f"{int(m.group(1)):02d}:{m.group(2)}"
+    return default
+
+
+@instrument("meals_batch")
+def estimate_meals_batch(text: str, default_time: str = "13:00") -> list[dict]:
+    """
+    Più pasti in una sola chiamata (una voce per pasto, tipicamente una per riga).
+    Ritorna [{time, description, total_calories, notes}]; in fallback una voce per riga con stima euristica.
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+
+    # tutte le righe coperte dalla tabella alimenti: nessuna chiamata
+    local_items = []
+    for t, line in _split_lines(text, default_time):
+        local = estimate_meal_local(line)
+        if local is None:
+            break
+        local_items.append({
+            "time": _meal_time(line, t, default_time),
+            "description": line,
+            "total_calories": local["total_calories"],
+            "notes": local["notes"],
+        })
+    else:
+        if local_items:
+            current_call().local()
+            return local_items
+
+    key = text_key("meal_batch", text, MODEL, MEAL_PROMPT_VERSION, default_time)
+    cached = cache_get(key)
+    current_call().cache(cached is not None)
+    if cached is not None:
+        return cached["items"]
+
+    def _call():
+        resp = _complete(
+            model=MODEL,
+            messages=[
+                {
+                    "role": "user",
+                    "content": (
+                        "Il testo descrive i pasti/bevande di una giornata, di solito uno per riga.\n"
+                        "Restituisci un elemento in items per ogni pasto, nell'ordine del testo.\n"
+                        "time in formato HH:MM: usa l'ora scritta; se manca deducila dal contesto "
+                        f"(colazione 08:00, pranzo 13:00, merenda 17:00, cena 20:00), altrimenti {default_time}.\n"
+                        "Stima total_calories per ogni pasto; se mancano quantità/dettagli, fai assunzioni "
+                        "ragionevoli (porzioni standard) e scrivile in notes.\n"
+                        "description breve.\n\n"
+                        f"Giornata:\n{text}"
+                    ),
+                }
+            ],
+            response_format={"type": "json_schema", "json_schema": _meal_batch_schema()},
+        )
+
+        data = json.loads(resp.choices[0].message.content or "{}")
+        items = []
+        for it in data.get("items") or []:
+            desc = str(it.get("description", "") or "").strip()
+            if not desc:
+                continue
+            items.append({
+                "time": _clean_time(it.get("time"), default_time),
+                "description": desc,
+                "total_calories": max(0.0, _safe_float(it.get("total_calories", 0), 0.0)),
+                "notes": str(it.get("notes", "") or "").strip(),
+            })
+        return items
+
+    try:
+        items = _retry(_call)
+    except Exception as e:
+        notes = _err_to_notes(e)
+        return [
+            {"time": t, "description": line, "total_calories": float(heuristic_meal_kcal(line)), "notes": notes}
+            for t, line in _split_lines(text, default_time)
+        ]
+    cache_put(key, "meal_batch", MODEL, {"items": items})
+    return items
+
+
+@instrument("workouts_batch")
+def estimate_workouts_batch(text: str, weight_kg: Optional[float], height_cm: Optional[float],
+                            default_time: str = "19:00") -> list[dict]:
+    """
+    Più allenamenti in una sola chiamata.
+    Ritorna [{time, description, duration_min, calories_burned, notes}].
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+
+    # tutte le righe chiare: tabella MET, nessuna chiamata
+    local_items = []
+    for t, line in _split_lines(text, default_time):
+        local = estimate_workout_local(line, weight_kg)
+        if local is None:
+            break
+        local_items.append({
+            "time": t, "description": line, "duration_min": local["duration_min"],
+            "calories_burned": local["calories_burned"], "notes": local["notes"],
+        })
+    else:
+        if local_items:
+            current_call().local()
+            return local_items
+
+    context = f"w={round(weight_kg) if weight_kg else None};h={round(height_cm) if height_cm else None};t={default_time}"
+    key = text_key("workout_batch", text, MODEL, WORKOUT_PROMPT_VERSION, context)
+    cached = cache_get(key)
+    current_call().cache(cached is not None)
+    if cached is not None:
+        return cached["items"]
+
+    def _call():
+        resp = _complete(
+            model=MODEL,
+            messages=[
+                {
+                    "role": "user",
+                    "content": (
+                        "Il testo descrive gli allenamenti di una giornata, di solito uno per riga.\n"
+                        "Restituisci un elemento in items per ogni allenamento, nell'ordine del testo.\n"
+                        f"time in formato HH:MM: usa l'ora scritta, altrimenti {default_time}.\n"
+                        "Stima duration_min e calories_burned (totali durante l'attività, riposo incluso: "
+                        "come MET × peso × ore); se mancano durata/intensità, fai assunzioni "
+                        "ragionevoli e scrivile in notes.\n"
+                        f"Contesto: peso_kg={weight_kg}, altezza_cm={height_cm}\n\n"
+                        f"Allenamenti:\n{text}"
+                    ),
+                }
+            ],
+            response_format={"type": "json_schema", "json_schema": _workout_batch_schema()},
+        )
+
+        data = json.loads(resp.choices[0].message.content or "{}")
+        items = []
+        for it in data.get("items") or []:
+            desc = str(it.get("description", "") or "").strip()
+            if not desc:
+                continue
+            items.append({
+                "time": _clean_time(it.get("time"), default_time),
+                "description": desc,
+                "duration_min": int(max(0.0, _safe_float(it.get("duration_min", 0), 0.0))),
+                "calories_burned": max(0.0, _safe_float(it.get("calories_burned", 0), 0.0)),
+                "notes": str(it.get("notes", "") or "").strip(),
+            })
+        return items
+
+    try:
+        items = _retry(_call)
+    except Exception as e:
+        notes = _err_to_notes(e)
+        items = []
+        for t, line in _split_lines(text, default_time):
+            dur = guess_minutes(line)
+            items.append({
+                "time": t, "description": line, "duration_min": dur,
+                "calories_burned": workout_kcal(line, dur, weight_kg), "notes": notes,
+            })
+        return items
+    cache_put(key, "workout_batch", MODEL, {"items": items})
+    return items
 
 
 # ----------------------------
 # API: Food photo (vision)
 # ----------------------------
+@instrument("meal_photo")
 def analyze_food_photo(image_bytes: bytes, mime: str, time_str: str, note: str) -> dict:
     if not image_bytes:
         return {"total_calories": 0.0, "description": "", "notes": "Nessuna immagine."}
 
-    mime = (mime or "image/jpeg").strip()
-    b64 = base64.b64encode(image_bytes).decode("utf-8")
-    data_url = f"data:{mime};base64,{b64}"
+    # l'orario non cambia la stima: in chiave solo immagine e nota
+    key, note_key = photo_key(image_bytes, MODEL, PHOTO_PROMPT_VERSION, note or "")
+    phash = dhash(image_bytes)
+    cached = photo_cache_get(key, note_key, phash, MODEL, PHOTO_PROMPT_VERSION)
+    current_call().cache(cached is not None)
+    if cached is not None:
+        return cached
+
+    # ridotta e senza EXIF prima del base64: meno byte da caricare, meno token, meno memoria
+    prepared = prepare_image(image_bytes, mime)
+    data_url = f"data:{prepared.mime};base64," + base64.b64encode(prepared.data).decode("ascii")
+    del prepared
 
     def _call():
-        client = _client()
-        resp = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        resp = _complete(
+            model=MODEL,
             messages=[
                 {
                     "role": "user",
@@ -241,23 +578,25 @@ def analyze_food_photo(image_bytes: bytes, mime: str, time_str: str, note: str)
         return {"total_calories": tc, "description": desc, "notes": notes}
 
     try:
-        return _retry(_call)
+        out = _retry(_call)
     except Exception as e:
         return {"total_calories": 0.0, "description": "Pasto (foto)", "notes": _err_to_notes(e)}
+    photo_cache_put(key, note_key, phash, MODEL, PHOTO_PROMPT_VERSION, out)
+    return out
 
 
 # ----------------------------
 # Weekly plan (text)
 # ----------------------------
+@instrument("weekly_plan")
 def generate_weekly_plan(prompt: str) -> str:
     prompt = (prompt or "").strip()
     if not prompt:
         return "Prompt vuoto."
 
     def _call():
-        client = _client()
-        resp = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        resp = _complete(
+            model=MODEL,
             messages=[{"role": "user", "content": prompt}],
         )
         return (resp.choices[0].message.content or "").strip()
@@ -265,4 +604,79 @@ def generate_weekly_plan(prompt: str) -> str:
     try:
         return _retry(_call)
     except Exception as e:
-        return f"Non riesco a generare il piano ora. Dettagli: {explain_openai_error(e)}"
\ No newline at end of file
+        current_call().fallback(error_kind(e))
+        return f"Non riesco a generare il piano ora. Dettagli: {explain_openai_error(e)}"
+
+
+class WeeklyPlanStream:
+    """
+    Piano settimanale in streaming: iterabile di frammenti di testo (adatto a st.write_stream).
+    Finita l'iterazione, `text` contiene il piano completo e `failed` dice se la generazione
+    è fallita (in quel caso l'ultimo frammento è il messaggio d'errore e `text` va scartato).
+    """
+
+    def __init__(self, prompt: str):
+        self.prompt = (prompt or "").strip()
+        self.text = ""
+        self.failed = False
+
+    def _open(self):
+        return get_client().chat.completions.create(
+            model=MODEL,
+            messages=[{"role": "user", "content": self.prompt}],
+            stream=True,
+            stream_options={"include_usage": True},  # ultimo chunk con i token, per le metriche
+        )
+
+    def __iter__(self):
+        if not self.prompt:
+            self.failed = True
+            yield "Prompt vuoto."
+            return
+
+        # il generatore può essere consumato a pezzi: la chiamata si misura qui, senza contextvar
+        call = AICall("weekly_plan_stream")
+        try:
+            yield from self._generate(call)
+        finally:
+            if self.failed and call.outcome == "model":
+                call.outcome = "error"
+            call.finish()
+
+    def _generate(self, call: AICall):
+        parts: list[str] = []
+        finish = None
+        stream = None
+        try:
+            # retry/breaker solo sull'apertura: a stream iniziato un errore interrompe il piano
+            stream = _retry(self._open, call=call)
+            for chunk in stream:
+                if chunk.usage is not None:
+                    call.usage(MODEL, chunk.usage)
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                finish = choice.finish_reason or finish
+                if choice.delta and choice.delta.content:
+                    parts.append(choice.delta.content)
+                    yield choice.delta.content
+        except Exception as e:
+            if parts and classify(e)[1]:
+                openai_breaker.record_failure()
+            call.fallback(error_kind(e))
+            self.failed = True
+            yield f"\n\nNon riesco a generare il piano ora. Dettagli: {explain_openai_error(e)}"
+            return
+        finally:
+            if stream is not None:
+                stream.close()
+
+        if finish != "stop":
+            # connessione chiusa prima della fine: un piano troncato non va salvato
+            self.failed = True
+            yield "\n\nGenerazione interrotta prima della fine del piano."
+            return
+        self.text = "".join(parts).strip()
+        if not self.text:
+            self.failed = True
+            yield "Il modello non ha restituito alcun testo."
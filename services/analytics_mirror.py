@@ -0,0 +1,167 @@
+# services/analytics_mirror.py
+"""
+Mirror colonnare (Parquet) di meals, workouts e daily_summaries per le analisi
+su più anni, fuori dal file SQLite transazionale.
+
+Layout (partizioni hive, leggibili anche da pandas/duckdb nei notebook):
+    <INFORMA_ANALYTICS_DIR>/<tabella>/user_id=<U>/month=<YYYY-MM>/part-0.parquet
+
+Le scritture dei repository marcano le partizioni toccate in analytics_dirty
+(db/repo_mirror.py); refresh() riesporta solo quelle.
+
+Richiede `pyarrow` (opzionale, non in requirements.txt).
+
+Uso da riga di comando:
+    python -m services.analytics_mirror [--full]
+"""
+import os
+import argparse
+import calendar as cal
+from pathlib import Path
+
+from database import get_conn, write
+from db.repo_mirror import clear_dirty, dirty_partitions, mark_all_dirty
+
+ANALYTICS_DIR = Path(os.getenv("INFORMA_ANALYTICS_DIR", "analytics"))
+
+# tabella -> (query per utente e intervallo di date, schema colonne)
+TABLES = {
+    "meals": (
+        """
+        SELECT id, date, time, description, calories
+        FROM meals
+        WHERE user_id = ? AND date BETWEEN ? AND ?
+        ORDER BY date, time, id
+        """,
+        [("id", "int64"), ("date", "string"), ("time", "string"),
+         ("description", "string"), ("calories", "float64")],
+    ),
+    "workouts": (
+        """
+        SELECT id, date, time, description, duration_min, calories_burned
+        FROM workouts
+        WHERE user_id = ? AND date BETWEEN ? AND ?
+        ORDER BY date, time, id
+        """,
+        [("id", "int64"), ("date", "string"), ("time", "string"), ("description", "string"),
+         ("duration_min", "int64"), ("calories_burned", "float64")],
+    ),
+    "daily_summaries": (
+        """
+        SELECT
+          ds.date, ds.calories_in, ds.rest_calories, ds.workout_calories,
+          ds.calories_out, ds.net_calories,
+          dl.morning_weight, COALESCE(dl.is_closed, 0) AS is_closed
+        FROM daily_summaries ds
+        LEFT JOIN day_logs dl
+          ON dl.user_id = ds.user_id AND dl.date = ds.date
+        WHERE ds.user_id = ? AND ds.date BETWEEN ? AND ?
+        ORDER BY ds.date
+        """,
+        [("date", "string"), ("calories_in", "float64"), ("rest_calories", "float64"),
+         ("workout_calories", "float64"), ("calories_out", "float64"), ("net_calories", "float64"),
+         ("morning_weight", "float64"), ("is_closed", "int64")],
+    ),
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Il mirror analytics richiede il pacchetto 'pyarrow'.") from e
+    return pa, pq
+
+
+def _partition_dir(table: str, user_id: int, month: str) -> Path:
+    return ANALYTICS_DIR / table / f"user_id={user_id}" / f"month={month}"
+
+
+def _month_range(month: str) -> tuple[str, str]:
+    y, m = (int(x) for x in month.split("-"))
+    return f"{month}-01", f"{month}-{cal.monthrange(y, m)[1]:02d}"
+
+
+# ----------------------------
+# Export
+# ----------------------------
+def export_partition(table: str, user_id: int, month: str) -> int:
+    """Riscrive una partizione (o la rimuove se non ha più righe). Ritorna il numero di righe."""
+    pa, pq = _pyarrow()
+    query, fields = TABLES[table]
+    rows = get_conn().execute(query, (user_id, *_month_range(month))).fetchall()
+
+    part_dir = _partition_dir(table, user_id, month)
+    target = part_dir / "part-0.parquet"
+    if not rows:
+        if target.exists():
+            target.unlink()
+            part_dir.rmdir()
+        return 0
+
+    schema = pa.schema([(name, getattr(pa, typ)()) for name, typ in fields])
+    data = {name: [r[i] for r in rows] for i, (name, _) in enumerate(fields)}
+    part_dir.mkdir(parents=True, exist_ok=True)
+    tmp = part_dir / "part-0.parquet.tmp"
+    pq.write_table(pa.table(data, schema=schema), tmp, compression="zstd")
+    os.replace(tmp, target)  # chi legge vede il file vecchio o quello nuovo, mai mezzo
+    return len(rows)
+
+
+def refresh(full: bool = False) -> dict:
+    """
+    Riesporta le partizioni marcate. La marca si cancella solo se `gen` non è
+    cambiato durante l'export: una scrittura concorrente la lascia per il giro dopo.
+    """
+    _pyarrow()
+    if full:
+        write(lambda c: mark_all_dirty(c, list(TABLES)))
+
+    stats = {"partitions": 0, "rows": 0}
+    for p in dirty_partitions():
+        table, user_id, month, gen = p["tbl"], p["user_id"], p["month"], p["gen"]
+        if table in TABLES:
+            stats["rows"] += export_partition(table, user_id, month)
+            stats["partitions"] += 1
+        write(lambda c: clear_dirty(c, table, user_id, month, gen))
+    return stats
+
+
+# ----------------------------
+# Lettura (memory-map + solo le colonne richieste)
+# ----------------------------
+def read_mirror(table: str, user_id: int, columns: list[str] | None = None,
+                start_month: str | None = None, end_month: str | None = None):
+    """pyarrow.Table con le partizioni dell'utente nel range di mesi (estremi inclusi, "YYYY-MM")."""
+    pa, pq = _pyarrow()
+    user_dir = ANALYTICS_DIR / table / f"user_id={user_id}"
+    if not user_dir.exists():
+        _, fields = TABLES[table]
+        schema = pa.schema([(name, getattr(pa, typ)()) for name, typ in fields])
+        return schema.empty_table().select(columns) if columns else schema.empty_table()
+
+    filters = []
+    if start_month:
+        filters.append(("month", ">=", start_month))
+    if end_month:
+        filters.append(("month", "<=", end_month))
+    return pq.read_table(
+        user_dir,
+        columns=columns,
+        filters=filters or None,
+        memory_map=True,
+        partitioning="hive",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggiorna il mirror Parquet per le analisi.")
+    parser.add_argument("--full", action="store_true", help="riesporta tutte le partizioni")
+    args = parser.parse_args()
+    stats = refresh(full=args.full)
+    print(f"Partizioni aggiornate: {stats['partitions']} · righe esportate: {stats['rows']} · {ANALYTICS_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# services/food_db.py
+"""
+Stima locale delle calorie di un pasto, senza rete.
+
+Tabella alimenti in services/data/foods_it.csv (kcal per 100 g, porzione
+standard, peso di un pezzo) indicizzata in memoria per n-grammi di token
+normalizzati. Il testo viene diviso in voci ("," "+" " e " " con " ...);
+per ogni voce si legge quantità e unità ("200g pasta", "2 uova",
+"un cucchiaio d'olio", "pasta 100 g") e si cerca l'alimento col nome più lungo.
+Le negazioni ("senza", "niente", "no") escludono l'alimento che segue; se
+dopo la negazione c'è una parola sconosciuta ("senza glutine") la copertura
+scende e decide il modello.
+Un alimento legato a un altro da "di"/"al"/"alla"... ("gelato al cioccolato",
+"burro di arachidi") è un piatto unico: se non è in tabella con quel nome
+decide il modello, invece di sommare due alimenti separati. Lo stesso per
+quantità nulle o negative ("0 pasta").
+
+estimate_meal_local() restituisce None se la copertura del testo è bassa:
+in quel caso decide il modello.
+"""
+import csv
+import re
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+
+FOODS_CSV = Path(__file__).parent / "data" / "foods_it.csv"
+MIN_COVERAGE = 0.75  # quota di parole riconosciute sotto cui si passa all'AI
+
+_NUMBER_WORDS = {
+    "un": 1, "uno": 1, "una": 1, "mezzo": 0.5, "mezza": 0.5, "paio": 2,
+    "due": 2, "tre": 3, "quattro": 4, "cinque": 5, "sei": 6, "sette": 7, "otto": 8,
+    "nove": 9, "dieci": 10, "qualche": 3,
+}
+
+# unità -> grammi (None = dipende dall'alimento: pezzo / porzione)
+_UNITS = {
+    "g": 1, "gr": 1, "grammi": 1, "grammo": 1, "hg": 100, "etto": 100, "etti": 100,
+    "kg": 1000, "chilo": 1000, "chili": 1000,
+    "ml": 1, "cl": 10, "dl": 100, "l": 1000, "litro": 1000, "litri": 1000,
+    "cucchiaio": 10, "cucchiai": 10, "cucchiaino": 5, "cucchiaini": 5,
+    "tazza": 200, "tazze": 200, "tazzina": 40, "tazzine": 40,
+    "bicchiere": 200, "bicchieri": 200, "pallina": 50, "palline": 50,
+    "vasetto": 125, "vasetti": 125, "scatoletta": 80, "scatolette": 80,
+    "lattina": 330, "lattine": 330, "quadretto": 5, "quadretti": 5,
+    "manciata": 30, "manciate": 30, "bustina": 5, "bustine": 5,
+    "fetta": None, "fette": None, "pezzo": None, "pezzi": None, "pz": None,
+    "porzione": None, "porzioni": None, "piatto": None, "piatti": None,
+    "bottiglia": None, "bottiglie": None,
+}
+_PORTION_UNITS = {"porzione", "porzioni", "piatto", "piatti"}
+
+_SIZE = {
+    "piccolo": 0.7, "piccola": 0.7, "piccoli": 0.7, "piccole": 0.7, "mini": 0.5,
+    "grande": 1.4, "grandi": 1.4, "abbondante": 1.3, "abbondanti": 1.3, "doppio": 2, "doppia": 2,
+}
+
+_STOPWORDS = {
+    "di", "d", "del", "della", "dello", "dei", "degli", "delle", "al", "alla", "allo", "ai", "agli", "alle",
+    "a", "in", "con", "e", "ed", "il", "lo", "la", "i", "gli", "le", "per", "da", "su", "poco", "po",
+    "circa", "tipo", "ho", "mangiato", "bevuto", "preso", "pasto", "pasti", "colazione", "pranzo", "cena",
+    "merenda", "spuntino", "oggi", "ieri", "stamattina", "stasera",
+}
+
+# "caffè senza zucchero": l'alimento che segue non va contato
+_NEGATIONS = {"senza", "niente", "no", "nessun", "nessuna"}
+
+# "gelato al cioccolato": preposizioni che legano un alimento al successivo
+_LINKS = {
+    "di", "d", "del", "della", "dello", "dei", "degli", "delle", "al", "alla", "allo", "ai", "agli", "alle",
+    "a", "in",
+}
+
+# aggettivi che non cambiano la stima: non contano come parole sconosciute
+_NEUTRAL = {
+    "grigliato", "grigliata", "grigliati", "grigliate", "griglia", "lesso", "lessa", "lessi", "bollito",
+    "bollita", "vapore", "fresco", "fresca", "freschi", "fresche", "naturale", "light", "bianco", "bianca",
+    "normale", "classico", "classica", "fatto", "fatta", "casa", "caldo", "calda", "freddo", "fredda",
+    "semplice", "misto", "mista", "misti", "miste",
+}
+
+_SPLIT = re.compile(r"[,;+\n]|\s(?:e|con|ed|piu)\s")
+
+
+@dataclass(slots=True)
+class Food:
+    name: str
+    kcal_100g: float
+    portion_g: float
+    piece_g: float
+
+
+# ----------------------------
+# Tokenizer + indice
+# ----------------------------
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"(\d)\s*([a-z])", r"\1 \2", text)        # 200g -> 200 g
+    text = re.sub(r"(\d),(\d)", r"\1.\2", text)               # 1,5 -> 1.5
+    return re.sub(r"[^a-z0-9./\n,;+]+", " ", text)            # apostrofi e simboli -> spazio
+
+
+def _stem(token: str) -> str:
+    # singolare/plurale: "uovo"/"uova", "mela"/"mele"
+    return token[:-1] if len(token) > 3 and token[-1] in "aeio" else token
+
+
+def _name_key(name: str) -> tuple[str, ...]:
+    return tuple(_stem(t) for t in _normalize(name).split() if t not in _STOPWORDS)
+
+
+def _load(path: Path = FOODS_CSV) -> tuple[dict[tuple[str, ...], Food], int]:
+    index: dict[tuple[str, ...], Food] = {}
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            food = Food(row["name"], float(row["kcal_100g"]), float(row["portion_g"]), float(row["piece_g"] or 0))
+            for name in [row["name"], *filter(None, row["aliases"].split("|"))]:
+                key = _name_key(name)
+                if key:
+                    index.setdefault(key, food)  # a parità di nome vince la prima riga
+    return index, max(len(k) for k in index)
+
+
+_INDEX, _MAX_NGRAM = _load()
+
+
+def _parse_number(tok: str) -> float | None:
+    if tok in _NUMBER_WORDS:
+        return float(_NUMBER_WORDS[tok])
+    if "/" in tok:
+        a, _, b = tok.partition("/")
+        if a.isdigit() and b.isdigit() and int(b):
+            return int(a) / int(b)
+        return None
+    try:
+        return float(tok)
+    except ValueError:
+        return None
+
+
+# ----------------------------
+# Parsing
+# ----------------------------
+def _grams(food: Food, qty: float | None, unit: str | None, size: float) -> float:
+    n = qty if qty is not None else 1
+    if unit is not None and _UNITS[unit] is not None:
+        grams = n * _UNITS[unit]
+    elif unit in _PORTION_UNITS:
+        grams = n * food.portion_g
+    elif unit is not None or qty is not None:
+        # pezzi / fette / bottiglie o numero senza unità: "2 uova"
+        grams = n * (food.piece_g or (30 if unit in ("fetta", "fette") else food.portion_g))
+    else:
+        grams = food.portion_g
+    return grams * size
+
+
+def _parse_segment(segment: str):
+    """
+    Ritorna (voci [(Food, grammi)], parole riconosciute, parole sconosciute,
+    alimenti esclusi da una negazione), oppure None se la voce è ambigua:
+    piatto composto non in tabella o quantità nulla/negativa.
+    """
+    tokens = segment.split()
+    items: list[list] = []       # [food, qty, unit, size, esplicita]
+    qty, unit, size = None, None, 1.0
+    known = unknown = negated = 0
+    negate = False
+    after_food = linked = False  # "gelato" -> "al" -> alimento: piatto composto
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        if tok in _STOPWORDS or tok in _NEUTRAL:
+            linked = linked or (after_food and tok in _LINKS)
+            i += 1
+            continue
+        if tok in _NEGATIONS:
+            negate = True
+            after_food = linked = False
+            i += 1
+            continue
+        n = _parse_number(tok)
+        if n is not None:
+            if n <= 0:
+                return None
+            qty = n if qty is None else qty * n  # "un paio" = 2
+            known += 1
+            after_food = linked = False
+            i += 1
+            continue
+        if tok in _UNITS:
+            unit = tok
+            known += 1
+            after_food = linked = False
+            i += 1
+            continue
+        if tok in _SIZE:
+            size *= _SIZE[tok]
+            known += 1
+            after_food = linked = False
+            i += 1
+            continue
+
+        # n-gramma più lungo (saltando le stopword) che corrisponde a un alimento
+        match, used = None, 0
+        stems, j = [], i
+        while j < len(tokens) and len(stems) < _MAX_NGRAM:
+            if tokens[j] not in _STOPWORDS:
+                stems.append(_stem(tokens[j]))
+                food = _INDEX.get(tuple(stems))
+                if food is not None:
+                    match, used = food, j - i + 1
+            elif not stems:
+                break
+            j += 1
+        if match is None:
+            unknown += 1
+            negate = False  # "senza glutine": parola sconosciuta, la copertura scende
+            after_food = linked = False
+            i += 1
+            continue
+        if linked:
+            return None  # "burro di arachidi": non sono due alimenti
+
+        known += sum(1 for t in tokens[i:i + used] if t not in _STOPWORDS)
+        if negate:
+            negated += 1
+        else:
+            items.append([match, qty, unit, size, qty is not None or unit is not None])
+        qty, unit, size, negate = None, None, 1.0, False
+        after_food = True
+        i += used
+
+    # quantità in coda ("pasta 100 g"): va all'ultima voce senza quantità
+    if (qty is not None or unit is not None) and items and not items[-1][4]:
+        items[-1][1], items[-1][2], items[-1][3] = qty, unit, items[-1][3] * size
+
+    return [(food, _grams(food, q, u, s)) for food, q, u, s, _ in items], known, unknown, negated
+
+
+def estimate_meal_local(text: str) -> dict | None:
+    """
+    Stima dalla tabella alimenti: {total_calories, description, notes, items, source}
+    oppure None se il testo non è coperto abbastanza (o non contiene alimenti noti).
+    """
+    norm = _normalize(text)
+    items, known, unknown = [], 0, 0
+    for segment in _SPLIT.split(f" {norm} "):
+        parsed = _parse_segment(segment)
+        if parsed is None:
+            return None
+        seg_items, k, u, negated = parsed
+        if segment.strip() and not seg_items and not negated:
+            return None  # una voce intera non riconosciuta: meglio il modello
+        items += seg_items
+        known += k
+        unknown += u
+
+    if not items or known / (known + unknown) < MIN_COVERAGE:
+        return None
+
+    rows = [
+        {"food": food.name, "grams": round(grams), "kcal": round(grams * food.kcal_100g / 100.0)}
+        for food, grams in items
+    ]
+    total = float(sum(grams * food.kcal_100g / 100.0 for food, grams in items))
+    detail = " + ".join(f"{r['food']} {r['grams']} g ({r['kcal']} kcal)" for r in rows)
+    return {
+        "total_calories": round(total, 1),
+        "description": (text or "").strip(),
+        "notes": f"Stima locale (tabella alimenti): {detail}.",
+        "items": rows,
+        "source": "local",
+    }
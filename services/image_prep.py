@@ -0,0 +1,108 @@
+# services/image_prep.py
+"""
+Preparazione delle foto prima dell'invio al modello vision.
+
+Le foto da telefono (6–12 MB) vengono:
+- decodificate già ridotte quando il formato lo consente (draft JPEG);
+- raddrizzate secondo l'orientamento EXIF e ridotte al lato massimo;
+- ricodificate senza metadati (EXIF/GPS) in JPEG o WebP, abbassando la
+  qualità (e poi la dimensione) finché non rientrano nel budget di byte.
+
+Se l'immagine non si decodifica si invia l'originale.
+"""
+import os
+import threading
+from io import BytesIO
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps
+
+MAX_EDGE = int(os.getenv("INFORMA_IMAGE_MAX_EDGE", "1024"))
+MAX_BYTES = int(os.getenv("INFORMA_IMAGE_MAX_BYTES", "300000"))
+FORMAT = os.getenv("INFORMA_IMAGE_FORMAT", "JPEG").strip().upper()  # JPEG | WEBP
+QUALITY = int(os.getenv("INFORMA_IMAGE_QUALITY", "85"))
+MIN_QUALITY = 50
+QUALITY_STEP = 10
+MIN_EDGE = 384  # sotto questa misura il cibo non si riconosce più
+
+_MIME = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+_lock = threading.Lock()
+_stats = {"images": 0, "bytes_in": 0, "bytes_out": 0, "passthrough": 0}
+
+
+@dataclass(slots=True)
+class PreparedImage:
+    data: bytes
+    mime: str
+    original_bytes: int
+    width: int | None = None
+    height: int | None = None
+    quality: int | None = None
+
+    @property
+    def bytes_saved(self) -> int:
+        return max(0, self.original_bytes - len(self.data))
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    out = BytesIO()
+    # nessun exif= / icc_profile=: i metadati dell'originale non vengono copiati
+    if fmt == "WEBP":
+        img.save(out, "WEBP", quality=quality, method=4)
+    else:
+        img.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def _load(image_bytes) -> Image.Image:
+    img = Image.open(BytesIO(image_bytes))
+    if img.format == "JPEG":
+        img.draft("RGB", (MAX_EDGE, MAX_EDGE))  # decodifica DCT già scalata (1/2, 1/4, 1/8)
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        flat = Image.new("RGB", img.size, (255, 255, 255))
+        flat.paste(img, mask=img.getchannel("A"))
+        return flat
+    return img.convert("RGB") if img.mode != "RGB" else img
+
+
+def _count(original: int, sent: int, passthrough: bool = False):
+    with _lock:
+        _stats["images"] += 1
+        _stats["bytes_in"] += original
+        _stats["bytes_out"] += sent
+        _stats["passthrough"] += int(passthrough)
+
+
+def prepare_image(image_bytes, mime: str | None = None) -> PreparedImage:
+    original = len(image_bytes)
+    fmt = FORMAT if FORMAT in _MIME else "JPEG"
+    try:
+        img = _load(image_bytes)
+        img.thumbnail((MAX_EDGE, MAX_EDGE), Image.Resampling.LANCZOS)
+    except Exception:
+        _count(original, original, passthrough=True)
+        return PreparedImage(bytes(image_bytes), (mime or "image/jpeg").strip(), original)
+
+    quality = QUALITY
+    data = _encode(img, fmt, quality)
+    while len(data) > MAX_BYTES:
+        if quality - QUALITY_STEP >= MIN_QUALITY:
+            quality -= QUALITY_STEP
+        elif max(img.size) * 3 // 4 >= MIN_EDGE:
+            img = img.resize((img.width * 3 // 4, img.height * 3 // 4), Image.Resampling.LANCZOS)
+        else:
+            break  # meglio sforare il budget che mandare una foto illeggibile
+        data = _encode(img, fmt, quality)
+
+    _count(original, len(data))
+    return PreparedImage(data, _MIME[fmt], original, img.width, img.height, quality)
+
+
+def prep_stats() -> dict:
+    with _lock:
+        out = dict(_stats)
+    out["bytes_saved"] = max(0, out["bytes_in"] - out["bytes_out"])
+    return out
@@ -0,0 +1,308 @@
+# services/importer.py
+"""
+Import dello storico pasti/allenamenti da export CSV o JSON di altre app.
+
+Il file viene letto in streaming (generatori, memoria costante): le righe
+valide sono inserite a blocchi di CHUNK_SIZE con executemany, una transazione
+per blocco, senza toccare daily_summaries; alla fine si ricostruiscono solo i
+giorni importati.
+
+Le righe già presenti prima dell'import (stessa data, ora e descrizione) sono
+saltate e contate in `duplicates`: rilanciare lo stesso file non duplica nulla.
+Le chiavi esistenti si leggono per i soli giorni del file, blocco per blocco.
+
+Colonne riconosciute (alias, maiuscole indifferenti):
+- data:          date, data, day, giorno, datetime, timestamp
+- ora:           time, ora, hour
+- descrizione:   description, descrizione, name, nome, food, cibo, activity, attività, title
+- kcal pasto:    calories, kcal, calorie, energy, energia
+- kcal workout:  calories_burned, kcal, calories, calorie
+- durata (min):  duration_min, duration, durata, minutes, minuti
+
+JSON: array di oggetti oppure JSON Lines (un oggetto per riga).
+
+Uso da riga di comando:
+    python -m services.importer --email io@example.com --kind meals export.csv
+"""
+import io
+import csv
+import json
+import argparse
+import itertools
+from datetime import date, datetime
+from typing import Callable, Iterable, Iterator
+
+from database import get_conn, write
+from db.repo_meals import insert_meals
+from db.repo_summaries import rebuild_days
+from db.repo_workouts import insert_workouts
+
+CHUNK_SIZE = 5000
+MAX_ERRORS = 20         # errori di validazione riportati (gli altri solo contati)
+MAX_KCAL = 10000
+MAX_DURATION_MIN = 24 * 60
+DEFAULT_TIME = "12:00"
+_IN_BATCH = 500         # date per query nel controllo dei duplicati
+
+KINDS = ("meals", "workouts")
+
+_ALIASES = {
+    "date": ("date", "data", "day", "giorno", "datetime", "timestamp"),
+    "time": ("time", "ora", "hour"),
+    "description": ("description", "descrizione", "name", "nome", "food", "cibo",
+                    "activity", "attività", "attivita", "title"),
+    "calories": ("calories", "kcal", "calorie", "energy", "energia"),
+    "calories_burned": ("calories_burned", "kcal", "calories", "calorie"),
+    "duration_min": ("duration_min", "duration", "durata", "minutes", "minuti"),
+}
+
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y/%m/%d")
+
+
+# ----------------------------
+# Lettura in streaming
+# ----------------------------
+def _iter_csv(stream) -> Iterator[dict]:
+    sample = stream.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    # il campione letto per lo sniffing (completato fino a fine riga) torna in testa
+    lines = itertools.chain(io.StringIO(sample + stream.readline()), stream)
+    yield from csv.DictReader(lines, dialect=dialect)
+
+
+def _iter_json(stream, buf_size: int = 65536) -> Iterator[dict]:
+    """Oggetti di un array JSON o di un file JSON Lines, decodificati uno alla volta."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    while True:
+        # salto spazi e separatori dell'array
+        while pos < len(buf) and buf[pos] in " \t\r\n,[]":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                return
+            buf, pos = stream.read(buf_size), 0
+            eof = not buf
+            continue
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError(f"JSON non valido vicino a: {buf[pos:pos + 60]!r}")
+            chunk = stream.read(buf_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        if isinstance(obj, dict):
+            yield obj
+        pos = end
+
+
+def iter_records(stream, fmt: str) -> Iterator[dict]:
+    """stream testuale; fmt 'csv' o 'json'."""
+    if fmt == "csv":
+        return _iter_csv(stream)
+    if fmt == "json":
+        return _iter_json(stream)
+    raise ValueError(f"Formato non supportato: {fmt}")
+
+
+# ----------------------------
+# Validazione / normalizzazione
+# ----------------------------
+def _pick(rec: dict, field: str):
+    for alias in _ALIASES[field]:
+        v = rec.get(alias)
+        if v not in (None, ""):
+            return v
+    return None
+
+
+def _parse_number(v, what: str) -> float:
+    if isinstance(v, (int, float)):
+        return float(v)
+    try:
+        return float(str(v).strip().replace(" ", "").replace(",", "."))
+    except ValueError:
+        raise ValueError(f"{what} non numerico: {v!r}")
+
+
+def _parse_date_time(raw_date, raw_time) -> tuple[str, str]:
+    s = str(raw_date).strip()
+    d, t = None, None
+    try:
+        dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+        d = dt.date()
+        if "T" in s or " " in s:
+            t = dt.strftime("%H:%M")
+    except ValueError:
+        for fmt in _DATE_FORMATS:
+            try:
+                d = datetime.strptime(s, fmt).date()
+                break
+            except ValueError:
+                continue
+    if d is None:
+        raise ValueError(f"data non riconosciuta: {raw_date!r}")
+    if d > date.today():
+        raise ValueError(f"data nel futuro: {d.isoformat()}")
+
+    if raw_time not in (None, ""):
+        parts = str(raw_time).strip().replace(".", ":").split(":")
+        try:
+            hh, mm = int(parts[0]), int(parts[1]) if len(parts) > 1 else 0
+        except ValueError:
+            raise ValueError(f"ora non valida: {raw_time!r}")
+        if not (0 <= hh < 24 and 0 <= mm < 60):
+            raise ValueError(f"ora non valida: {raw_time!r}")
+        t = f"{hh:02d}:{mm:02d}"
+    return d.isoformat(), t or DEFAULT_TIME
+
+
+def normalize(rec: dict, kind: str, user_id: int) -> tuple:
+    """Riga pronta per insert_meals / insert_workouts; ValueError se non valida."""
+    rec = {str(k).strip().lower(): v for k, v in rec.items() if k is not None}
+
+    raw_date = _pick(rec, "date")
+    if raw_date is None:
+        raise ValueError("data mancante")
+    ds, t = _parse_date_time(raw_date, _pick(rec, "time"))
+
+    desc = str(_pick(rec, "description") or "").strip()
+    if not desc:
+        raise ValueError("descrizione mancante")
+
+    raw_kcal = _pick(rec, "calories" if kind == "meals" else "calories_burned")
+    kcal = _parse_number(raw_kcal, "kcal") if raw_kcal is not None else None
+    if kcal is None or not (0 <= kcal <= MAX_KCAL):
+        raise ValueError(f"kcal mancanti o fuori range: {raw_kcal!r}")
+
+    raw = json.dumps({"source": "import", "record": rec}, ensure_ascii=False, default=str)
+    if kind == "meals":
+        return (user_id, ds, t, desc, kcal, raw)
+
+    raw_dur = _pick(rec, "duration_min")
+    dur = _parse_number(raw_dur, "durata") if raw_dur is not None else 0.0
+    if not (0 <= dur <= MAX_DURATION_MIN):
+        raise ValueError(f"durata fuori range: {raw_dur!r}")
+    return (user_id, ds, t, desc, int(round(dur)), kcal, raw)
+
+
+# ----------------------------
+# Import
+# ----------------------------
+def _existing_keys(user_id: int, kind: str, dates: Iterable[str]) -> set[tuple[str, str, str]]:
+    """(data, ora, descrizione) già salvati nei giorni indicati (indice user_id, date)."""
+    table = "meals" if kind == "meals" else "workouts"
+    dates = sorted(dates)
+    keys: set[tuple[str, str, str]] = set()
+    for i in range(0, len(dates), _IN_BATCH):
+        part = dates[i:i + _IN_BATCH]
+        rows = get_conn().execute(
+            f"SELECT date, time, description FROM {table} WHERE user_id=? AND date IN ({','.join('?' * len(part))})",
+            (user_id, *part)
+        ).fetchall()
+        keys.update((r["date"], r["time"], r["description"]) for r in rows)
+    return keys
+
+
+def _chunks(rows: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_records(user_id: int, records: Iterable[dict], kind: str,
+                   on_progress: Callable[[int, int], None] | None = None) -> dict:
+    """
+    Valida e inserisce i record a blocchi. Ritorna imported, skipped, duplicates
+    (righe già presenti prima dell'import), days, errors (primi MAX_ERRORS
+    messaggi, con il numero di record 1-based).
+    """
+    if kind not in KINDS:
+        raise ValueError(f"kind deve essere uno di {KINDS}")
+    insert = insert_meals if kind == "meals" else insert_workouts
+
+    stats = {"imported": 0, "skipped": 0, "duplicates": 0, "days": 0, "errors": []}
+    touched: set[str] = set()
+    existing: set[tuple[str, str, str]] = set()
+    loaded: set[str] = set()   # giorni di cui existing contiene già le chiavi (lette prima dell'import)
+
+    def _valid_rows():
+        for n, rec in enumerate(records, start=1):
+            try:
+                row = normalize(rec, kind, user_id)
+            except ValueError as e:
+                stats["skipped"] += 1
+                if len(stats["errors"]) < MAX_ERRORS:
+                    stats["errors"].append(f"record {n}: {e}")
+                continue
+            yield row
+
+    try:
+        for chunk in _chunks(_valid_rows(), CHUNK_SIZE):
+            new_dates = {row[1] for row in chunk} - loaded
+            if new_dates:
+                existing |= _existing_keys(user_id, kind, new_dates)
+                loaded |= new_dates
+            fresh = [row for row in chunk if (row[1], row[2], row[3]) not in existing]
+            stats["duplicates"] += len(chunk) - len(fresh)
+            if fresh:
+                insert(fresh, summaries=False)
+                touched.update(row[1] for row in fresh)
+            stats["imported"] += len(fresh)
+            if on_progress:
+                on_progress(stats["imported"], stats["skipped"])
+    finally:
+        # anche se un blocco fallisce, i blocchi già scritti devono avere i riepiloghi giusti
+        if touched:
+            write(lambda c: rebuild_days(c, user_id, touched))
+        stats["days"] = len(touched)
+    return stats
+
+
+def import_file(user_id: int, stream, fmt: str, kind: str,
+                on_progress: Callable[[int, int], None] | None = None) -> dict:
+    return import_records(user_id, iter_records(stream, fmt), kind, on_progress)
+
+
+def _user_id_for_email(email: str) -> int | None:
+    row = get_conn().execute("SELECT id FROM users WHERE email=?", (email.strip().lower(),)).fetchone()
+    return row["id"] if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa pasti o allenamenti da CSV/JSON.")
+    parser.add_argument("path")
+    parser.add_argument("--email", required=True, help="utente di destinazione")
+    parser.add_argument("--kind", choices=KINDS, required=True)
+    parser.add_argument("--format", choices=("csv", "json"), help="default: dall'estensione del file")
+    args = parser.parse_args()
+
+    user_id = _user_id_for_email(args.email)
+    if user_id is None:
+        raise SystemExit(f"Utente non trovato: {args.email}")
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "json")
+
+    with open(args.path, encoding="utf-8-sig", newline="") as f:
+        stats = import_file(
+            user_id, f, fmt, args.kind,
+            on_progress=lambda ok, ko: print(f"\r{ok} importati, {ko} scartati", end="", flush=True),
+        )
+    print()
+    print(f"Importati {stats['imported']} · già presenti {stats['duplicates']} · scartati {stats['skipped']} · "
+          f"giorni ricalcolati {stats['days']}")
+    for err in stats["errors"]:
+        print(f"  - {err}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# services/jobs.py
+"""
+Lavori in background per le chiamate AI: la UI invia un job, riceve un id e
+legge il risultato nei rerun successivi (components/job_status.py), così lo
+script Streamlit non resta bloccato sulla rete.
+
+- pool di INFORMA_JOBS_WORKERS thread, al massimo INFORMA_JOBS_MAX_PENDING job
+  tra in coda e in corso (oltre: JobQueueFull);
+- stato persistito nella tabella jobs (queued/running/done/failed);
+- testo parziale dei job in streaming (piano settimanale) solo in memoria;
+- all'avvio, i job lasciati a metà da un processo non più vivo dello stesso
+  host diventano failed (quelli degli altri worker attivi restano).
+
+I job non sopravvivono al riavvio: dati binari (foto) e callback on_done
+restano in memoria.
+"""
+import os
+import json
+import uuid
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from ai import (
+    WeeklyPlanStream,
+    analyze_food_photo,
+    estimate_meal_from_text,
+    estimate_meals_batch,
+    estimate_workout_from_text,
+    estimate_workouts_batch,
+)
+from db.repo_jobs import fail_job, fail_orphaned_jobs, finish_job, get_job, insert_job, start_job
+from db.rows import Job
+
+WORKERS = int(os.getenv("INFORMA_JOBS_WORKERS", "4"))
+MAX_PENDING = int(os.getenv("INFORMA_JOBS_MAX_PENDING", "32"))
+
+_HOST = socket.gethostname()
+# host:pid:avvio — nei container il processo riparte spesso con lo stesso pid
+_OWNER = f"{_HOST}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+_progress: dict[str, str] = {}
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class JobFailed(RuntimeError):
+    pass
+
+
+# ----------------------------
+# Tipi di job
+# ----------------------------
+def _weekly_plan(job_id: str, params: dict, payload: dict) -> str:
+    stream = WeeklyPlanStream(params["prompt"])
+    text = ""
+    for part in stream:
+        text += part
+        _progress[job_id] = text
+    if stream.failed:
+        raise JobFailed(text.strip().splitlines()[-1] if text.strip() else "Piano non generato.")
+    return stream.text
+
+
+_RUNNERS: dict[str, Callable[[str, dict, dict], Any]] = {
+    "meal_text": lambda _id, p, _pl: estimate_meal_from_text(p["text"]),
+    "meal_photo": lambda _id, p, pl: analyze_food_photo(pl["image"], p["mime"], p["time"], p["note"]),
+    "meals_batch": lambda _id, p, _pl: estimate_meals_batch(p["text"]),
+    "workout_text": lambda _id, p, _pl: estimate_workout_from_text(p["text"], p["weight_kg"], p["height_cm"]),
+    "workouts_batch": lambda _id, p, _pl: estimate_workouts_batch(p["text"], p["weight_kg"], p["height_cm"]),
+    "weekly_plan": _weekly_plan,
+}
+
+
+# ----------------------------
+# Pool
+# ----------------------------
+def _owner_alive(owner: str) -> bool:
+    """Owner dello stesso host: vivo se il suo pid esiste ancora e non è un nostro avvio precedente."""
+    try:
+        pid = int(owner.split(":")[1])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return False  # stesso pid ma owner diverso: processo precedente
+    if os.name == "nt":
+        return True  # niente controllo affidabile: meglio non toccare job forse vivi
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # esiste, di un altro utente
+    return True
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is not None:
+        return _executor
+    with _lock:
+        if _executor is None:
+            fail_orphaned_jobs(_HOST, _OWNER, _owner_alive)
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="informa-job")
+    return _executor
+
+
+def _run(job_id: str, kind: str, params: dict, payload: dict, on_done: Callable[[Any], None] | None):
+    try:
+        start_job(job_id)
+        result = _RUNNERS[kind](job_id, params, payload)
+        if on_done is not None:
+            on_done(result)
+        finish_job(job_id, json.dumps(result, ensure_ascii=False))
+    except Exception as e:
+        fail_job(job_id, str(e) or type(e).__name__)
+    finally:
+        _progress.pop(job_id, None)
+        _slots.release()
+
+
+def submit(user_id: int, kind: str, params: dict, payload: dict | None = None,
+           on_done: Callable[[Any], None] | None = None) -> str:
+    """
+    Accoda un job e ritorna il suo id. params finisce nella tabella (JSON), payload
+    (es. bytes della foto) resta in memoria. on_done(result) gira nel worker prima
+    che il job risulti done: se solleva, il job è failed.
+    """
+    if kind not in _RUNNERS:
+        raise ValueError(f"Tipo di job sconosciuto: {kind}")
+    pool = _pool()
+    if not _slots.acquire(blocking=False):
+        raise JobQueueFull("Troppe stime in corso: riprova tra qualche secondo.")
+    job_id = uuid.uuid4().hex
+    try:
+        insert_job(job_id, user_id, kind, json.dumps(params, ensure_ascii=False), _OWNER)
+        pool.submit(_run, job_id, kind, params, payload or {}, on_done)
+    except Exception:
+        _slots.release()
+        raise
+    return job_id
+
+
+def job(job_id: str) -> Job | None:
+    return get_job(job_id)
+
+
+def job_result(j: Job) -> Any:
+    return json.loads(j.result) if j.result else None
+
+
+def progress(job_id: str) -> str:
+    return _progress.get(job_id, "")
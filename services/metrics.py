@@ -0,0 +1,353 @@
+# services/metrics.py
+"""
+Metriche in memoria del processo, esposte in formato testo Prometheus.
+
+- registry con Counter / Histogram / Gauge (label come kwargs, thread-safe);
+- chiamate AI: ogni funzione di ai_service è avvolta da @instrument(nome) e
+  registra latenza end-to-end per esito (local / cache / model / fallback /
+  error), tentativi verso il provider per stato, retry, token dall'usage
+  della risposta, costo stimato (PRICES, USD per milione di token), cache
+  hit/miss e fallback per motivo;
+- endpoint: con INFORMA_METRICS_PORT impostata, start_from_env() avvia un
+  server HTTP (GET /metrics) su INFORMA_METRICS_ADDR (default 127.0.0.1).
+
+Ogni processo ha il suo registry: con più repliche si fa lo scrape di ognuna.
+"""
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+METRICS_PORT = os.getenv("INFORMA_METRICS_PORT")
+METRICS_ADDR = os.getenv("INFORMA_METRICS_ADDR", "127.0.0.1")
+
+# USD per 1M token: (input, input in cache, output)
+PRICES = {
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+LATENCY_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(x: float) -> str:
+    if x == float("inf"):
+        return "+Inf"
+    return repr(float(x)) if x != int(x) else str(int(x))
+
+
+# ----------------------------
+# Tipi di metrica
+# ----------------------------
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> dict[tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def expose(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in sorted(self.values().items())
+        ]
+
+
+class Gauge(_Metric):
+    """Valore letto al momento dell'esposizione."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn: Callable[[], float]):
+        super().__init__(name, help_text)
+        self.fn = fn
+
+    def expose(self) -> list[str]:
+        return self.header() + [f"{self.name} {_num(self.fn())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._data: dict[tuple, list] = {}  # key -> [conteggi per bucket (+Inf in coda), somma, n]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            d = self._data.get(key)
+            if d is None:
+                d = self._data[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            d[0][i] += 1
+            d[1] += value
+            d[2] += 1
+
+    def values(self) -> dict[tuple, tuple[list[int], float, int]]:
+        with self._lock:
+            return {k: (list(c), s, n) for k, (c, s, n) in self._data.items()}
+
+    def quantile(self, q: float, counts: list[int], n: int) -> float:
+        """Stima per interpolazione lineare nel bucket (come histogram_quantile)."""
+        if n == 0:
+            return float("nan")
+        rank, seen = q * n, 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # oltre l'ultimo bucket: limite noto
+                lo = self.buckets[i - 1] if i else 0.0
+                return lo + (self.buckets[i] - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def expose(self) -> list[str]:
+        lines = self.header()
+        for key, (counts, total, n) in sorted(self.values().items()):
+            cum = 0
+            for le, c in zip((*self.buckets, float("inf")), counts):
+                cum += c
+                le_label = f'le="{_num(le)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le_label)} {cum}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> Any:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def get(self, name: str) -> _Metric | None:
+        return self._metrics.get(name)
+
+    def expose(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for m in metrics for line in m.expose()) + "\n"
+
+
+registry = Registry()
+
+
+# ----------------------------
+# Metriche AI
+# ----------------------------
+AI_LATENCY = registry.register(Histogram(
+    "informa_ai_call_seconds", "Latenza end-to-end delle funzioni AI per esito.", ("fn", "outcome")))
+AI_ATTEMPTS = registry.register(Counter(
+    "informa_ai_attempts_total", "Richieste al provider AI per stato.", ("fn", "status")))
+AI_RETRIES = registry.register(Counter(
+    "informa_ai_retries_total", "Nuovi tentativi dopo un errore transitorio.", ("fn",)))
+AI_TOKENS = registry.register(Counter(
+    "informa_ai_tokens_total", "Token dall'usage delle risposte.", ("fn", "model", "type")))
+AI_COST = registry.register(Counter(
+    "informa_ai_cost_usd_total", "Costo stimato in USD (PRICES).", ("fn", "model")))
+AI_CACHE = registry.register(Counter(
+    "informa_ai_cache_total", "Consultazioni della cache delle stime.", ("fn", "result")))
+AI_FALLBACKS = registry.register(Counter(
+    "informa_ai_fallbacks_total", "Risposte di fallback (modello non disponibile) per motivo.", ("fn", "reason")))
+
+_current: ContextVar["AICall | None"] = ContextVar("ai_call", default=None)
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    p_in, p_cached, p_out = PRICES.get(model, (0.0, 0.0, 0.0))
+    fresh = max(0, prompt_tokens - cached_tokens)
+    return (fresh * p_in + cached_tokens * p_cached + completion_tokens * p_out) / 1_000_000
+
+
+class AICall:
+    """Una chiamata logica a una funzione AI: raccoglie esito e contatori sotto il suo nome."""
+    __slots__ = ("fn", "outcome", "t0")
+
+    def __init__(self, fn: str):
+        self.fn = fn
+        self.outcome = "model"
+        self.t0 = time.perf_counter()
+
+    def cache(self, hit: bool):
+        AI_CACHE.inc(fn=self.fn, result="hit" if hit else "miss")
+        if hit:
+            self.outcome = "cache"
+
+    def local(self):
+        self.outcome = "local"
+
+    def attempt(self, status: str):
+        AI_ATTEMPTS.inc(fn=self.fn, status=status)
+
+    def retry(self):
+        AI_RETRIES.inc(fn=self.fn)
+
+    def usage(self, model: str, usage: Any):
+        """usage = resp.usage dell'SDK (None se il provider non l'ha mandato)."""
+        if usage is None:
+            return
+        prompt = int(getattr(usage, "prompt_tokens", 0) or 0)
+        completion = int(getattr(usage, "completion_tokens", 0) or 0)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = int(getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+        AI_TOKENS.inc(prompt, fn=self.fn, model=model, type="prompt")
+        AI_TOKENS.inc(completion, fn=self.fn, model=model, type="completion")
+        if cached:
+            AI_TOKENS.inc(cached, fn=self.fn, model=model, type="cached")
+        AI_COST.inc(cost_usd(model, prompt, completion, cached), fn=self.fn, model=model)
+
+    def fallback(self, reason: str):
+        AI_FALLBACKS.inc(fn=self.fn, reason=reason)
+        self.outcome = "fallback"
+
+    def finish(self):
+        AI_LATENCY.observe(time.perf_counter() - self.t0, fn=self.fn, outcome=self.outcome)
+
+
+def current_call() -> AICall:
+    """La chiamata in corso nel contesto (fuori da @instrument: una senza latenza, nome "other")."""
+    return _current.get() or AICall("other")
+
+
+def instrument(fn_name: str):
+    """Decoratore: latenza ed esito della funzione, contatori interni attribuiti a fn_name."""
+    def deco(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            call = AICall(fn_name)
+            token = _current.set(call)
+            try:
+                return f(*args, **kwargs)
+            except Exception:
+                call.outcome = "error"
+                raise
+            finally:
+                _current.reset(token)
+                call.finish()
+        return wrapper
+    return deco
+
+
+def ai_summary() -> list[dict]:
+    """Una riga per funzione AI, per il pannello admin."""
+    rows: dict[str, dict] = {}
+
+    def row(fn: str) -> dict:
+        return rows.setdefault(fn, {
+            "fn": fn, "calls": 0, "model": 0, "local": 0, "cache": 0, "fallback": 0, "error": 0,
+            "p50_s": float("nan"), "p95_s": float("nan"), "p99_s": float("nan"),
+            "attempts": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+            "cache_hit_rate": float("nan"),
+        })
+
+    merged: dict[str, tuple[list[int], int]] = {}
+    for (fn, outcome), (counts, _total, n) in AI_LATENCY.values().items():
+        r = row(fn)
+        r["calls"] += n
+        r[outcome] = r.get(outcome, 0) + n
+        prev = merged.get(fn)
+        merged[fn] = (counts, n) if prev is None else ([a + b for a, b in zip(prev[0], counts)], prev[1] + n)
+    for fn, (counts, n) in merged.items():
+        for q in (50, 95, 99):
+            rows[fn][f"p{q}_s"] = round(AI_LATENCY.quantile(q / 100, counts, n), 3)
+    for (fn, _status), v in AI_ATTEMPTS.values().items():
+        row(fn)["attempts"] += int(v)
+    for (fn,), v in AI_RETRIES.values().items():
+        row(fn)["retries"] += int(v)
+    for (fn, _model, typ), v in AI_TOKENS.values().items():
+        if typ in ("prompt", "completion"):
+            row(fn)[f"{typ}_tokens"] += int(v)
+    for (fn, _model), v in AI_COST.values().items():
+        row(fn)["cost_usd"] = round(row(fn)["cost_usd"] + v, 6)
+    cache = AI_CACHE.values()
+    for fn in {k[0] for k in cache}:
+        hits, misses = cache.get((fn, "hit"), 0.0), cache.get((fn, "miss"), 0.0)
+        row(fn)["cache_hit_rate"] = round(hits / (hits + misses), 3) if hits + misses else float("nan")
+    return sorted(rows.values(), key=lambda r: r["fn"])
+
+
+# ----------------------------
+# Endpoint HTTP
+# ----------------------------
+_server: ThreadingHTTPServer | None = None
+_server_lock = threading.Lock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/") not in ("/metrics", ""):
+            self.send_error(404)
+            return
+        body = registry.expose().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(port: int, addr: str = METRICS_ADDR) -> bool:
+    """Avvia l'endpoint una volta per processo; False se la porta è occupata (es. altro processo)."""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return True
+        try:
+            _server = ThreadingHTTPServer((addr, port), _Handler)
+        except OSError:
+            return False
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="informa-metrics", daemon=True).start()
+        return True
+
+
+def start_from_env() -> bool:
+    return bool(METRICS_PORT) and start_server(int(METRICS_PORT))
@@ -0,0 +1,109 @@
+# services/openai_client.py
+"""
+Client OpenAI condiviso dal processo.
+
+Un solo client (e quindi un solo pool di connessioni HTTP keep-alive) creato
+alla prima richiesta e ricreato solo se cambia la API key. I retry li gestisce
+ai_service (max_retries=0 qui). Timeout espliciti:
+- connect/read/write/pool per singola operazione HTTP;
+- una scadenza complessiva per chiamata logica (retry compresi), impostata con
+  `with call_deadline(secondi):` e applicata a ogni richiesta fatta dentro il blocco.
+
+Variabili d'ambiente: INFORMA_OPENAI_POOL_SIZE, INFORMA_OPENAI_KEEPALIVE,
+INFORMA_OPENAI_CONNECT_TIMEOUT, INFORMA_OPENAI_READ_TIMEOUT,
+INFORMA_OPENAI_DEADLINE (secondi). OPENAI_BASE_URL è letta dall'SDK.
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+import httpx
+import streamlit as st
+from openai import OpenAI
+
+POOL_SIZE = int(os.getenv("INFORMA_OPENAI_POOL_SIZE", "20"))
+KEEPALIVE = int(os.getenv("INFORMA_OPENAI_KEEPALIVE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("INFORMA_OPENAI_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("INFORMA_OPENAI_READ_TIMEOUT", "30"))
+CALL_DEADLINE = float(os.getenv("INFORMA_OPENAI_DEADLINE", "45"))
+
+_lock = threading.Lock()
+_client: Optional[OpenAI] = None
+_client_key: Optional[str] = None
+_deadline: ContextVar[Optional[float]] = ContextVar("openai_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class ConfigError(RuntimeError):
+    """Configurazione mancante o non valida (API key): il provider non è stato contattato."""
+
+
+def get_api_key() -> Optional[str]:
+    try:
+        if "OPENAI_API_KEY" in st.secrets:
+            return st.secrets["OPENAI_API_KEY"]
+    except Exception:
+        pass
+    return os.getenv("OPENAI_API_KEY")
+
+
+def _timeout(limit: float | None = None) -> httpx.Timeout:
+    cap = (lambda t: t) if limit is None else (lambda t: min(t, limit))
+    return httpx.Timeout(connect=cap(CONNECT_TIMEOUT), read=cap(READ_TIMEOUT),
+                         write=cap(READ_TIMEOUT), pool=cap(CONNECT_TIMEOUT))
+
+
+def _build(api_key: str) -> OpenAI:
+    http = httpx.Client(
+        limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=KEEPALIVE),
+        timeout=_timeout(),
+    )
+    return OpenAI(api_key=api_key, http_client=http, max_retries=0, timeout=_timeout())
+
+
+def _shared_client() -> OpenAI:
+    global _client, _client_key
+    api_key = get_api_key()
+    if not api_key:
+        raise ConfigError("OPENAI_API_KEY mancante (st.secrets o env var).")
+    if _client is not None and _client_key == api_key:
+        return _client
+    with _lock:
+        if _client is None or _client_key != api_key:
+            # il client vecchio non si chiude: può avere richieste in corso in altri thread
+            _client, _client_key = _build(api_key), api_key
+        return _client
+
+
+def remaining() -> float | None:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def get_client() -> OpenAI:
+    """Client condiviso; dentro call_deadline() i timeout sono ridotti al tempo che resta."""
+    client = _shared_client()
+    left = remaining()
+    if left is None:
+        return client
+    if left <= 0:
+        raise DeadlineExceeded("Tempo massimo della chiamata AI superato.")
+    return client.with_options(timeout=_timeout(left))  # stesso pool HTTP
+
+
+@contextmanager
+def call_deadline(seconds: float = CALL_DEADLINE):
+    """Scadenza complessiva per le richieste nel blocco (annidato: vale la più vicina)."""
+    new = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(new if current is None else min(current, new))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
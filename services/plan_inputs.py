@@ -0,0 +1,140 @@
+# services/plan_inputs.py
+"""
+Input del piano settimanale in forma canonica, prompt e chiave di cache.
+
+Il piano dipende solo da quello che finisce nel prompt: i campi del profilo
+che contano, il peso (al kg) a fine settimana di riferimento, gli allenamenti
+come giorno della settimana + ora (non la data: lo stesso schema vale in ogni
+settimana) e le medie dell'ultima settimana già chiusa a scaglioni di
+BUCKET_KCAL: niente che cambi mentre si registra la giornata. La chiave è
+lo SHA-256 di questi input più modello e WEEKLY_PLAN_PROMPT_VERSION: stessi
+input -> stesso piano riusato, un cambiamento vero -> piano nuovo.
+"""
+import os
+import re
+import json
+import hashlib
+from datetime import date, timedelta
+
+from db.repo_summaries import list_summaries
+from services.ai_service import MODEL, WEEKLY_PLAN_PROMPT_VERSION
+from services.quicklog import normalize
+
+HISTORY = int(os.getenv("INFORMA_PLAN_HISTORY", "12"))  # piani tenuti per utente
+BUCKET_KCAL = 100
+
+DAYS = ["Lun", "Mar", "Mer", "Gio", "Ven", "Sab", "Dom"]
+_PROFILE_FIELDS = ("sex", "age", "height_cm", "activity_level", "goal_type", "goal_weight")
+_LABELS = {
+    "sex": "sesso", "age": "età", "height_cm": "altezza cm", "activity_level": "attività",
+    "goal_type": "obiettivo", "goal_weight": "peso obiettivo kg", "weight_kg": "peso attuale kg",
+}
+
+
+def _hhmm(value, default: str = "19:00") -> str:
+    m = re.match(r"^\s*(\d{1,2})(?:[:.](\d{2}))?", str(value or ""))
+    if not m or int(m.group(1)) > 23 or int(m.group(2) or 0) > 59:
+        return default
+    return f"{int(m.group(1)):02d}:{m.group(2) or '00'}"
+
+
+def _bucket(kcal: float) -> int:
+    return int(round(kcal / BUCKET_KCAL) * BUCKET_KCAL)
+
+
+def week_slots(slots, week_start: date) -> list[dict]:
+    """
+    Allenamenti riportati nella settimana scelta: il giorno della settimana
+    della data indicata, l'ora in HH:MM, righe senza data valida scartate.
+    """
+    monday = week_start - timedelta(days=week_start.weekday())
+    out = []
+    for slot in slots or []:
+        try:
+            d = date.fromisoformat(str(slot.get("date") or "")[:10])
+        except ValueError:
+            continue
+        out.append({
+            "date": str(monday + timedelta(days=d.weekday())),
+            "time": _hhmm(slot.get("time")),
+            "title": (slot.get("title") or "Allenamento").strip() or "Allenamento",
+            "duration_min": int(float(slot.get("duration_min") or 0)),
+        })
+    return sorted(out, key=lambda s: (s["date"], s["time"]))
+
+
+def reference_week(week_start: date, today: date | None = None) -> tuple[date, date]:
+    """
+    Ultima settimana (lun-dom) già finita prima di week_start. Con week_start
+    = lunedì prossimo la settimana precedente è quella in corso: non conta,
+    altrimenti la chiave cambierebbe a ogni pasto o peso registrato.
+    """
+    today = today or date.today()
+    end = min(week_start - timedelta(days=week_start.weekday()), today - timedelta(days=today.weekday()))
+    end -= timedelta(days=1)
+    return end - timedelta(days=6), end
+
+
+def last_week_summary(user_id: int, week_start: date, today: date | None = None) -> dict | None:
+    """Medie giornaliere della settimana di riferimento, a scaglioni di BUCKET_KCAL."""
+    start, end = reference_week(week_start, today)
+    rows = list_summaries(user_id, start, end)
+    if not rows:
+        return None
+    n = len(rows)
+    return {
+        "avg_in": _bucket(sum(r.calories_in or 0 for r in rows) / n),
+        "avg_out": _bucket(sum(r.calories_out or 0 for r in rows) / n),
+    }
+
+
+def plan_inputs(profile: dict, weight_kg: float | None, slots: list[dict], last_week: dict | None) -> dict:
+    """
+    Input canonici: `slots` come da week_slots(), `last_week` come da
+    last_week_summary(), `weight_kg` alla fine di reference_week().
+    """
+    prof = {}
+    for k in _PROFILE_FIELDS:
+        v = profile.get(k)
+        if isinstance(v, str):
+            v = v.strip().lower() or None
+        elif isinstance(v, (int, float)):
+            v = round(float(v), 1)
+            v = int(v) if v.is_integer() else v  # 178 e 178.0 devono dare la stessa chiave
+        prof[k] = v
+    prof["weight_kg"] = round(weight_kg) if weight_kg else None
+    return {
+        "profile": prof,
+        "workouts": [
+            [date.fromisoformat(s["date"]).weekday(), s["time"], normalize(s["title"]), s["duration_min"]]
+            for s in slots
+        ],
+        "last_week": last_week,
+    }
+
+
+def plan_key(inputs: dict) -> str:
+    raw = json.dumps({"model": MODEL, "prompt_version": WEEKLY_PLAN_PROMPT_VERSION, **inputs},
+                     sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def plan_prompt(inputs: dict) -> str:
+    """Il prompt usa solo gli input canonici: un piano riusato vale davvero per la nuova settimana."""
+    p = inputs["profile"]
+    profile = ", ".join(f"{_LABELS[k]}: {v}" for k, v in p.items() if v not in (None, ""))
+    workouts = "; ".join(
+        f"{DAYS[day]} {t} {title} ({dur} min)" if dur else f"{DAYS[day]} {t} {title}"
+        for day, t, title, dur in inputs["workouts"]
+    ) or "nessuno"
+    lw = inputs["last_week"]
+    last_week = (
+        f"media ~{lw['avg_in']} kcal assunte e ~{lw['avg_out']} kcal consumate al giorno"
+        if lw else "nessun dato"
+    )
+    return f"""Sei un coach nutrizionale/fitness. Crea un piano settimanale pratico e sostenibile.
+Profilo: {profile or 'non compilato'}
+Allenamenti previsti: {workouts}
+Ultima settimana completa (riassunto): {last_week}
+Scrivi un piano giorno-per-giorno (Lun→Dom) con pasti e kcal.
+"""
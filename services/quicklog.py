@@ -0,0 +1,167 @@
+# services/quicklog.py
+"""
+Ricerca rapida tra i pasti già registrati dall'utente, per ripeterli con un
+clic (kcal salvate, nessuna chiamata AI).
+
+Per ogni utente attivo un indice in memoria costruito dagli ultimi
+HISTORY_ROWS pasti:
+- descrizioni normalizzate (minuscole, senza accenti/punteggiatura) raggruppate,
+  con conteggio, ultima data e kcal dell'ultima volta;
+- array ordinato di termini (la descrizione a partire da ogni parola) su cui
+  la ricerca per prefisso è una bisect: "pom" trova "pasta al pomodoro";
+- ordinamento per frequenza pesata dalla recenza (dimezza ogni HALF_LIFE_DAYS).
+
+L'indice si aggiorna dopo ogni insert_meal/insert_meals (on_meals_changed) e
+resta limitato: al più MAX_ENTRIES descrizioni per utente e MAX_USERS utenti (LRU).
+"""
+import os
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+
+from db.repo_meals import list_recent_meals, on_meals_changed
+
+HISTORY_ROWS = int(os.getenv("INFORMA_QUICKLOG_HISTORY", "2000"))
+MAX_ENTRIES = int(os.getenv("INFORMA_QUICKLOG_MAX_ENTRIES", "300"))
+MAX_USERS = int(os.getenv("INFORMA_QUICKLOG_USERS", "64"))
+HALF_LIFE_DAYS = 30.0
+BULK_RELOAD = 500  # oltre queste righe in un colpo (import) si ricarica dal DB
+
+_lock = threading.Lock()
+_users: "OrderedDict[int, _UserIndex]" = OrderedDict()
+
+
+@dataclass(slots=True)
+class QuickMeal:
+    description: str
+    calories: float
+    count: int
+    last_date: str
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def _terms(key: str) -> list[str]:
+    words = key.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def _score(m: QuickMeal, today: date) -> float:
+    try:
+        days = max(0, (today - date.fromisoformat(m.last_date)).days)
+    except ValueError:
+        days = 365
+    return m.count * 0.5 ** (days / HALF_LIFE_DAYS)
+
+
+# ----------------------------
+# Indice per utente
+# ----------------------------
+class _UserIndex:
+    def __init__(self, history: list[tuple[str, float, str]]):
+        self.meals: dict[str, QuickMeal] = {}
+        self.terms: list[tuple[str, str]] = []  # (termine, chiave), ordinato
+        for desc, kcal, ds in history:  # dal più recente: la prima occorrenza dà le kcal
+            key = normalize(desc)
+            if not key:
+                continue
+            m = self.meals.get(key)
+            if m is None:
+                self.meals[key] = QuickMeal(desc.strip(), kcal, 1, ds)
+            else:
+                m.count += 1
+        self._trim()
+        self.terms = sorted((t, k) for k in self.meals for t in _terms(k))
+
+    def _trim(self):
+        if len(self.meals) <= MAX_ENTRIES:
+            return
+        today = date.today()
+        ranked = sorted(self.meals, key=lambda k: _score(self.meals[k], today), reverse=True)
+        for key in ranked[MAX_ENTRIES:]:
+            del self.meals[key]
+            for t in _terms(key):
+                i = bisect_left(self.terms, (t, key))
+                if i < len(self.terms) and self.terms[i] == (t, key):
+                    del self.terms[i]
+
+    def add(self, desc: str, kcal: float, ds: str):
+        key = normalize(desc)
+        if not key:
+            return
+        m = self.meals.get(key)
+        if m is None:
+            self.meals[key] = QuickMeal(desc.strip(), kcal, 1, ds)
+            for t in _terms(key):
+                insort(self.terms, (t, key))
+            self._trim()
+            return
+        m.count += 1
+        if ds >= m.last_date:
+            m.description, m.calories, m.last_date = desc.strip(), kcal, ds
+
+    def search(self, prefix: str, limit: int) -> list[QuickMeal]:
+        p = normalize(prefix)
+        if not p:
+            keys = self.meals.keys()
+        else:
+            keys = set()
+            i = bisect_left(self.terms, (p, ""))
+            while i < len(self.terms) and self.terms[i][0].startswith(p):
+                keys.add(self.terms[i][1])
+                i += 1
+        today = date.today()
+        return sorted((self.meals[k] for k in keys), key=lambda m: _score(m, today), reverse=True)[:limit]
+
+
+def _index(user_id: int) -> "_UserIndex":
+    with _lock:
+        idx = _users.get(user_id)
+        if idx is not None:
+            _users.move_to_end(user_id)
+            return idx
+    idx = _UserIndex(list_recent_meals(user_id, HISTORY_ROWS))  # lettura fuori dal lock
+    with _lock:
+        _users[user_id] = idx
+        _users.move_to_end(user_id)
+        while len(_users) > MAX_USERS:
+            _users.popitem(last=False)
+    return idx
+
+
+def _on_meals_changed(user_id: int, rows: list | None):
+    with _lock:
+        idx = _users.get(user_id)
+        if idx is None:
+            return  # utente non in memoria: lo leggerà dal DB alla prossima ricerca
+        if rows is None or len(rows) > BULK_RELOAD:
+            del _users[user_id]
+            return
+        for _u, ds, _t, desc, kcal, _raw in rows:
+            idx.add(desc, float(kcal), ds)
+
+
+on_meals_changed(_on_meals_changed)
+
+
+# ----------------------------
+# API
+# ----------------------------
+def suggest(user_id: int, prefix: str = "", limit: int = 8) -> list[QuickMeal]:
+    """Pasti passati che iniziano (anche da una parola interna) con prefix; vuoto = i più frequenti."""
+    idx = _index(user_id)
+    with _lock:
+        return idx.search(prefix, limit)
+
+
+def forget(user_id: int):
+    with _lock:
+        _users.pop(user_id, None)
@@ -0,0 +1,180 @@
+# services/resilience.py
+"""
+Retry consapevole del tipo di errore + circuit breaker condiviso per le
+chiamate al provider AI.
+
+- Errori definitivi (401/403/400/404/422, quota esaurita, key mancante): nessun retry.
+- 429: si aspetta quanto indicato da Retry-After (se sta nella scadenza).
+- 5xx, timeout, errori di rete: backoff esponenziale con jitter.
+
+Il breaker conta solo i guasti del provider (429/5xx/rete/timeout) e lo
+richiude solo una risposta valida; gli altri errori non lo toccano. Dopo
+BREAKER_FAILURES guasti consecutivi si apre e per BREAKER_RECOVERY_SECONDS i
+chiamanti vanno subito al fallback; poi una sola richiesta di prova
+(half-open) decide se richiuderlo o riaprirlo.
+"""
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+import openai
+
+from services.openai_client import ConfigError, DeadlineExceeded
+
+BREAKER_FAILURES = int(os.getenv("INFORMA_AI_BREAKER_FAILURES", "5"))
+BREAKER_RECOVERY_SECONDS = float(os.getenv("INFORMA_AI_BREAKER_RECOVERY", "30"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+CLOSED, OPEN, HALF_OPEN = "chiuso", "aperto", "semi-aperto"
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, retry_in: float):
+        super().__init__(f"Circuito aperto dopo errori ripetuti del provider: nuovo tentativo tra {retry_in:.0f}s.")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, recovery: float = BREAKER_RECOVERY_SECONDS):
+        self.name = name
+        self.failures = failures
+        self.recovery = recovery
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.recovery - time.monotonic())
+
+    def allow(self) -> bool:
+        """True se la richiesta può partire (in half-open: solo la prima, come prova)."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.recovery:
+                    return False
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive = 0
+            self._probe_in_flight = False
+
+    def release(self):
+        """Esito che non dice nulla sul provider (config, risposta illeggibile): libera solo la prova."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN or self._consecutive >= self.failures:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+
+openai_breaker = CircuitBreaker("openai")
+
+
+# ----------------------------
+# Classificazione errori
+# ----------------------------
+_FINAL = (
+    openai.AuthenticationError,
+    openai.PermissionDeniedError,
+    openai.BadRequestError,
+    openai.NotFoundError,
+    openai.UnprocessableEntityError,
+    openai.ConflictError,
+)
+_PROVIDER = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,  # include APITimeoutError
+    DeadlineExceeded,
+)
+
+
+def _retry_after(e: Exception) -> float | None:
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(e: Exception) -> tuple[bool, bool, float | None]:
+    """(si può ritentare, è un guasto del provider, attesa suggerita dal server)."""
+    if isinstance(e, openai.RateLimitError):
+        body = getattr(e, "body", None)
+        code = body.get("code") if isinstance(body, dict) else getattr(e, "code", None)
+        if code == "insufficient_quota":
+            return False, False, None  # quota esaurita: non passa riprovando
+        return True, True, _retry_after(e)
+    if isinstance(e, _FINAL) or isinstance(e, ConfigError):
+        return False, False, None
+    if isinstance(e, _PROVIDER):
+        return not isinstance(e, DeadlineExceeded), True, _retry_after(e)
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code >= 500, e.status_code >= 500, _retry_after(e)
+    # risposta non valida (JSON malformato, ecc.): un nuovo tentativo può bastare
+    return True, False, None
+
+
+def error_kind(e: Exception) -> str:
+    """Etichetta breve dell'errore (metriche e note di fallback)."""
+    if isinstance(e, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(e, DeadlineExceeded) or isinstance(e, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(e, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(e, openai.APIConnectionError):
+        return "connection"
+    if isinstance(e, openai.APIStatusError):
+        return "server_error" if e.status_code >= 500 else "client_error"
+    if isinstance(e, ConfigError):
+        return "config"
+    return "invalid_response"
+
+
+def backoff(attempt: int, base: float = BACKOFF_BASE) -> float:
+    """Full jitter: uniforme in [0, base * 2^attempt], con tetto."""
+    return random.uniform(0.0, min(BACKOFF_MAX, base * (2 ** attempt)))
@@ -0,0 +1,359 @@
+# services/workout_engine.py
+"""
+Stima locale delle calorie di un allenamento con una tabella MET
+(services/data/met_it.csv, valori del Compendium of Physical Activities).
+
+kcal = MET × peso_kg × ore: calorie lorde dell'attività, la stessa
+convenzione delle stime del modello (prompt in services/ai_service.py) e
+degli allenamenti già salvati, così i totali del giorno restano omogenei
+qualunque livello abbia risposto.
+
+- attività riconosciuta per n-grammi (vince il nome più lungo), con
+  modificatori di intensità ("leggera", "intensa", "ripetute", ...);
+- durata ("45 min", "1h30", "un'ora e mezza", "45'") e distanza ("5 km",
+  "1500 m"): senza durata la si ricava dalla velocità tipica dell'attività;
+  con entrambe, dove conta (corsa, camminata, bici) il MET segue la velocità;
+- più attività separate da "," "+" " e " " poi " vengono sommate.
+
+estimate_workout_local() ritorna None per il testo ambiguo (attività non
+riconosciuta, senza durata né distanza, parole sconosciute) o poco credibile
+(durata sotto il minuto, velocità fuori da SPEED_RANGE): lì decide il modello.
+score() e rescore() lavorano su array NumPy per ricalcolare lo storico in blocco.
+"""
+import csv
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from db.repo_daylogs import latest_morning_weight
+from profile import get_profile
+
+METS_CSV = Path(__file__).parent / "data" / "met_it.csv"
+DEFAULT_WEIGHT_KG = 70.0
+DEFAULT_MINUTES = 45
+GENERIC_MET = 5.0  # attività non riconosciuta (solo per workout_kcal)
+MIN_COVERAGE = 0.6
+MIN_MINUTES, MAX_MINUTES = 1, 600
+SPEED_RANGE = (0.25, 2.5)  # velocità credibile, in multipli di quella tipica dell'attività
+
+_NUMBER_WORDS = {
+    "un": 1, "uno": 1, "una": 1, "mezz": 0.5, "mezzo": 0.5, "mezza": 0.5, "due": 2, "tre": 3, "quattro": 4,
+    "cinque": 5, "sei": 6, "sette": 7, "otto": 8, "nove": 9, "dieci": 10, "venti": 20, "trenta": 30,
+    "quaranta": 40, "cinquanta": 50, "sessanta": 60, "novanta": 90,
+}
+_MINUTES = {"min": 1, "mins": 1, "minuto": 1, "minuti": 1, "sec": 1 / 60, "secondi": 1 / 60,
+            "quarto": 15, "quarti": 15}
+_HOURS = {"h", "ora", "ore", "oretta", "orette"}
+_KM = {"km": 1, "k": 1, "chilometro": 1, "chilometri": 1, "m": 0.001, "mt": 0.001, "metri": 0.001}
+
+_INTENSITY = {
+    "leggero": 0.8, "leggera": 0.8, "blando": 0.8, "blanda": 0.8, "tranquillo": 0.8, "tranquilla": 0.8,
+    "lento": 0.8, "lenta": 0.8, "facile": 0.8, "rilassato": 0.8, "rilassata": 0.8,
+    "moderato": 1.0, "moderata": 1.0, "medio": 1.0, "media": 1.0,
+    "intenso": 1.2, "intensa": 1.2, "sostenuto": 1.2, "sostenuta": 1.2, "veloce": 1.2, "forte": 1.2,
+    "duro": 1.2, "dura": 1.2, "ripetute": 1.15, "intervalli": 1.15, "massimale": 1.35, "molto": 1.1,
+}
+
+_STOPWORDS = {
+    "di", "d", "del", "della", "dello", "dei", "delle", "al", "alla", "allo", "ai", "alle", "a", "in", "con",
+    "il", "lo", "la", "i", "gli", "le", "per", "da", "su", "tra", "fra", "circa", "ho", "fatto", "fatta",
+    "oggi", "ieri", "stamattina", "stasera", "mattina", "sera", "pomeriggio", "totale", "tot",
+}
+# parole frequenti che non cambiano la stima: non contano come sconosciute
+_NEUTRAL = {
+    "allenamento", "sessione", "seduta", "lavoro", "esercizi", "esercizio", "serie", "ripetizioni", "rep",
+    "parco", "lungomare", "casa", "aperto", "aria", "outdoor", "indoor", "amici", "gara", "lezione",
+}
+
+_SPLIT = re.compile(r"[,;+\n]|\s(?:e|ed|poi|piu)\s")
+
+
+@dataclass(slots=True)
+class Activity:
+    name: str
+    met: float
+    speed_kmh: float    # velocità tipica: da distanza a durata (0 = non si applica)
+    met_per_kmh: float  # MET ≈ met_per_kmh × velocità se la velocità è nota (0 = MET fisso)
+
+
+@dataclass(slots=True)
+class WorkoutPart:
+    activity: Activity
+    intensity: float
+    met: float
+    minutes: float
+    km: float
+
+
+# ----------------------------
+# Tabella + tokenizer
+# ----------------------------
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"(\d)\s*['’]", r"\1 min ", text)                  # 45' -> 45 min
+    text = re.sub(r"(\d),(\d)", r"\1.\2", text)                       # 1,5 km -> 1.5 km
+    text = re.sub(r"(\d)([a-z])", r"\1 \2", text)                     # 5km -> 5 km
+    text = re.sub(r"([a-z])(\d)", r"\1 \2", text)                     # h30 -> h 30
+    text = re.sub(r"[^a-z0-9.\n,;+]+", " ", text)
+    return re.sub(r"\b(ora|ore|h) e (mezz[ao]|un quarto)\b", r"\1 \2", text)  # "un'ora e mezza": una sola voce
+
+
+def _stem(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token[-1] in "aeio" else token
+
+
+def _load(path: Path = METS_CSV) -> tuple[dict[tuple[str, ...], Activity], int]:
+    index: dict[tuple[str, ...], Activity] = {}
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            act = Activity(row["name"], float(row["met"]), float(row["speed_kmh"] or 0), float(row["met_per_kmh"] or 0))
+            for name in [row["name"], *filter(None, row["aliases"].split("|"))]:
+                key = tuple(_stem(t) for t in _normalize(name).split() if t not in _STOPWORDS)
+                if key:
+                    index.setdefault(key, act)
+    return index, max(len(k) for k in index)
+
+
+_INDEX, _MAX_NGRAM = _load()
+
+
+def _number(tok: str) -> float | None:
+    if tok in _NUMBER_WORDS:
+        return float(_NUMBER_WORDS[tok])
+    try:
+        return float(tok)
+    except ValueError:
+        return None
+
+
+# ----------------------------
+# Parsing
+# ----------------------------
+def _finish(part: WorkoutPart) -> WorkoutPart:
+    act = part.activity
+    if part.km > 0 and part.minutes <= 0 and act.speed_kmh > 0:
+        part.minutes = part.km / act.speed_kmh * 60.0
+    if part.km > 0 and part.minutes > 0 and act.met_per_kmh > 0:
+        speed = part.km / (part.minutes / 60.0)
+        part.met = min(20.0, max(2.0, act.met_per_kmh * speed))  # la velocità vale più degli aggettivi
+    else:
+        part.met = act.met * part.intensity
+    return part
+
+
+def _implausible(part: WorkoutPart) -> bool:
+    """Durata fuori scala o velocità impossibile ("corsa 5 km in 5 min")."""
+    if not MIN_MINUTES <= part.minutes <= MAX_MINUTES:
+        return True
+    typical = part.activity.speed_kmh
+    if part.km > 0 and typical > 0:
+        speed = part.km / (part.minutes / 60.0)
+        return not SPEED_RANGE[0] * typical <= speed <= SPEED_RANGE[1] * typical
+    return False
+
+
+def _parse_segment(tokens: list[str], parts: list[WorkoutPart]) -> tuple[int, int, bool]:
+    """Aggiunge a parts le attività del segmento; ritorna (parole note, sconosciute, ambiguo)."""
+    known = unknown = 0
+    current: WorkoutPart | None = None
+    minutes = km = 0.0
+    intensity = 1.0
+    pending: float | None = None
+    last_unit = ""
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        i += 1
+        n = _number(tok)
+        if n is not None:
+            if last_unit == "h" and pending is None and tok in ("mezza", "mezzo"):
+                minutes += 30  # "un'ora e mezza"
+            else:
+                pending = n if pending is None else pending * n
+            known += 1
+            continue
+        if tok in _HOURS:
+            if last_unit == "quarto" and pending is None:
+                continue  # "un quarto d'ora": già contato
+            minutes += (1.0 if pending is None else pending) * 60.0
+            pending, last_unit = None, "h"
+            known += 1
+            continue
+        if tok in _MINUTES:
+            minutes += (1.0 if pending is None else pending) * _MINUTES[tok]
+            pending, last_unit = None, ("quarto" if tok.startswith("quart") else "min")
+            known += 1
+            continue
+        if tok in _KM and pending is not None:
+            km += pending * _KM[tok]
+            pending, last_unit = None, "km"
+            known += 1
+            continue
+        if tok in _INTENSITY:
+            intensity *= _INTENSITY[tok]
+            known += 1
+            continue
+        if tok in _STOPWORDS or tok in _NEUTRAL:
+            continue
+
+        match, used, stems, j = None, 0, [], i - 1
+        while j < len(tokens) and len(stems) < _MAX_NGRAM:
+            if tokens[j] not in _STOPWORDS:
+                stems.append(_stem(tokens[j]))
+                act = _INDEX.get(tuple(stems))
+                if act is not None:
+                    match, used = act, j - (i - 1) + 1
+            elif not stems:
+                break
+            j += 1
+        if match is None:
+            unknown += 1
+            continue
+        if current is not None:
+            return known, unknown, True  # due attività nella stessa voce: non si sa come dividere la durata
+        known += sum(1 for t in tokens[i - 1:i - 1 + used] if t not in _STOPWORDS)
+        current = WorkoutPart(match, 1.0, match.met, 0.0, 0.0)
+        i += used - 1
+
+    if pending is not None:
+        # "1h30" -> 30 minuti dopo le ore; un numero senza unità altrimenti resta ambiguo
+        if last_unit == "h":
+            minutes += pending * 60.0 if pending < 1 else pending
+        elif minutes <= 0 and km <= 0:
+            unknown += 1
+
+    if current is None:
+        if minutes > 0 or km > 0:
+            if not parts:
+                return known, unknown, True
+            parts[-1].minutes += minutes  # "corsa 1 ora e 20 minuti": il resto della durata
+            parts[-1].km += km
+            return known, unknown, False
+        return known, unknown, bool(tokens and unknown)
+    current.intensity, current.minutes, current.km = intensity, minutes, km
+    parts.append(current)
+    return known, unknown, False
+
+
+@lru_cache(maxsize=4096)
+def _parse(text: str) -> tuple[tuple[WorkoutPart, ...], bool]:
+    """(attività, ambiguo). Le attività senza durata hanno minutes=0."""
+    parts: list[WorkoutPart] = []
+    known = unknown = 0
+    ambiguous = False
+    for segment in _SPLIT.split(f" {_normalize(text)} "):
+        k, u, amb = _parse_segment(segment.split(), parts)
+        known, unknown, ambiguous = known + k, unknown + u, ambiguous or amb
+    parts = [_finish(p) for p in parts]  # a fine testo: la durata può arrivare da una voce successiva
+    if not parts or any(_implausible(p) for p in parts):
+        ambiguous = True
+    if known + unknown and known / (known + unknown) < MIN_COVERAGE:
+        ambiguous = True
+    return tuple(parts), ambiguous
+
+
+def parse_workout(text: str) -> list[WorkoutPart] | None:
+    parts, ambiguous = _parse(text or "")
+    return None if ambiguous else list(parts)
+
+
+def guess_minutes(text: str) -> int:
+    """Durata letta dal testo (somma delle attività, almeno un minuto), altrimenti DEFAULT_MINUTES."""
+    total = sum(p.minutes for p in _parse(text or "")[0])
+    return max(MIN_MINUTES, int(round(total))) if total > 0 else DEFAULT_MINUTES
+
+
+def _met_of(text: str) -> float:
+    """MET medio (pesato sui minuti se noti) dell'attività nel testo; NaN se non riconosciuta."""
+    parts = _parse(text or "")[0]
+    if not parts:
+        return float("nan")
+    total = sum(p.minutes for p in parts)
+    if total > 0:
+        return sum(p.met * p.minutes for p in parts) / total
+    return sum(p.met for p in parts) / len(parts)
+
+
+def _minutes_of(text: str) -> float:
+    total = sum(p.minutes for p in _parse(text or "")[0])
+    return total if total > 0 else float("nan")
+
+
+# ----------------------------
+# Calcolo
+# ----------------------------
+def score(met, weight_kg, minutes) -> np.ndarray:
+    """kcal lorde (MET × kg × ore), elemento per elemento (broadcast NumPy)."""
+    met, weight_kg, minutes = np.broadcast_arrays(
+        np.asarray(met, dtype=float), np.asarray(weight_kg, dtype=float), np.asarray(minutes, dtype=float)
+    )
+    return np.maximum(met, 0.0) * weight_kg * minutes / 60.0
+
+
+def rescore(descriptions, minutes, weight_kg) -> np.ndarray:
+    """
+    Ricalcola in blocco allenamenti salvati: descrizioni, durate (0/NaN = lette
+    dal testo) e pesi (scalare o array). NaN dove l'attività non è riconosciuta.
+    Il testo di ogni descrizione distinta si analizza una volta sola.
+    """
+    descriptions = list(descriptions)
+    n = len(descriptions)
+    met = np.fromiter((_met_of(d) for d in descriptions), dtype=float, count=n)
+    mins = np.asarray(minutes, dtype=float)
+    mins = np.broadcast_to(mins, (n,)) if mins.ndim == 0 else mins
+    missing = ~(mins > 0)
+    if missing.any():
+        parsed = np.fromiter((_minutes_of(d) if m else np.nan for d, m in zip(descriptions, missing)),
+                             dtype=float, count=n)
+        mins = np.where(missing, parsed, mins)
+    return score(met, weight_kg, mins)
+
+
+def workout_kcal(text: str, duration_min: float, weight_kg: float | None) -> float:
+    """Stima sempre disponibile (fallback): MET dal testo o GENERIC_MET, peso o DEFAULT_WEIGHT_KG."""
+    met = _met_of(text)
+    if np.isnan(met):
+        met = GENERIC_MET
+    return float(score(met, weight_kg or DEFAULT_WEIGHT_KG, max(float(duration_min or 0), 0.0)))
+
+
+def estimate_workout_local(text: str, weight_kg: float | None) -> dict | None:
+    """{calories_burned, duration_min, notes, items, source} oppure None se il testo è ambiguo."""
+    parts = parse_workout(text)
+    if parts is None:
+        return None
+    w = float(weight_kg or DEFAULT_WEIGHT_KG)
+    kcal = score([p.met for p in parts], w, [p.minutes for p in parts])
+    items = [
+        {"activity": p.activity.name, "met": round(p.met, 1), "minutes": round(p.minutes),
+         "km": round(p.km, 2), "kcal": round(float(k))}
+        for p, k in zip(parts, kcal)
+    ]
+    detail = " + ".join(
+        f"{it['activity']} {it['minutes']} min" + (f" / {it['km']:g} km" if it["km"] else "")
+        + f" (MET {it['met']:g}, {it['kcal']} kcal)"
+        for it in items
+    )
+    weight_note = f"peso {w:g} kg" if weight_kg else f"peso non noto, assunti {w:g} kg"
+    return {
+        "calories_burned": round(float(kcal.sum()), 1),
+        "duration_min": int(round(sum(p.minutes for p in parts))),
+        "notes": f"Stima locale (tabella MET, {weight_note}): {detail}.",
+        "items": items,
+        "source": "local",
+    }
+
+
+def user_weight(user_id: int, d: date) -> float | None:
+    """Ultimo peso del mattino fino a d, altrimenti il peso iniziale del profilo."""
+    w = latest_morning_weight(user_id, d)
+    if w:
+        return w
+    prof = get_profile(user_id) or {}
+    return float(prof.get("start_weight") or 0) or None
@@ -0,0 +1,15 @@
+# tests/conftest.py
+"""
+Test con pytest dalla radice del repo: `python -m pytest tests`.
+Il DB è sempre un file temporaneo (INFORMA_DB_PATH impostato prima che
+`database` venga importato): informa.db non viene mai toccato.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ["INFORMA_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="informa-test-"), "test.db")
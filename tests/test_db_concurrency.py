@@ -0,0 +1,206 @@
+# tests/test_db_concurrency.py
+"""
+Letture per thread e scrittore unico (SQLite, WAL): i lettori non aspettano
+lo scrittore, la lettura scala coi thread, un job che fallisce annulla solo
+il suo SAVEPOINT, un job che rompe la transazione fa fallire il batch intero.
+"""
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import database
+
+pytestmark = pytest.mark.skipif(database.engine().dialect != "sqlite", reason="scrittore a thread unico solo su SQLite")
+
+N_ROWS = 200_000
+
+
+@pytest.fixture(scope="module", autouse=True)
+def tables():
+    def _create(c):
+        c.execute("DROP TABLE IF EXISTS t_read")
+        c.execute("DROP TABLE IF EXISTS t_write")
+        c.execute("CREATE TABLE t_read (id INTEGER PRIMARY KEY, v INTEGER)")
+        c.execute("CREATE TABLE t_write (id INTEGER PRIMARY KEY, tag TEXT)")
+        c.execute(
+            """
+            WITH RECURSIVE s(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM s WHERE i < ?)
+            INSERT INTO t_read (v) SELECT i FROM s
+            """,
+            (N_ROWS,)
+        )
+
+    database.write(_create)
+    yield
+    database.write(lambda c: (c.execute("DROP TABLE t_read"), c.execute("DROP TABLE t_write")))
+
+
+def _submit(fn):
+    """Job diretto allo scrittore, senza attendere: serve per riempire un batch."""
+    return database.engine()._writer.submit(fn)
+
+
+def _tags() -> set[str]:
+    return {r["tag"] for r in database.get_conn().execute("SELECT tag FROM t_write")}
+
+
+def _read_once() -> int:
+    return database.get_conn().execute("SELECT SUM(v % 7) FROM t_read").fetchone()[0]
+
+
+def _hold_writer():
+    """Blocca lo scrittore dentro una transazione aperta finché non si chiama release()."""
+    started, release = threading.Event(), threading.Event()
+
+    def _blocking(c):
+        c.execute("INSERT INTO t_write (tag) VALUES ('held')")
+        started.set()
+        release.wait(10)
+
+    fut = _submit(_blocking)
+    assert started.wait(5)
+    return fut, release
+
+
+def _throughput(threads: int, seconds: float) -> float:
+    deadline = time.perf_counter() + seconds
+    counts = [0] * threads
+
+    def _reader(k: int):
+        while time.perf_counter() < deadline:
+            _read_once()
+            counts[k] += 1
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(_reader, range(threads)))
+    return sum(counts) / seconds
+
+
+def test_each_thread_has_its_own_read_connection():
+    barrier = threading.Barrier(4)
+
+    def _conn(_):
+        barrier.wait(5)  # quattro thread diversi, non uno riusato dal pool
+        return database.get_conn()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        conns = list(pool.map(_conn, range(4)))
+    assert len({id(c) for c in conns}) == 4
+    assert database.get_conn() is database.get_conn()
+
+
+def test_readers_do_not_wait_for_an_open_write():
+    fut, release = _hold_writer()
+    try:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            sums = list(pool.map(lambda _: _read_once(), range(32)))
+        assert time.perf_counter() - t0 < 5
+        assert len(set(sums)) == 1
+        assert "held" not in _tags()  # niente letture sporche
+    finally:
+        release.set()
+    fut.result(5)
+    assert "held" in _tags()
+
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 2, reason="serve più di un core")
+def test_read_throughput_scales_with_threads():
+    stop = threading.Event()
+
+    def _writer_load():
+        # lo scrittore resta occupato per tutta la misura
+        i = 0
+        while not stop.is_set():
+            database.write(lambda c, i=i: c.execute("INSERT INTO t_write (tag) VALUES (?)", (f"load{i}",)))
+            i += 1
+
+    load = threading.Thread(target=_writer_load, daemon=True)
+    load.start()
+    try:
+        _throughput(1, 0.3)  # riscaldamento: connessioni e cache delle pagine
+        single = _throughput(1, 1.5)
+        multi = _throughput(4, 1.5)
+    finally:
+        stop.set()
+        load.join(5)
+    assert multi >= 1.5 * single, f"1 thread: {single:.1f} q/s, 4 thread: {multi:.1f} q/s"
+
+
+def test_failing_job_rolls_back_only_its_savepoint():
+    hold, release = _hold_writer()
+
+    def _fails(c):
+        c.execute("INSERT INTO t_write (tag) VALUES ('bad')")
+        raise ValueError("job non valido")
+
+    # accodati mentre lo scrittore è occupato: finiscono nello stesso batch
+    ok1 = _submit(lambda c: c.execute("INSERT INTO t_write (tag) VALUES ('ok1')").lastrowid)
+    bad = _submit(_fails)
+    ok2 = _submit(lambda c: c.execute("INSERT INTO t_write (tag) VALUES ('ok2')").lastrowid)
+    release.set()
+    hold.result(5)
+
+    assert ok1.result(5) and ok2.result(5)
+    with pytest.raises(ValueError):
+        bad.result(5)
+    tags = _tags()
+    assert {"ok1", "ok2"} <= tags
+    assert "bad" not in tags
+
+
+def test_job_that_breaks_the_transaction_fails_the_whole_batch():
+    hold, release = _hold_writer()
+
+    def _breaks(c):
+        c.execute("INSERT INTO t_write (tag) VALUES ('breaker')")
+        c.execute("ROLLBACK")  # chiude la transazione del batch: il SAVEPOINT non esiste più
+
+    before = _submit(lambda c: c.execute("INSERT INTO t_write (tag) VALUES ('same_batch_1')"))
+    breaker = _submit(_breaks)
+    after = _submit(lambda c: c.execute("INSERT INTO t_write (tag) VALUES ('same_batch_2')"))
+    release.set()
+    hold.result(5)
+
+    for fut in (before, breaker, after):
+        with pytest.raises(sqlite3.OperationalError):
+            fut.result(5)
+    assert not {"breaker", "same_batch_1", "same_batch_2"} & _tags()
+
+    # lo scrittore resta utilizzabile dopo il batch fallito
+    database.write(lambda c: c.execute("INSERT INTO t_write (tag) VALUES ('recovered')"))
+    assert "recovered" in _tags()
+
+
+def test_writer_survives_a_job_that_closes_its_connection():
+    hold, release = _hold_writer()
+    # stesso batch: dopo close() falliscono anche ROLLBACK TO e ROLLBACK, errore fuori dai job
+    closer = _submit(lambda c: c.close())
+    peer = _submit(lambda c: c.execute("INSERT INTO t_write (tag) VALUES ('closed_batch')"))
+    release.set()
+    hold.result(5)
+    for fut in (closer, peer):
+        with pytest.raises(sqlite3.ProgrammingError):
+            fut.result(5)  # risolti, non appesi
+
+    # connessione riaperta: una scrittura successiva termina
+    done = _submit(lambda c: c.execute("INSERT INTO t_write (tag) VALUES ('reopened')").lastrowid)
+    assert done.result(5)
+    assert "reopened" in _tags()
+
+
+def test_cancelled_job_is_skipped_and_the_batch_commits():
+    hold, release = _hold_writer()
+    cancelled = _submit(lambda c: c.execute("INSERT INTO t_write (tag) VALUES ('cancelled')"))
+    ok = _submit(lambda c: c.execute("INSERT INTO t_write (tag) VALUES ('after_cancel')").lastrowid)
+    assert cancelled.cancel()
+    release.set()
+    hold.result(5)
+
+    assert ok.result(5)
+    tags = _tags()
+    assert "after_cancel" in tags and "cancelled" not in tags
@@ -0,0 +1,50 @@
+# tests/test_food_db.py
+import pytest
+
+from services.food_db import estimate_meal_local
+
+
+def _kcal(text: str) -> float | None:
+    out = estimate_meal_local(text)
+    return None if out is None else out["total_calories"]
+
+
+@pytest.mark.parametrize("text, without", [
+    ("caffè senza zucchero", "caffè"),
+    ("yogurt senza zucchero", "yogurt"),
+    ("caffè, no zucchero", "caffè"),
+    ("latte e niente zucchero", "latte"),
+    ("200g pasta senza parmigiano", "200g pasta"),
+])
+def test_negation_drops_the_next_food(text, without):
+    assert _kcal(text) == _kcal(without)
+
+
+def test_without_negation_the_food_counts():
+    assert _kcal("caffè con zucchero") > _kcal("caffè")
+
+
+@pytest.mark.parametrize("text", ["pasta senza glutine", "senza zucchero"])
+def test_unknown_or_empty_after_negation_goes_to_the_model(text):
+    assert estimate_meal_local(text) is None
+
+
+def test_quantities():
+    assert _kcal("200g pasta") == pytest.approx(2 * _kcal("100 g pasta"))
+    assert _kcal("pasta 100 g") == _kcal("100 g pasta")
+
+
+@pytest.mark.parametrize("text", ["gelato al cioccolato", "torta al cioccolato", "burro di arachidi"])
+def test_linked_foods_are_one_dish_for_the_model(text):
+    assert estimate_meal_local(text) is None
+
+
+def test_dish_in_the_table_keeps_its_own_name():
+    out = estimate_meal_local("pasta al pomodoro")
+    assert [r["food"] for r in out["items"]] == ["pasta al pomodoro"]
+    assert _kcal("200 g di pasta") == _kcal("200g pasta")
+
+
+@pytest.mark.parametrize("text", ["0 pasta", "pasta 0 g", "0 g di pasta"])
+def test_zero_quantity_goes_to_the_model(text):
+    assert estimate_meal_local(text) is None
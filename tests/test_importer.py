@@ -0,0 +1,43 @@
+# tests/test_importer.py
+import io
+import uuid
+from datetime import date
+
+import pytest
+
+import auth_utils
+from db.repo_meals import list_meals
+from db.repo_summaries import get_summary
+from services import importer
+from services.importer import import_file
+
+CSV = """data;ora;descrizione;kcal
+2026-03-02;08:00;yogurt;120
+2026-03-02;13:00;pasta;500
+2026-03-03;13:00;pasta;500
+"""
+
+
+@pytest.fixture
+def user_id() -> int:
+    return auth_utils.create_user(f"import-{uuid.uuid4().hex[:8]}@example.com", "password-test")
+
+
+def test_same_file_twice_does_not_duplicate(user_id):
+    first = import_file(user_id, io.StringIO(CSV), "csv", "meals")
+    assert (first["imported"], first["duplicates"], first["days"]) == (3, 0, 2)
+
+    again = import_file(user_id, io.StringIO(CSV), "csv", "meals")
+    assert (again["imported"], again["duplicates"], again["days"]) == (0, 3, 0)
+    assert len(list_meals(user_id, "2026-03-02")) == 2
+    assert get_summary(user_id, date(2026, 3, 2)).calories_in == pytest.approx(620.0)
+
+
+def test_only_new_rows_are_added_across_chunks(user_id, monkeypatch):
+    monkeypatch.setattr(importer, "CHUNK_SIZE", 1)
+    import_file(user_id, io.StringIO(CSV), "csv", "meals")
+
+    more = CSV + "2026-03-02;20:00;pizza;800\n"
+    stats = import_file(user_id, io.StringIO(more), "csv", "meals")
+    assert (stats["imported"], stats["duplicates"]) == (1, 3)
+    assert [m.description for m in list_meals(user_id, "2026-03-02")] == ["yogurt", "pasta", "pizza"]
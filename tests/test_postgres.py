@@ -0,0 +1,81 @@
+# tests/test_postgres.py
+"""
+Stessa API dei repository sul motore PostgreSQL. Gira solo con un Postgres
+locale indicato da INFORMA_DB_URL (i dati di prova vengono eliminati alla fine):
+
+    INFORMA_DB_URL=postgresql://localhost/informa_test python -m pytest tests/test_postgres.py
+"""
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+if not os.getenv("INFORMA_DB_URL"):
+    pytest.skip("INFORMA_DB_URL non impostato: niente Postgres locale", allow_module_level=True)
+
+import auth_utils
+import database
+from db.migrations import MIGRATIONS
+from db.repo_daylogs import get_day_log, upsert_day_log
+from db.repo_meals import delete_meal, insert_meal, insert_meals, list_meals
+from db.repo_summaries import get_summary
+from db.repo_weekly_plan import get_week_plan, save_plan
+from db.repo_workouts import insert_workout, list_workouts
+from profile import _PROFILE_COLUMNS, get_profile
+
+DAY = date(2026, 3, 2)
+
+
+@pytest.fixture(scope="module")
+def user_id():
+    assert database.engine().dialect == "postgres"
+    uid = auth_utils.create_user(f"pg-{uuid.uuid4().hex[:8]}@example.com", "password-test")
+    yield uid
+    database.execute_write("DELETE FROM users WHERE id=?", (uid,))  # ON DELETE CASCADE sul resto
+
+
+def test_schema_is_at_the_last_migration():
+    row = database.get_conn().execute("SELECT MAX(version) AS v FROM schema_version").fetchone()
+    assert row["v"] == MIGRATIONS[-1][0]
+
+
+def test_inserts_return_ids_and_keep_summaries(user_id):
+    meal_id = insert_meal(user_id, str(DAY), "13:00", "pasta", 500.0, None)
+    insert_meals([(user_id, str(DAY), "20:00", "pizza", 800.0, None)])
+    insert_workout(user_id, str(DAY), "19:00", "corsa", 30, 300.0, None)
+
+    assert [m.description for m in list_meals(user_id, str(DAY))] == ["pasta", "pizza"]
+    assert [w.description for w in list_workouts(user_id, str(DAY))] == ["corsa"]
+    s = get_summary(user_id, DAY)
+    assert s.calories_in == pytest.approx(1300.0)
+    assert s.workout_calories == pytest.approx(300.0)
+
+    delete_meal(user_id, meal_id)
+    assert get_summary(user_id, DAY).calories_in == pytest.approx(800.0)
+
+
+def test_upserts_update_in_place(user_id):
+    upsert_day_log(user_id, DAY, morning_weight=80.0)
+    upsert_day_log(user_id, DAY, is_closed=True)
+    log = get_day_log(user_id, DAY)
+    assert log.morning_weight == pytest.approx(80.0) and log.is_closed
+
+    sql = database.upsert_sql("user_profile", _PROFILE_COLUMNS, ["user_id"])
+    row = [user_id, 80.0, 178.0, "M", 30, "leggero", "mantenimento", None, None, None, None, "2026-03-01T00:00:00"]
+    database.execute_write(sql, tuple(row))
+    row[2] = 180.0
+    database.execute_write(sql, tuple(row))
+    assert get_profile(user_id)["height_cm"] == pytest.approx(180.0)
+
+    save_plan(user_id, 2026, 10, "h1", 1, "piano 1", keep=5)
+    save_plan(user_id, 2026, 10, "h2", 1, "piano 2", keep=5)
+    plan = get_week_plan(user_id, 2026, 10)
+    assert (plan.content, plan.input_hash) == ("piano 2", "h2")
+
+
+def test_pooled_reads_from_many_threads(user_id):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        counts = list(pool.map(lambda _: len(list_meals(user_id, str(DAY))), range(64)))
+    assert set(counts) == {len(list_meals(user_id, str(DAY)))}
@@ -0,0 +1,91 @@
+# tests/test_query_plans.py
+"""
+Le query per (utente, giorno) dei repository devono usare gli indici
+idx_*_user_date della migrazione 2: niente SCAN della tabella, niente
+ordinamento temporaneo, e indice coprente per somme e conteggi.
+Le query sono catturate dalle funzioni vere (trace di sqlite3), così una
+modifica ai repository che perde l'indice fa fallire il test.
+"""
+import uuid
+from datetime import date
+
+import pytest
+
+import auth_utils
+import database
+from db.repo_calendar import load_day_previews
+from db.repo_meals import insert_meal, list_meals
+from db.repo_planned import add_planned, list_planned
+from db.repo_summaries import rebuild_day
+from db.repo_workouts import insert_workout, list_workouts
+
+pytestmark = pytest.mark.skipif(database.engine().dialect != "sqlite", reason="EXPLAIN QUERY PLAN di SQLite")
+
+DAY = date(2026, 3, 2)
+
+
+@pytest.fixture(scope="module")
+def user_id() -> int:
+    uid = auth_utils.create_user(f"plans-{uuid.uuid4().hex[:8]}@example.com", "password-test")
+    insert_meal(uid, str(DAY), "13:00", "pasta", 500.0, None)
+    insert_workout(uid, str(DAY), "19:00", "corsa", 30, 300.0, None)
+    add_planned(uid, str(DAY), "20:00", "meal", "Cena (piano)", 600.0, None, None)
+    return uid
+
+
+def _traced(conn, run) -> list[str]:
+    """SELECT eseguite da run() su conn, con i parametri già sostituiti."""
+    seen: list[str] = []
+    conn.set_trace_callback(seen.append)
+    try:
+        run()
+    finally:
+        conn.set_trace_callback(None)
+    return [s for s in seen if s.lstrip().upper().startswith("SELECT")]
+
+
+def _plan(sql: str) -> str:
+    rows = database.get_conn().execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+    return " | ".join(r["detail"] for r in rows)
+
+
+def _only(queries: list[str], table: str) -> str:
+    hits = [q for q in queries if f"FROM {table}" in q]
+    assert len(hits) == 1, queries
+    return hits[0]
+
+
+@pytest.mark.parametrize("fn, table, index", [
+    (list_meals, "meals", "idx_meals_user_date"),
+    (list_workouts, "workouts", "idx_workouts_user_date"),
+    (list_planned, "planned_events", "idx_planned_user_date"),
+])
+def test_day_lists_use_the_user_date_index(user_id, fn, table, index):
+    sql = _only(_traced(database.get_conn(), lambda: fn(user_id, str(DAY))), table)
+    plan = _plan(sql)
+    assert f"USING INDEX {index}" in plan or f"USING COVERING INDEX {index}" in plan, plan
+    assert "SCAN" not in plan, plan
+    assert "TEMP B-TREE" not in plan, plan  # ORDER BY time servito dall'indice
+
+
+def test_daily_sums_use_covering_indexes(user_id):
+    queries: list[str] = []
+
+    def _rebuild(c):
+        queries.extend(_traced(c, lambda: rebuild_day(c, user_id, str(DAY), rollups=False)))
+
+    database.write(_rebuild)
+    sums = [q for q in queries if "SUM(" in q.upper()]
+    assert len(sums) == 2, queries
+    for table, index in [("meals", "idx_meals_user_date"), ("workouts", "idx_workouts_user_date")]:
+        plan = _plan(_only(sums, table))
+        assert f"USING COVERING INDEX {index}" in plan, plan
+        assert "SCAN" not in plan, plan
+
+
+def test_calendar_planned_count_uses_covering_index(user_id):
+    queries = _traced(database.get_conn(), lambda: load_day_previews(user_id, DAY.replace(day=1), DAY.replace(day=31)))
+    plan = _plan(_only(queries, "planned_events"))
+    assert "USING COVERING INDEX idx_planned_user_date" in plan, plan
+    assert "SCAN" not in plan, plan
+    assert "TEMP B-TREE" not in plan, plan  # GROUP BY date nell'ordine dell'indice
@@ -0,0 +1,60 @@
+# tests/test_resilience.py
+"""Il breaker si muove solo per le risposte del provider: config e JSON illeggibile non lo toccano."""
+import json
+
+import httpx
+import openai
+import pytest
+
+from services import ai_service
+from services.openai_client import ConfigError
+from services.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, classify, error_kind
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    b = CircuitBreaker("test", failures=1, recovery=0.0)
+    monkeypatch.setattr(ai_service, "openai_breaker", b)
+    monkeypatch.setattr(ai_service, "backoff", lambda attempt: 0.0)
+    return b
+
+
+def _raise(e: Exception):
+    def fn():
+        raise e
+    return fn
+
+
+def _server_error() -> openai.InternalServerError:
+    req = httpx.Request("POST", "https://api.example/v1/chat/completions")
+    return openai.InternalServerError("boom", response=httpx.Response(500, request=req), body=None)
+
+
+def test_config_error_is_final_and_labelled():
+    assert classify(ConfigError("key")) == (False, False, None)
+    assert error_kind(ConfigError("key")) == "config"
+    assert error_kind(RuntimeError("bug nostro")) != "config"
+    assert classify(RuntimeError("bug nostro"))[0]  # non definitivo: si può ritentare
+
+
+def test_config_error_does_not_close_an_open_circuit(breaker):
+    with pytest.raises(openai.InternalServerError):
+        ai_service._retry(_raise(_server_error()), tries=1)
+    assert breaker.state == OPEN
+
+    with pytest.raises(ConfigError):
+        ai_service._retry(_raise(ConfigError("OPENAI_API_KEY mancante")), tries=1)
+    assert breaker.state == HALF_OPEN  # la prova non ha detto nulla sul provider
+    assert breaker.allow()  # e la prossima richiesta può fare da prova
+
+
+def test_unparseable_probe_does_not_close_the_circuit(breaker):
+    with pytest.raises(openai.InternalServerError):
+        ai_service._retry(_raise(_server_error()), tries=1)
+
+    with pytest.raises(json.JSONDecodeError):
+        ai_service._retry(lambda: json.loads("{non json"), tries=2)
+    assert breaker.state != CLOSED
+
+    assert ai_service._retry(lambda: "ok", tries=1) == "ok"
+    assert breaker.state == CLOSED
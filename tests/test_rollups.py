@@ -0,0 +1,48 @@
+# tests/test_rollups.py
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+import auth_utils
+from db.repo_daylogs import upsert_day_log
+from db.repo_meals import insert_meal
+from db.repo_rollups import range_totals, week_series
+from db.repo_workouts import insert_workout
+
+START = date(2026, 3, 2)  # lunedì
+DAYS = 21
+
+
+@pytest.fixture(scope="module")
+def user_id() -> int:
+    uid = auth_utils.create_user(f"rollups-{uuid.uuid4().hex[:8]}@example.com", "password-test")
+    for i in range(DAYS):
+        d = START + timedelta(days=i)
+        insert_meal(uid, str(d), "13:00", "pasta", 100.0, None)
+        insert_workout(uid, str(d), "19:00", "corsa", 30, 10.0, None)
+        upsert_day_log(uid, d, morning_weight=80.0, is_closed=True)
+    return uid
+
+
+def test_edge_weeks_are_clipped_to_the_range(user_id):
+    d0, d1 = START + timedelta(days=2), START + timedelta(days=16)  # mer 1a settimana .. mer 3a
+    rows = week_series(user_id, d0, d1)
+
+    assert [(r["start_date"], r["end_date"], r["partial"]) for r in rows] == [
+        (str(d0), str(START + timedelta(days=6)), True),
+        (str(START + timedelta(days=7)), str(START + timedelta(days=13)), False),
+        (str(START + timedelta(days=14)), str(d1), True),
+    ]
+    assert [r["closed_days"] for r in rows] == [5, 7, 3]
+    assert [r["in_sum"] for r in rows] == pytest.approx([500.0, 700.0, 300.0])
+    assert sum(r["in_sum"] for r in rows) == pytest.approx(range_totals(user_id, d0, d1)["in_sum"])
+
+
+def test_weekly_rows_keep_rest_and_workout_sums(user_id):
+    rows = week_series(user_id, START, START + timedelta(days=DAYS - 1))
+    assert all(not r["partial"] for r in rows)
+    for r in rows:
+        assert r["workout_sum"] == pytest.approx(70.0)
+        assert r["rest_sum"] is not None  # utente senza profilo: riposo 0, ma la colonna c'è
+        assert r["out_sum"] == pytest.approx(r["rest_sum"] + r["workout_sum"])
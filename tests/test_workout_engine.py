@@ -0,0 +1,57 @@
+# tests/test_workout_engine.py
+import numpy as np
+import pytest
+
+from services.workout_engine import (
+    DEFAULT_MINUTES, estimate_workout_local, guess_minutes, parse_workout, rescore, score, workout_kcal,
+)
+
+
+@pytest.mark.parametrize("text, minutes", [
+    ("corsa 45 min", 45),
+    ("corsa 1h30", 90),
+    ("un'ora e mezza di camminata veloce", 90),
+    ("nuoto 45'", 45),
+    ("corsa 5 km", 30),  # velocità tipica 10 km/h
+])
+def test_duration_is_read_from_the_text(text, minutes):
+    parts = parse_workout(text)
+    assert parts is not None
+    assert sum(p.minutes for p in parts) == pytest.approx(minutes)
+
+
+def test_speed_sets_the_met_for_running():
+    (part,) = parse_workout("corsa 5 km in 25 min")
+    assert part.met == pytest.approx(12.0)  # 12 km/h × 1 MET per km/h
+
+
+@pytest.mark.parametrize("text", [
+    "corsa 5 km in 5 min",       # 60 km/h
+    "camminata 30 km in 1 ora",
+    "corsa 1 km in 3 ore",
+    "corsa 20 secondi",          # sotto il minuto
+    "corsa 12 ore",
+    "corsa",                     # senza durata né distanza
+    "sport inventato",
+])
+def test_ambiguous_or_implausible_text_goes_to_the_model(text):
+    assert parse_workout(text) is None
+    assert estimate_workout_local(text, 70) is None
+
+
+def test_kcal_are_gross_met_times_kg_times_hours():
+    assert float(score(8.0, 70.0, 30)) == pytest.approx(8.0 * 70.0 * 0.5)
+    out = estimate_workout_local("corsa 5 km in 25 min", 70)
+    assert out["calories_burned"] == pytest.approx(12.0 * 70.0 * 25 / 60, abs=0.1)
+    assert out["duration_min"] == 25
+
+
+def test_fallback_and_rescore_use_the_same_formula():
+    assert workout_kcal("nuoto", 60, 80) == pytest.approx(7.0 * 80.0)
+    assert np.isnan(rescore(["sport inventato"], [30], 70))[0]
+    assert rescore(["nuoto", "nuoto 30 min"], [60, 0], 80) == pytest.approx([7.0 * 80, 7.0 * 40])
+
+
+def test_guess_minutes_is_never_zero():
+    assert guess_minutes("corsa 20 secondi") == 1
+    assert guess_minutes("yoga") == DEFAULT_MINUTES
@@ -0,0 +1,198 @@
+# tools/bench_ai.py
+"""
+Benchmark del percorso AI: latenza end-to-end (p50/p95/p99) e throughput di
+ogni funzione di ai.py a concorrenza crescente, contro tools/fake_openai.py
+(avviato nello stesso processo) oppure un server indicato con --base-url.
+
+Gli input sono unici per chiamata e scelti per non essere coperti dalle stime
+locali (tabella alimenti, MET) né dalla cache: si misura sempre la strada
+verso il modello, con retry, breaker, scadenza e fallback veri. Il DB è
+temporaneo (cache e job non toccano informa.db) salvo --db.
+
+Uso:
+    python -m tools.bench_ai --concurrency 1,4,16 --requests 40 --rate-429 0.05
+    python -m tools.bench_ai --only meal_text,meal_photo --latency uniform:0.2,1.5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable
+
+from tools.fake_openai import FakeOpenAI, add_arguments, config_from_args
+
+ENTRY_POINTS = ("meal_text", "meal_photo", "meals_batch", "workout_text", "workouts_batch",
+                "weekly_plan", "weekly_plan_stream")
+
+
+def _configure_env(args) -> FakeOpenAI | None:
+    """Variabili lette all'import dei moduli dell'app: vanno impostate prima di importare ai."""
+    fake = None
+    if not args.base_url:
+        fake = FakeOpenAI(config_from_args(args)).start()
+    os.environ["OPENAI_BASE_URL"] = args.base_url or fake.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ["INFORMA_DB_PATH"] = args.db or os.path.join(tempfile.mkdtemp(prefix="informa-bench-"), "bench.db")
+    os.environ["INFORMA_OPENAI_POOL_SIZE"] = str(max(int(os.getenv("INFORMA_OPENAI_POOL_SIZE", "20")),
+                                                     max(args.concurrency)))
+    return fake
+
+
+def _photos(n: int) -> list[bytes]:
+    """Foto di rumore casuale (dHash diversi: nessun riuso dalla cache percettiva)."""
+    from PIL import Image
+
+    out = []
+    for _ in range(n):
+        buf = BytesIO()
+        Image.frombytes("RGB", (1600, 1200), os.urandom(1600 * 1200 * 3)).save(buf, "JPEG", quality=90)
+        out.append(buf.getvalue())
+    return out
+
+
+def _calls(photos: list[bytes]) -> dict[str, Callable[[int], bool]]:
+    """Per ogni entry point: fn(i) -> True se ha risposto il modello, False se è scattato il fallback."""
+    import ai
+
+    def nonce() -> str:
+        return uuid.uuid4().hex[:8]
+
+    def meal_text(i: int) -> bool:
+        out = ai.estimate_meal_from_text(f"specialità della nonna variante {nonce()} con salsa segreta")
+        return not out["notes"].startswith("Fallback")
+
+    def meal_photo(i: int) -> bool:
+        out = ai.analyze_food_photo(photos[i % len(photos)], "image/jpeg", "13:00", f"bench {nonce()}")
+        return not out["notes"].startswith("Fallback")
+
+    def meals_batch(i: int) -> bool:
+        text = "\n".join(f"{h}:00 piatto misterioso {nonce()}" for h in (8, 13, 17, 20))
+        items = ai.estimate_meals_batch(text)
+        return not any(it["notes"].startswith("Fallback") for it in items)
+
+    def workout_text(i: int) -> bool:
+        out = ai.estimate_workout_from_text(f"allenamento misterioso {nonce()} con bilanciere", 75.0, 178.0)
+        return not out["notes"].startswith("Fallback")
+
+    def workouts_batch(i: int) -> bool:
+        text = f"07:00 sessione misteriosa {nonce()}\n18:30 circuito strano {nonce()} con kettlebell"
+        items = ai.estimate_workouts_batch(text, 75.0, 178.0)
+        return not any(it["notes"].startswith("Fallback") for it in items)
+
+    def weekly_plan(i: int) -> bool:
+        return not ai.generate_weekly_plan(f"Piano settimanale di prova {nonce()}").startswith("Non riesco")
+
+    def weekly_plan_stream(i: int) -> bool:
+        stream = ai.WeeklyPlanStream(f"Piano settimanale di prova {nonce()}")
+        for _ in stream:
+            pass
+        return not stream.failed
+
+    return {
+        "meal_text": meal_text, "meal_photo": meal_photo, "meals_batch": meals_batch,
+        "workout_text": workout_text, "workouts_batch": workouts_batch,
+        "weekly_plan": weekly_plan, "weekly_plan_stream": weekly_plan_stream,
+    }
+
+
+def _percentile(sorted_ms: list[float], p: float) -> float:
+    if not sorted_ms:
+        return float("nan")
+    k = min(len(sorted_ms) - 1, max(0, round(p / 100.0 * len(sorted_ms) + 0.5) - 1))  # nearest-rank
+    return sorted_ms[k]
+
+
+def run_level(fn: Callable[[int], bool], concurrency: int, requests: int) -> dict:
+    latencies: list[float] = []
+    ok = fallback = errors = 0
+
+    def one(i: int):
+        t0 = time.perf_counter()
+        try:
+            good = fn(i)
+            err = False
+        except Exception:
+            good, err = False, True
+        return (time.perf_counter() - t0) * 1000.0, good, err
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for ms, good, err in pool.map(one, range(requests)):
+            latencies.append(ms)
+            if err:
+                errors += 1
+            elif good:
+                ok += 1
+            else:
+                fallback += 1
+    wall = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency, "requests": requests, "ok": ok, "fallback": fallback, "errors": errors,
+        "p50_ms": _percentile(latencies, 50), "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99), "max_ms": latencies[-1] if latencies else float("nan"),
+        "throughput_rps": requests / wall if wall > 0 else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latenza e throughput delle funzioni AI (contro un server finto).")
+    parser.add_argument("--concurrency", default="1,4,16", help="livelli separati da virgola")
+    parser.add_argument("--requests", type=int, default=40, help="chiamate per livello e per funzione")
+    parser.add_argument("--only", help=f"sottoinsieme di: {','.join(ENTRY_POINTS)}")
+    parser.add_argument("--base-url", help="server esterno (es. http://127.0.0.1:8765/v1); default: fake interno")
+    parser.add_argument("--db", help="DB SQLite da usare (default: temporaneo)")
+    parser.add_argument("--json", dest="json_path", help="salva i risultati anche in JSON")
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.concurrency = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(ENTRY_POINTS)
+    unknown = set(names) - set(ENTRY_POINTS)
+    if unknown:
+        parser.error(f"funzioni sconosciute: {', '.join(sorted(unknown))}")
+
+    fake = _configure_env(args)
+    import database
+    from services.resilience import openai_breaker
+
+    database.init_db()
+    calls = _calls(_photos(min(args.requests, 16)) if "meal_photo" in names else [])
+
+    header = f"{'funzione':<20}{'conc':>5}{'ok':>6}{'fallb':>6}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>8}"
+    if fake:
+        header += f"{'srv req':>9}"
+    print(header)
+    results = []
+    try:
+        for name in names:
+            for conc in args.concurrency:
+                openai_breaker.record_success()  # ogni livello parte con il circuito chiuso
+                before = fake.stats.snapshot()["requests"] if fake else 0
+                r = {"entry_point": name, **run_level(calls[name], conc, args.requests)}
+                line = (f"{name:<20}{conc:>5}{r['ok']:>6}{r['fallback']:>6}{r['errors']:>5}"
+                        f"{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{r['p99_ms']:>9.0f}{r['throughput_rps']:>8.1f}")
+                if fake:
+                    # richieste arrivate al server: > requests significa retry
+                    r["server_requests"] = fake.stats.snapshot()["requests"] - before
+                    line += f"{r['server_requests']:>9}"
+                print(line, flush=True)
+                results.append(r)
+    finally:
+        if fake:
+            fake.stop()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "json_path"}, "results": results},
+                      f, indent=2)
+    return 0 if all(r["errors"] == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
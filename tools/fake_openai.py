@@ -0,0 +1,399 @@
+# tools/fake_openai.py
+"""
+Server locale compatibile con l'API OpenAI (solo /v1/chat/completions), per
+benchmark e prove di carico senza chiamare il provider.
+
+- risposte json_schema sintetizzate dallo schema della richiesta (tipi,
+  enum, required; una voce per riga nei batch), testo libero per il piano
+  settimanale, streaming SSE se stream=true;
+- latenza configurabile: fixed:S, uniform:A,B, lognormal:MEDIANA,SIGMA, exp:MEDIA
+  (secondi), più un costo per KB di immagine nelle richieste vision;
+- errori iniettati: 429 con Retry-After, 5xx, richieste che restano appese;
+- GET /stats: contatori (richieste, errori iniettati, immagini, byte ricevuti).
+
+Uso:
+    python -m tools.fake_openai --port 8765 --latency lognormal:0.8,0.4 --rate-429 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake streamlit run app.py
+"""
+import argparse
+import base64
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+_PLAN_WORDS = (
+    "Lunedì colazione yogurt greco e frutta, pranzo pasta integrale con verdure, cena pesce e insalata. "
+    "Martedì allenamento di forza, pranzo riso e pollo, cena legumi e verdure cotte. "
+    "Mercoledì camminata veloce, pasti bilanciati con proteine magre e carboidrati complessi. "
+    "Idratazione costante, spuntini leggeri, porzioni coerenti con l'obiettivo calorico."
+).split()
+
+
+@dataclass(slots=True)
+class FakeConfig:
+    latency: Callable[[], float] = lambda: 0.0
+    image_ms_per_kb: float = 0.0
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    rate_hang: float = 0.0
+    retry_after: float = 1.0
+    hang_seconds: float = 120.0
+    plan_words: int = 300
+    chunk_words: int = 8
+    chunk_delay: float = 0.01
+    seed: int | None = None
+
+
+@dataclass
+class FakeStats:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    counters: dict = field(default_factory=lambda: {
+        "requests": 0, "ok": 0, "streams": 0, "injected_429": 0, "injected_5xx": 0, "hung": 0,
+        "images": 0, "image_bytes": 0, "bytes_in": 0,
+    })
+
+    def add(self, **kw):
+        with self.lock:
+            for k, v in kw.items():
+                self.counters[k] += v
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.counters)
+
+
+# ----------------------------
+# Latenza
+# ----------------------------
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """fixed:S | uniform:A,B | lognormal:MEDIANA,SIGMA | exp:MEDIA (secondi)."""
+    kind, _, args = (spec or "fixed:0").partition(":")
+    values = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        lo, hi = values[0], values[1] if len(values) > 1 else values[0]
+        return lambda: rng.uniform(lo, hi)
+    if kind == "lognormal":
+        median, sigma = values[0], values[1] if len(values) > 1 else 0.5
+        return lambda: rng.lognormvariate(math.log(max(median, 1e-6)), sigma)
+    if kind == "exp":
+        return lambda: rng.expovariate(1.0 / max(values[0], 1e-6))
+    raise ValueError(f"Distribuzione di latenza sconosciuta: {spec}")
+
+
+# ----------------------------
+# Sintesi delle risposte
+# ----------------------------
+def _user_text(messages: list) -> tuple[str, list[bytes]]:
+    """Testo dell'ultimo messaggio utente + immagini (data URL decodificate)."""
+    text, images = "", []
+    for m in messages or []:
+        if m.get("role") != "user":
+            continue
+        content = m.get("content")
+        if isinstance(content, str):
+            text = content
+            continue
+        parts = []
+        for part in content or []:
+            if part.get("type") == "text":
+                parts.append(part.get("text") or "")
+            elif part.get("type") == "image_url":
+                url = (part.get("image_url") or {}).get("url") or ""
+                _, _, b64 = url.partition("base64,")
+                images.append(base64.b64decode(b64, validate=True) if b64 else b"")
+        text = "\n".join(parts)
+    return text, images
+
+
+def _batch_lines(text: str) -> list[str]:
+    # i prompt batch finiscono con "Giornata:\n..." / "Allenamenti:\n..."
+    m = re.search(r"(?:Giornata|Allenamenti):\n(.*)\Z", text, re.S)
+    lines = [ln.strip() for ln in (m.group(1) if m else "").splitlines() if ln.strip()]
+    return lines or ["voce"]
+
+
+def _number(name: str, rng: random.Random) -> float:
+    ranges = {
+        "total_calories": (150, 900), "calories_burned": (100, 600), "duration_min": (20, 90),
+    }
+    lo, hi = ranges.get(name, (0, 100))
+    return round(rng.uniform(lo, hi), 1)
+
+
+def synthesize(schema: dict, name: str, ctx: dict, rng: random.Random) -> Any:
+    """Valore conforme a schema (sottoinsieme usato dall'app: object/array/string/number/integer/boolean/enum)."""
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    typ = schema.get("type")
+    if isinstance(typ, list):
+        typ = next((t for t in typ if t != "null"), "null")
+    if typ == "object":
+        props = schema.get("properties") or {}
+        return {k: synthesize(v, k, ctx, rng) for k, v in props.items()}
+    if typ == "array":
+        lines = ctx["lines"]
+        out = []
+        for line in lines:
+            out.append(synthesize(schema.get("items") or {}, name, {**ctx, "line": line}, rng))
+        return out
+    if typ == "number":
+        return _number(name, rng)
+    if typ == "integer":
+        return int(_number(name, rng))
+    if typ == "boolean":
+        return rng.random() < 0.5
+    if typ == "null":
+        return None
+    # string
+    if name == "time":
+        m = re.match(r"\s*(\d{1,2})[:.](\d{2})", ctx.get("line") or "")
+        return f"{int(m.group(1)):02d}:{m.group(2)}" if m else "13:00"
+    if name == "description":
+        lines = ctx["text"].strip().splitlines()
+        return (ctx.get("line") or (lines[-1] if lines else "Pasto"))[:80]
+    if name == "notes":
+        return "Stima sintetica (fake_openai)."
+    return name
+
+
+def _plan_text(words: int, rng: random.Random) -> str:
+    return " ".join(_PLAN_WORDS[i % len(_PLAN_WORDS)] for i in range(rng.randint(words // 2, words)))
+
+
+def _completion(model: str, content: str, prompt_tokens: int) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content, "refusal": None},
+            "finish_reason": "stop",
+            "logprobs": None,
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": max(1, len(content) // 4),
+            "total_tokens": prompt_tokens + max(1, len(content) // 4),
+        },
+    }
+
+
+def _chunk(cid: str, model: str, delta: dict, finish: str | None) -> bytes:
+    body = {
+        "id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish, "logprobs": None}],
+    }
+    return f"data: {json.dumps(body, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+# ----------------------------
+# Server
+# ----------------------------
+def make_handler(cfg: FakeConfig, stats: FakeStats, rng: random.Random):
+    rng_lock = threading.Lock()
+
+    def draw(fn):
+        with rng_lock:
+            return fn()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, come il provider
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status: int, body: dict, headers: dict | None = None):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                self._send_json(200, stats.snapshot())
+            elif self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+            else:
+                self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            stats.add(requests=1, bytes_in=len(raw))
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+                return
+            try:
+                req = json.loads(raw or b"{}")
+                text, images = _user_text(req.get("messages"))
+            except (ValueError, TypeError) as e:
+                self._send_json(400, {"error": {"message": f"richiesta non valida: {e}", "type": "invalid_request_error"}})
+                return
+            if images:
+                stats.add(images=len(images), image_bytes=sum(len(b) for b in images))
+
+            roll = draw(rng.random)
+            if roll < cfg.rate_429:
+                stats.add(injected_429=1)
+                self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}},
+                    {"Retry-After": f"{cfg.retry_after:g}"},
+                )
+                return
+            if roll < cfg.rate_429 + cfg.rate_5xx:
+                stats.add(injected_5xx=1)
+                status = draw(lambda: rng.choice((500, 502, 503)))
+                self._send_json(status, {"error": {"message": "Server error (fake)", "type": "server_error"}})
+                return
+            if roll < cfg.rate_429 + cfg.rate_5xx + cfg.rate_hang:
+                stats.add(hung=1)
+                time.sleep(cfg.hang_seconds)
+                self.close_connection = True
+                return
+
+            kb = sum(len(b) for b in images) / 1024.0
+            time.sleep(max(0.0, draw(cfg.latency)) + kb * cfg.image_ms_per_kb / 1000.0)
+
+            model = req.get("model") or "fake"
+            prompt_tokens = max(1, len(raw) // 4)
+            fmt = req.get("response_format") or {}
+            if fmt.get("type") == "json_schema":
+                js = fmt.get("json_schema") or {}
+                ctx = {"text": text, "lines": _batch_lines(text), "line": None}
+                content = json.dumps(draw(lambda: synthesize(js.get("schema") or {}, "", ctx, rng)), ensure_ascii=False)
+            else:
+                content = draw(lambda: _plan_text(cfg.plan_words, rng))
+
+            if req.get("stream"):
+                self._stream(model, content)
+            else:
+                self._send_json(200, _completion(model, content, prompt_tokens))
+            stats.add(ok=1)
+
+        def _stream(self, model: str, content: str):
+            stats.add(streams=1)
+            cid = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def emit(data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            emit(_chunk(cid, model, {"role": "assistant", "content": ""}, None))
+            words = content.split(" ")
+            for i in range(0, len(words), cfg.chunk_words):
+                piece = " ".join(words[i:i + cfg.chunk_words]) + (" " if i + cfg.chunk_words < len(words) else "")
+                emit(_chunk(cid, model, {"content": piece}, None))
+                if cfg.chunk_delay:
+                    time.sleep(cfg.chunk_delay)
+            emit(_chunk(cid, model, {}, "stop"))
+            emit(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+class FakeOpenAI:
+    """Server in un thread: `with FakeOpenAI(cfg) as fake: fake.base_url ...`."""
+
+    def __init__(self, cfg: FakeConfig | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.cfg = cfg or FakeConfig()
+        self.stats = FakeStats()
+        rng = random.Random(self.cfg.seed)
+        self._server = ThreadingHTTPServer((host, port), make_handler(self.cfg, self.stats, rng))
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAI":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAI":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", default="lognormal:0.8,0.35",
+                        help="fixed:S | uniform:A,B | lognormal:MEDIANA,SIGMA | exp:MEDIA (secondi)")
+    parser.add_argument("--image-ms-per-kb", type=float, default=0.5, help="latenza extra per KB di immagine")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="quota di risposte 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="quota di risposte 500/502/503")
+    parser.add_argument("--rate-hang", type=float, default=0.0, help="quota di richieste che non rispondono")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After (s) delle 429")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--plan-words", type=int, default=300, help="lunghezza massima del piano settimanale")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="pausa tra i chunk SSE (s)")
+    parser.add_argument("--seed", type=int)
+
+
+def config_from_args(args) -> FakeConfig:
+    rng = random.Random(args.seed)
+    return FakeConfig(
+        latency=parse_latency(args.latency, rng),
+        image_ms_per_kb=args.image_ms_per_kb,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        rate_hang=args.rate_hang,
+        retry_after=args.retry_after,
+        hang_seconds=args.hang_seconds,
+        plan_words=args.plan_words,
+        chunk_delay=args.chunk_delay,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server OpenAI finto per benchmark e prove di carico.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(config_from_args(args), args.host, args.port)
+    print(f"OPENAI_BASE_URL={fake.base_url}  (statistiche: GET /stats, Ctrl+C per uscire)")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake._server.server_close()
+        print(json.dumps(fake.stats.snapshot(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
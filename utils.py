@@ -46,18 +46,3 @@ def heuristic_meal_kcal(text: str) -> float:
     if "dolce" in t or "gelato" in t: base = 450
     return float(base)
 
-
-def heuristic_workout_kcal(title: str, duration_min: int) -> float:
-    t = (title or "").lower()
-    dur = max(int(duration_min or 0), 0)
-    if "corsa" in t or "run" in t:
-        kpm = 10.0
-    elif "pesi" in t or "forza" in t or "gym" in t:
-        kpm = 6.0
-    elif "cammin" in t or "walk" in t:
-        kpm = 5.0
-    elif "bike" in t or "cicl" in t:
-        kpm = 8.0
-    else:
-        kpm = 7.5
-    return float(kpm * dur)
\ No newline at end of file
@@ -0,0 +1,65 @@
+# views/admin.py
+import os
+import streamlit as st
+
+from auth_utils import user_email
+from services.ai_cache import cache_stats
+from services.image_prep import prep_stats
+from services.metrics import METRICS_ADDR, METRICS_PORT, ai_summary, registry
+from services.resilience import openai_breaker
+
+
+def admin_emails() -> set[str]:
+    """Email abilitate: INFORMA_ADMIN_EMAILS (env) o ADMIN_EMAILS in st.secrets, separate da virgola."""
+    raw = os.getenv("INFORMA_ADMIN_EMAILS", "")
+    try:
+        if "ADMIN_EMAILS" in st.secrets:
+            raw = st.secrets["ADMIN_EMAILS"]
+    except Exception:
+        pass
+    if isinstance(raw, (list, tuple)):
+        raw = ",".join(raw)
+    return {e.strip().lower() for e in str(raw).split(",") if e.strip()}
+
+
+def is_admin(user_id: int) -> bool:
+    allowed = admin_emails()
+    return bool(allowed) and (user_email(user_id) or "").lower() in allowed
+
+
+def render(user_id: int):
+    if not is_admin(user_id):
+        st.error("Pagina riservata.")
+        return
+
+    st.header("🛠️ Admin · chiamate AI")
+    st.caption("Metriche di questo processo dall'avvio. Con più repliche ognuna ha le sue.")
+    if METRICS_PORT:
+        st.caption(f"Endpoint Prometheus: `http://{METRICS_ADDR}:{METRICS_PORT}/metrics`")
+    else:
+        st.caption("Endpoint Prometheus disattivato: imposta `INFORMA_METRICS_PORT`.")
+
+    rows = ai_summary()
+    calls = sum(r["calls"] for r in rows)
+    fallbacks = sum(r["fallback"] for r in rows)
+    a, b, c, d = st.columns(4)
+    a.metric("Chiamate", calls)
+    b.metric("Fallback", f"{fallbacks / calls:.1%}" if calls else "—")
+    c.metric("Costo stimato", f"${sum(r['cost_usd'] for r in rows):.4f}")
+    d.metric("Circuito", openai_breaker.state)
+
+    if rows:
+        st.dataframe(rows, use_container_width=True)
+    else:
+        st.info("Nessuna chiamata AI registrata finora.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Cache stime")
+        st.json(cache_stats())
+    with col2:
+        st.subheader("Foto")
+        st.json(prep_stats())
+
+    with st.expander("Formato Prometheus"):
+        st.code(registry.expose(), language="text")
@@ -3,20 +3,10 @@ import calendar as cal
 from datetime import date
 
 from components.safe import safe_section
-from db.common import safe_read_sql
+from db.repo_calendar import load_day_previews
 from utils import kcal_round
 
-def _day_preview(user_id: int, d: date) -> dict:
-    ds = str(d)
-    day = safe_read_sql("SELECT morning_weight, is_closed FROM day_logs WHERE user_id=? AND date=?", (user_id, ds))
-    summ = safe_read_sql("SELECT calories_in, calories_out, net_calories FROM daily_summaries WHERE user_id=? AND date=?", (user_id, ds))
-    planned = safe_read_sql("SELECT COUNT(*) AS c FROM planned_events WHERE user_id=? AND date=?", (user_id, ds))
-
-    weight = float(day.iloc[0]["morning_weight"]) if not day.empty and day.iloc[0]["morning_weight"] is not None else None
-    closed = bool(day.iloc[0]["is_closed"]) if not day.empty else False
-    net = float(summ.iloc[0]["net_calories"]) if not summ.empty and summ.iloc[0]["net_calories"] is not None else None
-    planned_count = int(planned.iloc[0]["c"]) if not planned.empty else 0
-    return {"weight": weight, "closed": closed, "net": net, "planned": planned_count}
+_EMPTY_PREVIEW = {"weight": None, "closed": False, "net": None, "planned": 0}
 
 def render(user_id: int):
     st.header("📅 Calendario (mese)")
@@ -51,6 +41,8 @@ def render(user_id: int):
 
     month_matrix = cal.monthcalendar(year, month)
     today = date.today()
+    last_day = cal.monthrange(year, month)[1]
+    previews = load_day_previews(user_id, date(year, month, 1), date(year, month, last_day))
 
     for week_i, week in enumerate(month_matrix):
         cols = st.columns(7)
@@ -60,7 +52,7 @@ def render(user_id: int):
                 continue
 
             d = date(year, month, day_num)
-            p = _day_preview(user_id, d)
+            p = previews.get(str(d), _EMPTY_PREVIEW)
             is_today = (d == today)
 
             label = f"{day_num}"
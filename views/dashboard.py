@@ -4,14 +4,8 @@ import pandas as pd
 import plotly.express as px
 from datetime import date, timedelta
 
-from database import conn, init_db
-
-
-def safe_read_sql(query: str, params=()):
-    try:
-        return pd.read_sql(query, conn, params=params)
-    except Exception:
-        return pd.DataFrame()
+from db.common import safe_read_sql
+from db.repo_rollups import first_date, range_totals, week_series
 
 
 def _date_range(days: int):
@@ -21,8 +15,6 @@ def _date_range(days: int):
 
 
 def render(user_id: int):
-    init_db()
-
     st.title("Dashboard")
 
     # -----------------------------
@@ -30,97 +22,93 @@ def render(user_id: int):
     # -----------------------------
     period = st.segmented_control(
         "Periodo",
-        options=["7 giorni", "30 giorni", "90 giorni"],
+        options=["7 giorni", "30 giorni", "90 giorni", "1 anno", "Tutto"],
         default="30 giorni"
     )
-    days = 7 if period == "7 giorni" else 30 if period == "30 giorni" else 90
-    d0, d1 = _date_range(days)
+    if period == "Tutto":
+        d1 = date.today()
+        d0 = first_date(user_id) or d1
+        days = (d1 - d0).days + 1
+    else:
+        days = {"7 giorni": 7, "90 giorni": 90, "1 anno": 365}.get(period, 30)
+        d0, d1 = _date_range(days)
 
     st.caption(f"Mostro dati dal {d0.isoformat()} al {d1.isoformat()}")
 
     # -----------------------------
-    # KPI: giornate chiuse + NET
+    # KPI: giornate chiuse + NET (rollup settimana/mese + giorni ai bordi)
     # -----------------------------
-    # Giorni chiusi nel periodo
-    closed_row = conn.execute(
-        """
-        SELECT COUNT(*) AS n
-        FROM day_logs
-        WHERE user_id = ?
-          AND is_closed = 1
-          AND date BETWEEN ? AND ?
-        """,
-        (user_id, str(d0), str(d1))
-    ).fetchone()
-    closed_days = int(closed_row["n"]) if closed_row and closed_row["n"] is not None else 0
-
-    # NET totale (solo giornate chiuse) nel periodo
-    net_row = conn.execute(
-        """
-        SELECT COALESCE(SUM(ds.net_calories), 0) AS net_sum
-        FROM daily_summaries ds
-        JOIN day_logs dl
-          ON dl.user_id = ds.user_id AND dl.date = ds.date
-        WHERE ds.user_id = ?
-          AND dl.is_closed = 1
-          AND ds.date BETWEEN ? AND ?
-        """,
-        (user_id, str(d0), str(d1))
-    ).fetchone()
-    net_sum = float(net_row["net_sum"]) if net_row and net_row["net_sum"] is not None else 0.0
-
-    # Calorie IN/OUT totali (solo giornate chiuse)
-    io_row = conn.execute(
-        """
-        SELECT
-          COALESCE(SUM(ds.calories_in), 0)  AS in_sum,
-          COALESCE(SUM(ds.calories_out), 0) AS out_sum
-        FROM daily_summaries ds
-        JOIN day_logs dl
-          ON dl.user_id = ds.user_id AND dl.date = ds.date
-        WHERE ds.user_id = ?
-          AND dl.is_closed = 1
-          AND ds.date BETWEEN ? AND ?
-        """,
-        (user_id, str(d0), str(d1))
-    ).fetchone()
-    in_sum = float(io_row["in_sum"]) if io_row and io_row["in_sum"] is not None else 0.0
-    out_sum = float(io_row["out_sum"]) if io_row and io_row["out_sum"] is not None else 0.0
+    totals = range_totals(user_id, d0, d1)
+    closed_days = totals["closed_days"]
+    net_sum = totals["net_sum"]
+    in_sum = totals["in_sum"]
+    out_sum = totals["out_sum"]
 
     c1, c2, c3 = st.columns(3)
     c1.metric("Giornate chiuse", closed_days)
     c2.metric("NET (solo chiuse)", int(round(net_sum)))
     c3.metric("IN / OUT (solo chiuse)", f"{int(round(in_sum))} / {int(round(out_sum))}")
+    if totals["w_avg"] is not None:
+        st.caption(
+            f"Peso nel periodo: min {totals['w_min']:.1f} · media {totals['w_avg']:.1f} · max {totals['w_max']:.1f} kg"
+        )
 
     st.divider()
 
     # -----------------------------
     # Dataset per grafici
     # -----------------------------
-    # Prendo tutte le giornate del periodo con eventuale riepilogo + stato chiusura + peso
-    df = safe_read_sql(
-        """
-        SELECT
-          dl.date AS date,
-          dl.is_closed AS is_closed,
-          dl.morning_weight AS morning_weight,
-          COALESCE(ds.calories_in, 0) AS calories_in,
-          COALESCE(ds.rest_calories, 0) AS rest_calories,
-          COALESCE(ds.workout_calories, 0) AS workout_calories,
-          COALESCE(ds.calories_out, 0) AS calories_out,
-          COALESCE(ds.net_calories, 0) AS net_calories
-        FROM day_logs dl
-        LEFT JOIN daily_summaries ds
-          ON ds.user_id = dl.user_id AND ds.date = dl.date
-        WHERE dl.user_id = ?
-          AND dl.date BETWEEN ? AND ?
-        ORDER BY dl.date
-        """,
-        (user_id, str(d0), str(d1))
-    )
+    # Range lunghi: una riga per settimana ISO dai rollup (somme delle sole giornate chiuse);
+    # le settimane ai bordi contano solo i giorni dentro il periodo
+    weekly = days > 90
+    if weekly:
+        st.caption(
+            "Periodo lungo: grafici per settimana (somme delle giornate chiuse, peso medio). "
+            "La prima e l'ultima settimana sono parziali: contano solo i giorni del periodo."
+        )
+        df = pd.DataFrame(
+            [
+                {
+                    "date": r["start_date"],
+                    "is_closed": 1 if r["closed_days"] else 0,
+                    "morning_weight": r["w_sum"] / r["w_count"] if r["w_count"] else None,
+                    "calories_in": r["in_sum"],
+                    "rest_calories": r["rest_sum"],
+                    "workout_calories": r["workout_sum"],
+                    "calories_out": r["out_sum"],
+                    "net_calories": r["net_sum"],
+                    "partial": r["partial"],
+                }
+                for r in week_series(user_id, d0, d1)
+            ],
+            columns=["date", "is_closed", "morning_weight", "calories_in", "rest_calories",
+                     "workout_calories", "calories_out", "net_calories", "partial"],
+        )
+    else:
+        # Prendo tutte le giornate del periodo con eventuale riepilogo + stato chiusura + peso
+        df = safe_read_sql(
+            """
+            SELECT
+              dl.date AS date,
+              dl.is_closed AS is_closed,
+              dl.morning_weight AS morning_weight,
+              COALESCE(ds.calories_in, 0) AS calories_in,
+              COALESCE(ds.rest_calories, 0) AS rest_calories,
+              COALESCE(ds.workout_calories, 0) AS workout_calories,
+              COALESCE(ds.calories_out, 0) AS calories_out,
+              COALESCE(ds.net_calories, 0) AS net_calories
+            FROM day_logs dl
+            LEFT JOIN daily_summaries ds
+              ON ds.user_id = dl.user_id AND ds.date = dl.date
+            WHERE dl.user_id = ?
+              AND dl.date BETWEEN ? AND ?
+            ORDER BY dl.date
+            """,
+            (user_id, str(d0), str(d1))
+        )
 
     # Se day_logs non ha righe (utente nuovo), proviamo a mostrare comunque daily_summaries
-    if df.empty:
+    if df.empty and not weekly:
         df = safe_read_sql(
             """
             SELECT
@@ -161,7 +149,7 @@ def render(user_id: int):
     if gdf.empty:
         st.warning("Nel periodo selezionato non ci sono giornate chiuse.")
     else:
-        fig_net = px.line(gdf, x="date", y="net_calories", markers=True, title="NET giornaliero")
+        fig_net = px.line(gdf, x="date", y="net_calories", markers=True, title="NET settimanale" if weekly else "NET giornaliero")
         st.plotly_chart(fig_net, use_container_width=True)
 
         # 2) Calorie IN vs OUT
@@ -192,5 +180,5 @@ def render(user_id: int):
             "date", "is_closed", "morning_weight",
             "calories_in", "rest_calories", "workout_calories",
             "calories_out", "net_calories"
-        ]
+        ] + (["partial"] if weekly else [])
         st.dataframe(df[show_cols], use_container_width=True)
\ No newline at end of file
@@ -0,0 +1,47 @@
+# views/import_data.py
+import io
+import streamlit as st
+
+from services.importer import import_file
+
+
+def render(user_id: int):
+    st.header("📥 Importa storico")
+    st.caption(
+        "Carica un export CSV o JSON da un'altra app. Colonne riconosciute: data, ora, descrizione, "
+        "kcal (e durata in minuti per gli allenamenti); le righe non valide e quelle già presenti "
+        "(stessa data, ora e descrizione) vengono saltate."
+    )
+
+    kind_label = st.radio("Cosa importi?", ["Pasti", "Allenamenti"], horizontal=True)
+    kind = "meals" if kind_label == "Pasti" else "workouts"
+    up = st.file_uploader("File", type=["csv", "json", "jsonl"], key="import_file")
+
+    if not st.button("Importa", type="primary", disabled=up is None):
+        return
+
+    fmt = "csv" if up.name.lower().endswith(".csv") else "json"
+    bar = st.progress(0.0, text="Import in corso…")
+    total_bytes = max(up.size, 1)
+
+    def _progress(ok: int, ko: int):
+        bar.progress(min(up.tell() / total_bytes, 1.0), text=f"{ok} importati, {ko} scartati…")
+
+    try:
+        stream = io.TextIOWrapper(up, encoding="utf-8-sig", newline="")
+        stats = import_file(user_id, stream, fmt, kind, on_progress=_progress)
+    except Exception as e:
+        bar.empty()
+        st.error(f"Import interrotto: {e}")
+        return
+
+    bar.progress(1.0, text="Completato")
+    st.success(
+        f"Importati {stats['imported']} {kind_label.lower()} · già presenti {stats['duplicates']} · "
+        f"scartati {stats['skipped']} · "
+        f"giorni ricalcolati {stats['days']}"
+    )
+    if stats["errors"]:
+        with st.expander("Righe scartate (prime)"):
+            for err in stats["errors"]:
+                st.write(f"- {err}")
@@ -1,11 +1,21 @@
 import streamlit as st
-from datetime import date, timedelta, datetime
+from datetime import date, timedelta
 
-from db.common import safe_read_sql
-from database import conn
+from db.unit_of_work import UnitOfWork, unit_of_work
+from db.repo_planned import add_planned_many, delete_plan_events
+from db.repo_weekly_plan import find_plan, get_week_plan, reuse_plan, save_plan
 from profile import get_profile
-from ai import generate_weekly_plan, explain_openai_error
-from utils import iso_year_week, bmr_mifflin, tdee_from_level, heuristic_workout_kcal
+from components import job_status
+from services.ai_service import WEEKLY_PLAN_PROMPT_VERSION
+from services.plan_inputs import (
+    HISTORY, last_week_summary, plan_inputs, plan_key, plan_prompt, reference_week, week_slots,
+)
+from services.workout_engine import user_weight, workout_kcal
+from utils import iso_year_week, bmr_mifflin, tdee_from_level
+
+# segni degli eventi inseriti dal piano (gli unici che _apply_plan_to_calendar sostituisce)
+PLAN_MEAL_SUFFIX = "(piano)"
+PLAN_WORKOUT_NOTE = "Allenamento pianificato"
 
 def _daily_target_kcal(profile: dict, rest_kcal: float) -> float:
         goal_type = str(profile.get("goal_type") or "mantenimento").lower()
@@ -15,9 +25,10 @@ def _daily_target_kcal(profile: dict, rest_kcal: float) -> float:
             return rest_kcal + 250
         return rest_kcal
 
-def _apply_plan_to_calendar(user_id: int, week_start: date, plan_text: str, workout_slots):
-        prof = get_profile(user_id) or {}
-        weight = float(prof.get("start_weight") or 75.0)
+def _apply_plan_to_calendar(user_id: int, week_start: date, plan_text: str, workout_slots, prof: dict,
+                            uow: UnitOfWork):
+        # prof = inputs["profile"] di plan_inputs(): stessa chiave del piano -> stessi target nel calendario
+        weight = float(prof.get("weight_kg") or 75.0)
         height = float(prof.get("height_cm") or 175.0)
         sex = (prof.get("sex") or "M")
         age = int(prof.get("age") or 25)
@@ -28,35 +39,25 @@ def _apply_plan_to_calendar(user_id: int, week_start: date, plan_text: str, work
         target_in = _daily_target_kcal(prof, rest)
 
         meal_slots = [
-            ("08:00", "Colazione (piano)", 0.25),
-            ("13:00", "Pranzo (piano)", 0.35),
-            ("17:00", "Spuntino (piano)", 0.10),
-            ("20:30", "Cena (piano)", 0.30),
+            ("08:00", f"Colazione {PLAN_MEAL_SUFFIX}", 0.25),
+            ("13:00", f"Pranzo {PLAN_MEAL_SUFFIX}", 0.35),
+            ("17:00", f"Spuntino {PLAN_MEAL_SUFFIX}", 0.10),
+            ("20:30", f"Cena {PLAN_MEAL_SUFFIX}", 0.30),
         ]
 
         week_end = week_start + timedelta(days=6)
 
-        conn.execute("DELETE FROM planned_events WHERE user_id=? AND date>=? AND date<=?",
-                     (user_id, str(week_start), str(week_end)))
-        conn.commit()
-
         note = (plan_text or "").strip()
         if len(note) > 350:
             note = note[:350] + "…"
 
+        rows = []
         for i in range(7):
             d = week_start + timedelta(days=i)
             ds = str(d)
             for t, title, pct in meal_slots:
                 kcal = float(target_in * pct)
-                conn.execute(
-                    """
-                    INSERT INTO planned_events
-                      (user_id, date, time, type, title, expected_calories, duration_min, status, notes)
-                    VALUES (?,?,?,?,?,?,?,?,?)
-                    """,
-                    (user_id, ds, t, "meal", title, kcal, None, "planned", note)
-                )
+                rows.append((user_id, ds, t, "meal", title, kcal, None, note))
 
         if workout_slots:
             for slot in workout_slots:
@@ -64,16 +65,12 @@ def _apply_plan_to_calendar(user_id: int, week_start: date, plan_text: str, work
                 time_str = slot.get("time", "19:00")
                 title = slot.get("title", "Allenamento")
                 dur = int(slot.get("duration_min") or 0)
-                kcal_burn = float(heuristic_workout_kcal(title, dur))
-                conn.execute(
-                    """
-                    INSERT INTO planned_events
-                      (user_id, date, time, type, title, expected_calories, duration_min, status, notes)
-                    VALUES (?,?,?,?,?,?,?,?,?)
-                    """,
-                    (user_id, ds, time_str, "workout", title, kcal_burn, dur if dur>0 else None, "planned", "Allenamento pianificato")
-                )
-        conn.commit()
+                kcal_burn = workout_kcal(title, dur, weight)
+                rows.append((user_id, ds, time_str, "workout", title, kcal_burn, dur if dur>0 else None, PLAN_WORKOUT_NOTE))
+
+        # eventi manuali e già fatti restano: si sostituiscono solo quelli del piano precedente
+        delete_plan_events(user_id, week_start, week_end, PLAN_MEAL_SUFFIX, PLAN_WORKOUT_NOTE, uow=uow)
+        add_planned_many(rows, uow=uow)
 
 def render(user_id: int):
         st.header("🧠 Piano settimanale → Inserisci nel calendario (previsto)")
@@ -93,52 +90,60 @@ def render(user_id: int):
         slots = st.data_editor(slots, num_rows="dynamic", use_container_width=True)
         st.session_state.workout_slots = slots
 
-        prof = get_profile(user_id) or {}
-        prev_start = week_start - timedelta(days=7)
-        prev_end = week_start - timedelta(days=1)
-        last_week_sums = safe_read_sql(
-            "SELECT date, calories_in, calories_out, net_calories FROM daily_summaries WHERE user_id=? AND date>=? AND date<=? ORDER BY date",
-            (user_id, str(prev_start), str(prev_end))
-        )
+        # gli allenamenti valgono per giorno della settimana: riportati nella settimana scelta
+        plan_slots = week_slots(slots, week_start)
+        _, ref_end = reference_week(week_start)
+        inputs = plan_inputs(get_profile(user_id) or {}, user_weight(user_id, ref_end), plan_slots,
+                             last_week_summary(user_id, week_start))
+        key = plan_key(inputs)
 
         y, w = iso_year_week(week_start)
-        existing = conn.execute(
-            "SELECT content, created_at FROM weekly_plan WHERE user_id=? AND iso_year=? AND iso_week=?",
-            (user_id, y, w)
-        ).fetchone()
-
-        if existing:
-            st.caption(f"Piano già generato (cache) — {existing['created_at']}")
-            st.markdown(existing["content"])
+        existing = get_week_plan(user_id, y, w)
+        job_key = f"weekly_plan_job_{user_id}_{y}_{w}"
+        busy = job_status.running(job_key)
+
+        # piani salvati prima dell'hash degli input (None): restano validi finché non si rigenera
+        current = existing if existing and existing.input_hash in (None, key) else None
+        stored = None if current else find_plan(user_id, key)
+
+        # il calendario si riscrive solo da un pulsante, mai durante il render
+        regenerate = False
+        if current:
+            st.caption(f"Piano già generato (cache) — {current.created_at}")
+            st.markdown(current.content)
             if st.button("Re-inserisci eventi nel calendario (previsto)"):
-                _apply_plan_to_calendar(user_id, week_start, existing["content"], st.session_state.workout_slots)
+                with unit_of_work() as uow:
+                    _apply_plan_to_calendar(user_id, week_start, current.content, plan_slots, inputs["profile"], uow)
                 st.success("Eventi previsti inseriti nel calendario ✅")
-            if st.button("Rigenera piano (nuova chiamata)"):
-                existing = None
-
-        if not existing:
-            if st.button("🔄 Genera piano + Inserisci nel calendario"):
-                prompt = f"""Sei un coach nutrizionale/fitness. Crea un piano settimanale pratico e sostenibile.
-Settimana start (lunedì): {week_start}
-Profilo: {prof}
-Allenamenti previsti: {st.session_state.workout_slots}
-Ultima settimana (riassunto): {last_week_sums.to_dict(orient='records') if not last_week_sums.empty else 'nessun dato'}
-Scrivi un piano giorno-per-giorno (Lun→Dom) con pasti e kcal.
-"""
-                with st.spinner("Genero piano..."):
-                    try:
-                        content = generate_weekly_plan(prompt)
-                    except Exception as e:
-                        st.error(explain_openai_error(e))
-                        return
-
-                conn.execute(
-                    "INSERT INTO weekly_plan (user_id, iso_year, iso_week, content, created_at) VALUES (?,?,?,?,?) "
-                    "ON CONFLICT(user_id, iso_year, iso_week) DO UPDATE SET content=excluded.content, created_at=excluded.created_at",
-                    (user_id, y, w, content, datetime.now().isoformat(timespec="seconds"))
-                )
-                conn.commit()
-
-                _apply_plan_to_calendar(user_id, week_start, content, st.session_state.workout_slots)
-                st.success("Piano generato e inserito nel calendario ✅")
+            regenerate = st.button("Rigenera piano (nuova chiamata)")
+        elif existing:
+            st.warning("Profilo, allenamenti o ultima settimana completa cambiati: il piano non è aggiornato.")
+            with st.expander(f"Piano attuale — {existing.created_at}"):
+                st.markdown(existing.content)
+
+        if stored:
+            # stessi input già visti (anche in un'altra settimana): nessuna chiamata al modello
+            st.caption(f"Con questi dati c'è già un piano, generato il {stored.created_at}")
+            with st.expander("Piano per i dati attuali", expanded=not existing):
+                st.markdown(stored.content)
+            if st.button("📋 Usa questo piano + Inserisci nel calendario"):
+                with unit_of_work() as uow:  # settimana e calendario insieme, o nessuno dei due
+                    reuse_plan(user_id, y, w, stored, uow=uow)
+                    _apply_plan_to_calendar(user_id, week_start, stored.content, plan_slots, inputs["profile"], uow)
                 st.rerun()
+
+        label = "🔄 Rigenera piano + Inserisci nel calendario" if existing else "🔄 Genera piano + Inserisci nel calendario"
+        generate = regenerate or (not current and st.button(label, disabled=busy))
+
+        if generate and not busy:
+            def _save_and_apply(content: str):
+                # gira nel worker, solo a stream completato: niente st.* qui
+                with unit_of_work() as uow:
+                    save_plan(user_id, y, w, key, WEEKLY_PLAN_PROMPT_VERSION, content, HISTORY, uow=uow)
+                    _apply_plan_to_calendar(user_id, week_start, content, plan_slots, inputs["profile"], uow)
+
+            job_status.start(job_key, user_id, "weekly_plan", {"prompt": plan_prompt(inputs)},
+                             on_done=_save_and_apply)
+
+        # il testo compare man mano che arriva; a fine stream la pagina si ricarica col piano salvato
+        job_status.poll(job_key, label="Genero piano…", show_progress=True)